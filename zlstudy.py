@@ -5,24 +5,52 @@
 
 新增功能：
 1. 📋 已完成视频记录 - 自动记录并跳过已看完的视频
-2. ⚠️  失败视频记录 - 记录播放失败的视频，自动跳过避免重复尝试
-3. 🎮 智能进度检测 - 自动检测视频卡住并处理
+2. ⚠️  失败视频记录 - 按类型记录失败，超时/卡住等临时故障按指数退避自动重试，硬失败停放，python zlstudy.py retry 手动放行
+3. 🎮 智能进度检测 - 自动检测视频卡住，诊断后依次尝试继续播放、重新定位、重新加载并回到上次位置
 4. 🎬 自动播放下一集 - 检测多集视频并自动播放所有集数
 5. 📊 详细统计信息 - 显示完成、失败、待处理视频数量
 6. 💾 自动保存进度 - 程序意外退出时保存已完成记录
+7. ⚡ 事件驱动监控 - 监听video事件长轮询，播放结束立即切换，减少WebDriver调用
+8. 🗄️  SQLite进度库 - 可选后端，记录每个视频/每集/每次尝试，python zlstudy.py query 查询剩余与失败
+9. 👥 多账号工作池 - python zlstudy.py pool，每个账号一个Chrome进程，崩溃自动重启并汇总统计
+10. 🪶 低资源模式 - python zlstudy.py run --profile lean，无头小窗口运行并报告每个会话的CPU/内存
+11. 🔐 后台登录探测 - 用浏览器cookies发HTTP请求检查会话，不打断播放，失效时才重新登录（--login-probe-path 指定探测地址）
+12. ♻️  浏览器生命周期 - 复用一个播放标签页，按播放数量或内存定期重启浏览器，长时间运行内存平稳
+13. 📈 耗时分析 - 记录登录、页面加载、集数切换、卡顿恢复等各阶段耗时到 metrics.jsonl，运行结束打印开销占比
+14. 📥 预加载下一个视频 - 当前视频播放时在后台标签页打开下一个，结束后直接切换；打不开、没有视频的链接提前记为失败，页面显示已学完的直接记为完成
+15. 🕷️  课程目录抓取 - python zlstudy.py crawl 抓取课程列表页，只重新解析有变化的页面，新课程自动加入 zlstudy.txt
+16. 🤝 多机共享队列 - python zlstudy.py coord serve/load 建立共享队列，各机器 python zlstudy.py node 按租约领取账号和视频，失联节点的工作自动转交，临时故障退避后重新排队（coord retry 放行停放的失败视频）
+17. 🌐 网络抓取 - python zlstudy.py run --capture-network 按视频统计页面/媒体首字节、媒体吞吐量、缓冲次数和失败请求
+18. 📉 省流量模式 - python zlstudy.py run --bandwidth-saver 选最低清晰度、拦截图片/字体/统计脚本，报告每个视频传输的字节数
+19. 🗂️  时长索引与调度 - python zlstudy.py plan 只读时长和集数不播放（按视频ID缓存），run --policy shortest/deadline 调整播放顺序并给出预计完成时间
+20. 📟 只读子命令 - python zlstudy.py status/failed/export 不启动浏览器、不导入selenium，只读进度记录、不改动任何文件（status --all-accounts --json 便于批量轮询）
+21. 📡 指标端点 - python zlstudy.py run --metrics-port 9464 在本机提供 /metrics（Prometheus文本格式）：当前视频/集数、播放位置、完成/失败数、卡顿恢复、浏览器重启和内存，便于监控发现卡住的会话
 
 文件说明：
-- zlstudy.txt: 视频链接列表
-- cookies.json: 登录状态保存
-- completed_videos.json: 已完成视频记录
+- zlstudy.txt: 视频链接列表（按视频ID去重，bizType等参数不同的同一视频只播放一次，不是视频详情页的行会被跳过）
+- cookies.json: 登录状态保存（使用持久化Chrome用户目录时作为导出，供 crawl 等不启动浏览器的HTTP请求使用）
+- completed_videos.json: 已完成视频记录（以视频ID为键，旧版以链接记录的会自动转换）
 - failed_videos.json: 失败视频记录（含失败原因和时间）
+- completed_videos.jsonl / failed_videos.jsonl: 完成/失败事件日志，定期原子合并进上面的快照文件
+- drivers/: 本地chromedriver缓存（drivers/<Chrome主版本号>/chromedriver），启动时不联网
+- accounts.json: 多账号列表，每个账号的上述文件及Chrome用户目录放在各自目录下
+- zlstudy_mock.py: 本地模拟站点和基准测试，不依赖真实站点验证播放相关改动（python zlstudy_mock.py bench 报告每个视频的开销、命令数和内存）
+- progress.db: SQLite进度库（PROGRESS_BACKEND = "sqlite" 时使用，首次运行自动导入上面的JSON记录）
+- episode_progress.json / episode_progress.jsonl: 多集视频的单集断点（每集是否完成、上次播放位置）及其事件日志，SQLite后端记录在 progress.db 中
+- catalog.json / catalog_cache.json: crawl 抓取的课程目录（标题、bizType、集数）和列表页缓存
+- duration_index.json: 时长索引（每个视频的单集时长和集数），过期后重新读取
+- coordinator.db: 共享工作队列（账号/视频租约和集中记录的完成结果），可直接共享文件或由 coord serve 提供HTTP服务
+- metrics.jsonl: 各阶段耗时（登录、页面加载、等待视频、集数查找/切换、卡顿恢复、播放）、每个视频的开销占比和WebDriver命令数，
+  开启网络抓取时还有每个视频的首字节、吞吐量、缓冲和失败请求
 
 多集视频功能：
 - 自动检测视频页面右侧的集数选择器
+- 每个视频只抓取一次页面快照，解析成播放列表后直接点击下一集（python zlstudy_mock.py bench-episodes 统计往返次数）
 - 支持"第1集"、"第2集"等格式
 - 支持"EP1"、"EP2"等格式
 - 自动播放所有集数直到结束
 - 最大支持50集，防止无限循环
+- 断点续播：程序中断后重新运行，直接跳到第一个未看完的集数，并从上次播放位置继续
 
 使用方法：
 1. 将视频链接放入 zlstudy.txt 文件
@@ -38,23 +66,100 @@
 import os
 os.environ["SE_SELENIUM_MANAGER"] = "0"  # 禁用自动驱动管理
 
-from selenium.webdriver.chrome.service import Service  # 修改为Chrome
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options as ChromeOptions  # 修改为Chrome
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager  # 添加webdriver管理器
+try:
+    import psutil  # 可选依赖：跨平台统计进程内存/CPU，没有时在Linux上直接读取/proc
+except ImportError:
+    psutil = None
 import time
+import collections
+import contextlib
+import functools
 import json
 import os
+import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
 from pathlib import Path
+import urllib.error
+import urllib.request
+from html.parser import HTMLParser
+from urllib.parse import parse_qs, urlparse
+
+# selenium 在第一次启动浏览器时才导入（见 load_selenium），status/failed/export 等只读子命令不加载
+webdriver = Service = ChromeOptions = By = WebDriverWait = EC = TimeoutException = None
+
+def load_selenium():
+    """导入selenium并绑定到模块级名称，重复调用直接返回"""
+    global webdriver, Service, ChromeOptions, By, WebDriverWait, EC, TimeoutException
+    if webdriver is not None:
+        return
+    from selenium.webdriver.chrome.service import Service  # 修改为Chrome
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.chrome.options import Options as ChromeOptions  # 修改为Chrome
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+    from selenium import webdriver
 
 # 配置参数
 TXT_PATH = './zlstudy.txt'  # 修改为相对路径
 COOKIES_PATH = './cookies.json'  # Cookie存储路径
 COMPLETED_VIDEOS_PATH = './completed_videos.json'  # 已完成视频记录路径
 FAILED_VIDEOS_PATH = './failed_videos.json'  # 失败视频记录路径
+COMPLETED_JOURNAL_PATH = './completed_videos.jsonl'  # 已完成视频事件日志（追加写入）
+FAILED_JOURNAL_PATH = './failed_videos.jsonl'  # 失败视频事件日志（追加写入）
+JOURNAL_COMPACT_THRESHOLD = 200  # 事件日志累计多少条后合并进快照文件
+# 失败类型：(类型, 匹配失败原因的正则, 是否临时故障)，按顺序匹配，都不匹配时为 unknown（不自动重试）
+FAILURE_KINDS = [
+    ("not_found", r"HTTP 4\d\d", False),
+    ("no_video", r"页面没有视频元素", True),  # 后台标签页的预检结论，页面渲染慢时也会出现，按临时故障重试
+    ("unsupported", r"code=4\b", False),  # MEDIA_ERR_SRC_NOT_SUPPORTED
+    ("server_error", r"HTTP 5\d\d", True),
+    ("load_timeout", r"视频元素加载超时", True),
+    ("no_duration", r"无法获取视频时长", True),
+    ("stalled", r"进度卡住|卡顿恢复失败", True),
+    ("media_error", r"视频加载错误", True),
+    ("driver_error", r"处理异常|浏览器", True),
+]
+RETRY_MAX_ATTEMPTS = 4  # 临时故障最多失败几次，之后停放不再自动重试
+RETRY_BACKOFF_BASE = 300  # 第一次重试前等待的秒数，之后每次翻倍
+RETRY_BACKOFF_MAX = 6 * 3600  # 重试等待的上限（秒）
+RETRY_MAX_WAIT_IN_RUN = 900  # 队列处理完后最多等待多久（秒）来重试本次失败的视频，更晚到期的留给下次运行
+PROGRESS_BACKEND = "json"  # 进度存储后端：json=快照文件+事件日志，sqlite=PROGRESS_DB_PATH数据库
+PROGRESS_DB_PATH = './progress.db'  # SQLite进度库路径（首次使用时自动导入已有JSON记录）
+EPISODE_PROGRESS_PATH = './episode_progress.json'  # 多集视频的单集断点记录（JSON后端）
+EPISODE_JOURNAL_PATH = './episode_progress.jsonl'  # 单集断点事件日志（追加写入），累计到 JOURNAL_COMPACT_THRESHOLD 条后合并进快照
+CATALOG_PATH = './catalog.json'  # 课程目录：抓取到的视频ID及标题、bizType、集数
+CATALOG_CACHE_PATH = './catalog_cache.json'  # 列表页缓存（ETag/内容哈希/解析结果），重新抓取时没变的页面不再解析
+CATALOG_PAGE_URL = "/videos?page={page}"  # 需要登录的课程列表分页地址
+CATALOG_MAX_PAGES = 200  # 最多抓取的列表页数
+DURATION_INDEX_PATH = './duration_index.json'  # 时长索引（按视频ID缓存单集时长和集数），用于调度和预计完成时间
+DURATION_INDEX_TTL_DAYS = 30  # 时长索引条目的有效期（天），过期后重新读取
+SCHEDULE_POLICY = "file"  # 播放顺序：file=链接列表顺序，shortest=剩余时长最短的优先，deadline=截止时间前完成尽量多的视频
+SCHEDULE_DEADLINE = None  # deadline 策略的截止时间，如 "2026-12-31 18:00"
+DEADLINE_FORMAT = "%Y-%m-%d %H:%M"  # 截止时间格式
+SCHEDULE_TARGET = None  # deadline 策略的目标完成数量，估算达不到时给出提示
+SCHEDULE_OVERHEAD_SECONDS = 30  # 每个视频的非播放开销（秒），指标文件中有视频记录时改用实测平均值
+METRICS_PATH = './metrics.jsonl'  # 各阶段耗时、每个视频的开销和WebDriver命令数（JSONL，每行一条）
+METRICS_ENABLED = True  # 是否写入指标文件（运行结束的开销汇总总是打印）
+METRICS_HTTP_PORT = None  # 本机指标端点端口（如 9464），运行时 GET /metrics 返回Prometheus文本格式；None表示不开启，pool 模式下各槽位依次加1
+METRICS_HTTP_HOST = '127.0.0.1'  # 指标端点监听地址，只给本机采集时保持127.0.0.1
+NETWORK_CAPTURE = False  # 网络抓取：从Chrome性能日志统计首字节、媒体吞吐量、缓冲和失败请求，按视频写入指标和进度库
+BANDWIDTH_SAVER = False  # 省流量模式：播放器选最低清晰度，在播放/预加载标签页上拦截 BLOCKED_URL_PATTERNS（登录页不受影响），按视频报告传输字节数
+BLOCKED_URL_PATTERNS = [  # Network.setBlockedURLs 的通配符规则：图片、字体、统计/广告脚本
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*google-analytics.com*", "*googletagmanager.com*", "*hm.baidu.com*", "*cnzz.com*", "*51.la*",
+]
+QUALITY_RANKS = {"流畅": 240, "极速": 240, "标清": 480, "高清": 720, "超清": 1080, "蓝光": 1440, "原画": 2160}  # 清晰度名称对应的大致分辨率
+MEDIA_URL_PATTERN = r"\.(m3u8|ts|m4s|mp4|flv|webm|mp3|aac|m4a|wav)(\?|$)"  # 按链接后缀识别媒体请求
+EPISODE_CHECKPOINT_INTERVAL = 30  # 播放中保存单集断点位置的间隔（秒）
+EPISODE_RESUME_REWIND = 3  # 从断点续播时往回多播几秒，避免断点附近的进度没有被站点记上
 WAIT_TIMEOUT = 30
 POLL_FREQUENCY = 10  # 检查间隔（秒）- 改为10秒，更及时的进度反馈
 COMPLETION_THRESHOLD = 1  # 剩余1秒视为完成
@@ -62,15 +167,573 @@ VIDEO_SELECTOR = "video.dplayer-video-current"  # 根据页面结构调整
 LOGIN_URL = "https://www.zjce.gov.cn/login"
 BASE_URL = "https://www.zjce.gov.cn"
 STUCK_DETECTION_INTERVAL = 5  # 检测进度卡住的间隔（秒）
-MAX_STUCK_COUNT = 3  # 最大允许进度卡住的次数
+MAX_STUCK_COUNT = 5  # 每集最多尝试恢复卡顿的次数，用完仍卡住才算失败
+STALL_RECOVERY_STEPS = ["nudge", "seek", "reload"]  # 连续卡住时依次升级：继续播放 → 原地重新定位 → 重新加载页面并回到上次位置
+VIDEO_ID_PATTERN = r"/videos/detail/([0-9A-Za-z_-]+)"  # 从详情页链接中提取视频ID，所有进度记录以视频ID为键
 EPISODE_SELECTOR = ".video-episode, .episode-list, .next-episode, [class*='episode'], [class*='Episode']"  # 集数选择器
 MAX_EPISODES_PER_VIDEO = 50  # 每个视频最大集数限制，防止无限循环
+MONITOR_MODE = "event"  # 播放监控模式：event=页面事件驱动长轮询，poll=按POLL_FREQUENCY定时轮询
+EVENT_WAIT_TIMEOUT = 60  # 事件模式下单次长轮询最长阻塞时间（秒），到时返回一次进度快照
+LOGIN_PROBE_PATH = "/videos"  # 登录探测地址，建议改成需要登录的轻量接口（未登录返回401/403或跳转登录页），也可用 --login-probe-path 指定
+# 注意：/videos 如果是单页应用外壳，未登录也返回200，探测只能发现跳转，发现不了接口层面的会话过期
+LOGIN_PROBE_INTERVAL = 300  # 后台登录探测间隔（秒）
+LOGIN_PROBE_TIMEOUT = 10  # 单次探测HTTP请求超时（秒）
+PAGE_LOAD_STRATEGY = "eager"  # 页面加载策略：eager=DOM就绪即返回，不等图片等资源；normal=等待全部加载
+STEP_TIMEOUTS = {  # 各等待步骤的超时（秒），等待的是具体的就绪信号而不是固定时长
+    "page_ready": 15,  # document.readyState 变为 interactive/complete
+    "login_check": 10,  # 跳转到登录页，或出现用户信息/退出登录元素
+    "video_present": WAIT_TIMEOUT,  # 出现 VIDEO_SELECTOR 元素
+    "video_metadata": 15,  # video 触发 loadedmetadata（readyState >= 1）
+    "episode_switch": 10,  # 点击下一集后页面URL或视频源发生变化
+    "quality_switch": 15,  # 切换清晰度后播放器换上新的 video 元素
+}
+CHROME_USER_DATA_DIR = None  # 持久化Chrome用户目录（如 './chrome_profile'），登录状态随浏览器保留；None表示每次使用临时目录（多账号模式下按账号自动设置）
+INTERACTIVE_LOGIN = True  # 是否允许在终端等待手动登录（多账号工作进程中自动关闭）
+
+# 浏览器配置：default=有界面的普通Chrome，lean=无头低资源模式（适合长时间无人值守、单机多会话）
+BROWSER_PROFILE = "default"
+LEAN_WINDOW_SIZE = "800,600"  # lean 模式固定的小窗口尺寸
+LEAN_RENDERER_PROCESS_LIMIT = 2  # lean 模式渲染进程数上限
+LEAN_CHROME_ARGUMENTS = [
+    "--headless=new",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-sync",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--no-first-run",
+    "--disable-dev-shm-usage",
+    "--disable-features=Translate,MediaRouter,OptimizationHints",
+    # 保证无头/后台状态下计时器和媒体播放不被节流
+    "--disable-renderer-backgrounding",
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+]
+SESSION_RSS_BUDGET_MB = 600  # 单个浏览器会话（chromedriver+Chrome进程树）内存预算
+SESSION_CPU_BUDGET_PERCENT = 50  # 单个浏览器会话CPU预算（100表示一个核）
+
+# 预加载：当前视频播放时在后台标签页打开下一个视频，结束后直接切换过去
+PREFETCH_NEXT_VIDEO = True
+PREFETCH_WINDOW_NAME = "zl_prefetch"  # 预加载标签页的窗口名
+PREFETCH_COMPLETED_SELECTOR = ".video-finished, .study-finished, .is-finished"  # 详情页"已学完"标识（根据页面结构调整），预加载时发现则直接记为完成；None表示不检测
+
+# 浏览器生命周期：长时间运行时定期重启浏览器，避免渲染进程内存持续上涨导致崩溃
+RECYCLE_AFTER_VIDEOS = 20  # 每播放多少个视频重启一次浏览器，0表示不按数量重启
+BROWSER_RECYCLE_RSS_MB = 1200  # 浏览器会话内存超过该值时，在当前视频结束后重启浏览器
+BROWSER_WATCHDOG_INTERVAL = 30  # 后台内存采样间隔（秒）
+
+# chromedriver解析：优先使用本地缓存目录和PATH中与Chrome主版本匹配的驱动，启动时不联网
+CHROME_BINARY = None  # Chrome可执行文件路径，None表示自动查找
+DRIVER_CACHE_DIR = './drivers'  # 本地驱动缓存：drivers/<Chrome主版本号>/chromedriver
+ALLOW_DRIVER_DOWNLOAD = False  # 本地没有匹配驱动时是否允许webdriver-manager联网下载（run --allow-driver-download）
+DRIVER_EXECUTABLE = "chromedriver.exe" if os.name == "nt" else "chromedriver"
+
+# 多账号工作池配置
+ACCOUNTS_PATH = './accounts.json'  # 账号列表：[{"name": "张三", "dir": "./accounts/zhangsan"}, ...]
+ACCOUNTS_DIR = './accounts'  # 账号未指定dir时使用 ACCOUNTS_DIR/<name>
+POOL_MAX_WORKERS = max(1, (os.cpu_count() or 2) // 2)  # 同时运行的工作进程数（每个进程一个Chrome）
+WORKER_MAX_RESTARTS = 3  # 工作进程连续异常退出的最大重启次数（内存超限重启不计入，完成视频后清零）
+WORKER_RESTART_DELAY = 30  # 重启前等待的基础秒数，按重启次数递增
+WORKER_RSS_LIMIT_MB = 1500  # 单个工作进程（含其Chrome进程树）内存上限，超过则重启
+WORKER_CPU_LIMIT_PERCENT = 150  # 单个工作进程树CPU占用告警阈值（100表示一个核）
+WORKER_PIN_CPUS = True  # 是否把各工作进程绑定到互不重叠的CPU核（仅Linux）
+WORKER_LOG_NAME = 'worker.log'  # 工作进程输出重定向到账号目录下的日志文件
+POOL_BROWSER_PROFILE = "lean"  # 工作进程使用的浏览器配置
+POOL_MONITOR_INTERVAL = 10  # 监督进程检查工作进程的间隔（秒）
+POOL_REPORT_INTERVAL = 300  # 监督进程打印汇总统计的间隔（秒）
+COORDINATOR_PATH = './coordinator.db'  # 多台机器共享的工作队列：SQLite文件路径，或协调服务地址 http://host:port
+COORDINATOR_PORT = 8766  # python zlstudy.py coord serve 默认监听的端口
+COORDINATOR_HTTP_TIMEOUT = 30  # 访问协调服务的请求超时（秒）
+COORDINATOR_LEASE_SECONDS = 300  # 账号和视频租约有效期（秒），节点失联超过这个时间后工作交给其他节点
+COORDINATOR_HEARTBEAT_INTERVAL = 60  # 节点续租间隔（秒）
+COORDINATOR_IDLE_WAIT = 30  # 暂时没有可领取的账号时，节点等待多久再问（秒）
+
+# 按账号区分的配置项及其在账号目录中的文件名
+ACCOUNT_FILE_SETTINGS = {
+    "TXT_PATH": "zlstudy.txt",
+    "COOKIES_PATH": "cookies.json",
+    "COMPLETED_VIDEOS_PATH": "completed_videos.json",
+    "FAILED_VIDEOS_PATH": "failed_videos.json",
+    "COMPLETED_JOURNAL_PATH": "completed_videos.jsonl",
+    "FAILED_JOURNAL_PATH": "failed_videos.jsonl",
+    "PROGRESS_DB_PATH": "progress.db",
+    "EPISODE_PROGRESS_PATH": "episode_progress.json",
+    "EPISODE_JOURNAL_PATH": "episode_progress.jsonl",
+    "METRICS_PATH": "metrics.jsonl",
+    "CATALOG_PATH": "catalog.json",
+    "CATALOG_CACHE_PATH": "catalog_cache.json",
+    "DURATION_INDEX_PATH": "duration_index.json",
+    "CHROME_USER_DATA_DIR": "chrome_profile",
+}
+
+# main() 的退出码
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_LOGIN_REQUIRED = 2  # 需要人工登录，工作池不会自动重启
+EXIT_INTERRUPTED = 130
+
+# 事件日志已写入的条数，用于决定何时合并进快照
+_journal_event_counts = {}
+# 本进程已修复过末行的事件日志（只有追加写入的进程才修复）
+_repaired_journals = set()
+# 只读子命令（status/failed/export）运行中：损坏的快照不改名备份、不创建账号目录，不改动任何文件
+_read_only_files = False
+
+def atomic_write_json(path, data):
+    """先写同目录临时文件再原子替换，写入中途崩溃也不会留下半截文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def load_json_snapshot(path, default):
+    """读取快照文件，文件损坏时改名备份并返回默认值，而不是静默当作空记录"""
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except ValueError as e:
+        if _read_only_files:
+            # 写到stderr，不混进 status --json 等子命令的输出
+            print(f"⚠️  快照文件 {path} 已损坏 ({str(e)})，只读模式下按空记录处理", file=sys.stderr)
+            return default
+        backup_path = f"{path}.corrupt-{time.strftime('%Y%m%d%H%M%S')}"
+        os.replace(path, backup_path)
+        print(f"⚠️  快照文件 {path} 已损坏 ({str(e)})，已备份为 {backup_path}，将从事件日志恢复")
+        return default
+
+def append_journal(path, event):
+    """追加一条事件到JSONL日志（每次O(1)写入），返回日志当前条数；本进程第一次追加前先修复末行"""
+    if path not in _repaired_journals:
+        repair_journal(path)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    _journal_event_counts[path] = _journal_event_counts.get(path, 0) + 1
+    return _journal_event_counts[path]
+
+def repair_journal(path):
+    """
+    截掉崩溃时写了一半的最后一行，避免之后追加的事件与其粘连
+    只能由追加写入该日志的进程调用（见 append_journal），其他进程读到的残行可能是正在写入的事件
+    """
+    _repaired_journals.add(path)
+    if not os.path.exists(path):
+        return
+    with open(path, 'r+b') as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            valid_length = data.rfind(b"\n") + 1
+            f.truncate(valid_length)
+            print(f"⚠️  事件日志 {path} 末行不完整，已丢弃 {len(data) - valid_length} 字节")
+
+def replay_journal(path):
+    """回放JSONL事件日志（只读），跳过没有换行符的最后一行（崩溃残行或其他进程正在写入的事件）"""
+    events = []
+    if not os.path.exists(path):
+        _journal_event_counts[path] = 0
+        return events
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    data = data[:data.rfind(b"\n") + 1]
+
+    for lineno, line in enumerate(data.decode('utf-8', errors='replace').splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            print(f"⚠️  跳过事件日志 {path} 第{lineno}行的损坏记录")
+
+    _journal_event_counts[path] = len(events)
+    return events
+
+def truncate_journal(path):
+    """快照落盘后清空事件日志"""
+    if os.path.exists(path):
+        with open(path, 'w', encoding='utf-8'):
+            pass
+    _journal_event_counts[path] = 0
+
+PROGRESS_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video TEXT PRIMARY KEY,                 -- 视频ID（见 video_key）
+    url TEXT,                               -- 最近使用的详情页链接
+    status TEXT NOT NULL DEFAULT 'pending', -- pending / completed / failed
+    reason TEXT,                            -- 最近一次失败原因或完成说明
+    duration REAL,                          -- 各集时长合计（秒）
+    episodes INTEGER,                       -- 已播放集数
+    attempts INTEGER NOT NULL DEFAULT 0,
+    failure_kind TEXT,                      -- 失败类型（见 FAILURE_KINDS）
+    failures INTEGER NOT NULL DEFAULT 0,    -- 连续失败次数，完成或手动放行后清零
+    retry_at TEXT,                          -- 下次自动重试时间，NULL表示已停放
+    list_order INTEGER,                     -- 在视频链接列表中的位置，不在列表中为NULL
+    added_at TEXT,
+    updated_at TEXT,
+    completed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_videos_status ON videos(status, list_order);
+CREATE TABLE IF NOT EXISTS episodes (
+    video TEXT NOT NULL,
+    episode INTEGER NOT NULL,
+    label TEXT,
+    duration REAL,
+    position REAL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT,
+    PRIMARY KEY (video, episode)
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video TEXT NOT NULL,
+    started_at TEXT,
+    elapsed REAL,
+    success INTEGER NOT NULL,
+    reason TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_video ON attempts(video);
+CREATE TABLE IF NOT EXISTS recoveries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video TEXT NOT NULL,
+    episode INTEGER,
+    step TEXT NOT NULL,                     -- nudge / seek / reload
+    diagnostic TEXT,                        -- 触发恢复时的video状态
+    position REAL,                          -- 最后确认的播放位置
+    ok INTEGER NOT NULL,                    -- 恢复动作是否执行成功
+    created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS network (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video TEXT NOT NULL,
+    recorded_at TEXT,
+    page_ttfb REAL,                         -- 详情页首字节时间（秒）
+    media_ttfb REAL,                        -- 媒体请求首字节时间中位数（秒）
+    media_bytes INTEGER,
+    throughput_kbps REAL,
+    rebuffers INTEGER,
+    rebuffer_seconds REAL,
+    failed_requests INTEGER,
+    failures TEXT                           -- 失败请求示例（JSON列表）
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# SQLite进度库连接（按需打开）
+_progress_db = None
+# JSON后端的单集断点记录（按需加载）：{视频URL: {"集数": {...}}}
+_episode_progress = None
+
+def now_timestamp():
+    """当前时间字符串，与记录文件中的格式一致"""
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+def get_progress_db():
+    """打开SQLite进度库，首次使用时建表并导入已有的JSON记录"""
+    global _progress_db
+    if _progress_db is None:
+        conn = sqlite3.connect(PROGRESS_DB_PATH)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(PROGRESS_DB_SCHEMA)
+        add_missing_columns(conn)
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'video_keys'").fetchone() is None:
+            migrate_video_keys(conn)
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone() is None:
+            import_json_progress(conn)
+        _progress_db = conn
+    return _progress_db
+
+def add_missing_columns(conn):
+    """给旧版进度库补上后来新增的失败重试字段"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(videos)")}
+    with conn:
+        if "failure_kind" not in columns:
+            conn.execute("ALTER TABLE videos ADD COLUMN failure_kind TEXT")
+        if "failures" not in columns:
+            conn.execute("ALTER TABLE videos ADD COLUMN failures INTEGER NOT NULL DEFAULT 0")
+        if "retry_at" not in columns:
+            conn.execute("ALTER TABLE videos ADD COLUMN retry_at TEXT")
+
+def migrate_video_keys(conn):
+    """把旧版以完整链接为键的记录改为以视频ID为键，同一视频的多条记录合并（已完成优先）"""
+    migrated = 0
+    with conn:
+        if "url" not in {row[1] for row in conn.execute("PRAGMA table_info(videos)")}:
+            conn.execute("ALTER TABLE videos ADD COLUMN url TEXT")
+        for video, status in conn.execute("SELECT video, status FROM videos").fetchall():
+            key = video_key(video)
+            if key == video:
+                continue
+            conn.execute("UPDATE videos SET url = COALESCE(url, video) WHERE video = ?", (video,))
+            existing = conn.execute("SELECT status FROM videos WHERE video = ?", (key,)).fetchone()
+            if existing is None:
+                conn.execute("UPDATE videos SET video = ? WHERE video = ?", (key, video))
+            else:
+                if status == "completed" and existing[0] != "completed":
+                    conn.execute(
+                        "UPDATE videos SET status = 'completed', reason = NULL, "
+                        "completed_at = (SELECT completed_at FROM videos WHERE video = ?) WHERE video = ?",
+                        (video, key))
+                conn.execute("UPDATE videos SET attempts = attempts + (SELECT attempts FROM videos WHERE video = ?) "
+                             "WHERE video = ?", (video, key))
+                conn.execute("DELETE FROM videos WHERE video = ?", (video,))
+            conn.execute("UPDATE OR IGNORE episodes SET video = ? WHERE video = ?", (key, video))
+            conn.execute("DELETE FROM episodes WHERE video = ?", (video,))
+            conn.execute("UPDATE attempts SET video = ? WHERE video = ?", (key, video))
+            migrated += 1
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('video_keys', ?)", (now_timestamp(),))
+    if migrated:
+        print(f"🔑 已把 {migrated} 条以链接为键的视频记录迁移为以视频ID为键")
+
+def import_json_progress(conn):
+    """把completed_videos.json/failed_videos.json（含事件日志）导入SQLite进度库"""
+    completed_videos = read_completed_records()
+    failed_videos = read_failed_records()
+    timestamp = now_timestamp()
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO videos (video, status, added_at, updated_at, completed_at) "
+            "VALUES (?, 'completed', ?, ?, ?)",
+            [(url, timestamp, timestamp, timestamp) for url in completed_videos])
+        conn.executemany(
+            "INSERT OR IGNORE INTO videos (video, status, reason, failure_kind, failures, retry_at, "
+            "added_at, updated_at) VALUES (?, 'failed', ?, ?, ?, ?, ?, ?)",
+            [(url, info.get("reason"), info["kind"], info["failures"], info["retry_at"],
+              timestamp, info.get("timestamp", timestamp))
+             for url, info in failed_videos.items()])
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)", (timestamp,))
+    print(f"📥 已导入JSON进度记录到 {PROGRESS_DB_PATH}: 完成 {len(completed_videos)} 个, 失败 {len(failed_videos)} 个")
+
+def sync_video_queue(video_urls):
+    """把当前视频链接列表（已去重）同步进进度库（新视频记为待处理，并记录列表顺序和链接）"""
+    if PROGRESS_BACKEND != "sqlite":
+        return
+    db = get_progress_db()
+    timestamp = now_timestamp()
+    with db:
+        db.execute("UPDATE videos SET list_order = NULL WHERE list_order IS NOT NULL")
+        db.executemany(
+            "INSERT INTO videos (video, url, list_order, added_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(video) DO UPDATE SET list_order = excluded.list_order, url = excluded.url",
+            [(video_key(url), url, order, timestamp, timestamp) for order, url in enumerate(video_urls)])
+
+def record_attempt(video_id, started_at, elapsed, success, reason=""):
+    """记录一次视频播放尝试（仅SQLite后端保存）"""
+    if PROGRESS_BACKEND != "sqlite":
+        return
+    db = get_progress_db()
+    with db:
+        db.execute(
+            "INSERT INTO attempts (video, started_at, elapsed, success, reason) VALUES (?, ?, ?, ?, ?)",
+            (video_id, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at)),
+             elapsed, 1 if success else 0, reason))
+        db.execute("UPDATE videos SET attempts = attempts + 1 WHERE video = ?", (video_id,))
+
+def record_network_summary(video_id, network):
+    """记录一个视频的网络抓取汇总（仅SQLite后端保存，JSON后端见指标文件）"""
+    if PROGRESS_BACKEND != "sqlite":
+        return
+    db = get_progress_db()
+    with db:
+        db.execute(
+            "INSERT INTO network (video, recorded_at, page_ttfb, media_ttfb, media_bytes, throughput_kbps, "
+            "rebuffers, rebuffer_seconds, failed_requests, failures) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (video_id, now_timestamp(), network["page_ttfb"], network["media_ttfb"], network["media_bytes"],
+             network["throughput_kbps"], network["rebuffers"], network["rebuffer_seconds"],
+             network["failed_requests"], json.dumps(network["failures"], ensure_ascii=False)))
+
+def record_recovery(video_id, episode, step, diagnostic, position, ok):
+    """记录一次卡顿恢复及触发它的诊断信息（写入指标文件，SQLite后端同时写入recoveries表）"""
+    _live["recoveries"][(step, "ok" if ok else "failed")] += 1
+    write_metric({"type": "recovery", "video": video_id, "episode": episode, "step": step,
+                  "diagnostic": diagnostic, "position": position, "ok": ok})
+    if PROGRESS_BACKEND != "sqlite":
+        return
+    db = get_progress_db()
+    with db:
+        db.execute(
+            "INSERT INTO recoveries (video, episode, step, diagnostic, position, ok, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (video_id, episode, step, diagnostic, position, 1 if ok else 0, now_timestamp()))
+
+def record_episode_progress(video_id, episode, label, duration, position, completed):
+    """
+    记录单集播放进度（断点），重启后据此跳到第一个未完成的集数并从上次位置继续
+    JSON后端追加事件日志，累计到阈值后合并快照（合并时去掉已完成视频的断点）
+    """
+    global _episode_progress
+    if PROGRESS_BACKEND != "sqlite":
+        if _episode_progress is None:
+            _episode_progress = read_episode_records()
+        record = {
+            "label": label,
+            "duration": duration,
+            "position": position,
+            "completed": bool(completed),
+            "updated_at": now_timestamp(),
+        }
+        _episode_progress.setdefault(video_id, {})[str(episode)] = record
+        try:
+            journal_size = append_journal(EPISODE_JOURNAL_PATH, {"op": "episode", "video": video_id,
+                                                                 "episode": episode, **record})
+            if journal_size >= JOURNAL_COMPACT_THRESHOLD:
+                compact_episode_progress()
+        except Exception as e:
+            print(f"⚠️  保存单集断点失败: {str(e)}")
+        return
+    db = get_progress_db()
+    with db:
+        db.execute(
+            "INSERT INTO episodes (video, episode, label, duration, position, completed, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(video, episode) DO UPDATE SET label = excluded.label, duration = excluded.duration, "
+            "position = excluded.position, completed = excluded.completed, updated_at = excluded.updated_at",
+            (video_id, episode, label, duration, position, 1 if completed else 0, now_timestamp()))
+
+def read_episode_records():
+    """读取单集断点快照并回放事件日志，旧版以链接为键的记录按视频ID合并"""
+    episode_records = {}
+    for video, episodes in load_json_snapshot(EPISODE_PROGRESS_PATH, {}).items():
+        episode_records.setdefault(video_key(video), {}).update(episodes)
+    for event in replay_journal(EPISODE_JOURNAL_PATH):
+        if event.get("op") == "episode" and event.get("video"):
+            episode_records.setdefault(event["video"], {})[str(event["episode"])] = {
+                key: event.get(key) for key in ("label", "duration", "position", "completed", "updated_at")}
+    return episode_records
+
+def compact_episode_progress():
+    """把单集断点合并进快照并清空事件日志；已完成视频的断点不再需要，合并时删除，快照不随历史增长"""
+    completed = read_completed_records()
+    for video in [video for video in _episode_progress if video in completed]:
+        del _episode_progress[video]
+    atomic_write_json(EPISODE_PROGRESS_PATH, _episode_progress)
+    truncate_journal(EPISODE_JOURNAL_PATH)
+
+def load_episode_progress(video_id):
+    """
+    读取视频的单集断点记录
+    返回: {集数: {"label", "duration", "position", "completed"}}，没有记录时为空字典
+    """
+    global _episode_progress
+    if PROGRESS_BACKEND == "sqlite":
+        rows = get_progress_db().execute(
+            "SELECT episode, label, duration, position, completed FROM episodes WHERE video = ?",
+            (video_id,)).fetchall()
+        return {episode: {"label": label, "duration": duration, "position": position, "completed": bool(completed)}
+                for episode, label, duration, position, completed in rows}
+    if _episode_progress is None:
+        _episode_progress = read_episode_records()
+    return {int(episode): record for episode, record in _episode_progress.get(video_id, {}).items()}
+
+def parse_timestamp(timestamp):
+    """把记录文件中的时间字符串转为时间戳，格式不对（如"未知时间"）时返回None"""
+    try:
+        return time.mktime(time.strptime(timestamp, "%Y-%m-%d %H:%M:%S"))
+    except (TypeError, ValueError):
+        return None
+
+def classify_failure(reason):
+    """
+    按失败原因判断失败类型
+    返回: (类型, 是否临时故障)
+    """
+    for kind, pattern, transient in FAILURE_KINDS:
+        if re.search(pattern, reason or ""):
+            return kind, transient
+    return "unknown", False
+
+def schedule_retry(kind_transient, failures, failed_at=None):
+    """临时故障按指数退避计算下次重试时间，硬失败或失败次数用完返回None（停放）"""
+    if not kind_transient or failures >= RETRY_MAX_ATTEMPTS:
+        return None
+    delay = min(RETRY_BACKOFF_BASE * 2 ** (failures - 1), RETRY_BACKOFF_MAX)
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime((failed_at or time.time()) + delay))
+
+def normalize_failure(info):
+    """给旧版失败记录补上类型、失败次数和重试时间（按原因重新分类）"""
+    kind, transient = classify_failure(info.get("reason"))
+    info.setdefault("kind", kind)
+    info["failures"] = info.get("failures") or 1
+    if "retry_at" not in info:
+        info["retry_at"] = schedule_retry(transient, info["failures"], parse_timestamp(info.get("timestamp")))
+    return info
+
+def retry_due(info, now=None):
+    """失败记录是否已到自动重试时间（已停放的记录永远不到期）"""
+    retry_at = parse_timestamp(info.get("retry_at"))
+    return retry_at is not None and retry_at <= (now or time.time())
+
+def read_completed_records():
+    """读取JSON快照并回放事件日志，返回已完成视频ID集合（不打印，旧版以链接记录的转换为视频ID）"""
+    completed_videos = {video_key(video) for video in load_json_snapshot(COMPLETED_VIDEOS_PATH, [])}
+    for event in replay_journal(COMPLETED_JOURNAL_PATH):
+        video = event.get("video") or event.get("url")
+        if event.get("op") == "completed" and video:
+            completed_videos.add(video_key(video))
+    return completed_videos
+
+def read_failed_records():
+    """读取JSON快照并回放事件日志，返回失败视频字典（不打印）"""
+    failed_data = load_json_snapshot(FAILED_VIDEOS_PATH, {})
+    
+    # 兼容旧格式(列表)和新格式(字典)
+    if isinstance(failed_data, list):
+        # 旧格式：转换为新格式
+        failed_videos = {}
+        for url in failed_data:
+            failed_videos[url] = {
+                "reason": "未知原因",
+                "timestamp": "未知时间"
+            }
+    else:
+        # 新格式：直接使用
+        failed_videos = failed_data
+    # 旧版以链接为键的记录转换为视频ID
+    failed_videos = {video_key(video): info for video, info in failed_videos.items()}
+    
+    for event in replay_journal(FAILED_JOURNAL_PATH):
+        video = event.get("video") or event.get("url")
+        if not video:
+            continue
+        video = video_key(video)
+        if event.get("op") == "failed":
+            failed_videos[video] = {key: event[key] for key in ("kind", "failures", "retry_at") if key in event}
+            failed_videos[video].update({
+                "reason": event.get("reason", "未知原因"),
+                "timestamp": event.get("timestamp", "未知时间")
+            })
+        elif event.get("op") == "removed":
+            failed_videos.pop(video, None)
+    for info in failed_videos.values():
+        normalize_failure(info)
+    return failed_videos
 
 def save_completed_videos(completed_videos):
-    """保存已完成视频列表到文件"""
+    """保存已完成视频列表到快照文件，并合并清空事件日志"""
     try:
-        with open(COMPLETED_VIDEOS_PATH, 'w', encoding='utf-8') as f:
-            json.dump(list(completed_videos), f, ensure_ascii=False, indent=2)
+        if PROGRESS_BACKEND == "sqlite":
+            # SQLite后端每条记录已即时提交，这里只需确保没有未提交的事务
+            get_progress_db().commit()
+            return True
+        atomic_write_json(COMPLETED_VIDEOS_PATH, list(completed_videos))
+        truncate_journal(COMPLETED_JOURNAL_PATH)
         print(f"✅ 已完成视频记录已保存到 {COMPLETED_VIDEOS_PATH}")
         return True
     except Exception as e:
@@ -78,16 +741,23 @@ def save_completed_videos(completed_videos):
         return False
 
 def load_completed_videos():
-    """从文件加载已完成视频列表"""
+    """从快照文件（或SQLite进度库）加载已完成视频列表，并回放事件日志"""
     try:
-        if not os.path.exists(COMPLETED_VIDEOS_PATH):
+        if PROGRESS_BACKEND == "sqlite":
+            completed_videos = {row[0] for row in get_progress_db().execute(
+                "SELECT video FROM videos WHERE status = 'completed'")}
+            print(f"📋 已从 {PROGRESS_DB_PATH} 加载 {len(completed_videos)} 个已完成视频记录")
+            return completed_videos
+        
+        if not os.path.exists(COMPLETED_VIDEOS_PATH) and not os.path.exists(COMPLETED_JOURNAL_PATH):
             print("📝 未找到已完成视频记录文件，将创建新记录")
             return set()
         
-        with open(COMPLETED_VIDEOS_PATH, 'r', encoding='utf-8') as f:
-            completed_list = json.load(f)
+        completed_videos = read_completed_records()
+        journal_size = _journal_event_counts.get(COMPLETED_JOURNAL_PATH, 0)
+        if journal_size:
+            print(f"📜 已回放 {journal_size} 条已完成事件日志")
         
-        completed_videos = set(completed_list)
         print(f"📋 已加载 {len(completed_videos)} 个已完成视频记录")
         
         # 显示最近完成的几个视频（可选）
@@ -105,27 +775,52 @@ def load_completed_videos():
         print(f"❌ 加载已完成视频记录失败: {str(e)}")
         return set()
 
-def add_completed_video(completed_videos, video_url):
-    """添加已完成视频到记录中"""
-    completed_videos.add(video_url)
-    save_completed_videos(completed_videos)
-    print(f"✅ 已记录完成视频: {video_url}")
+def add_completed_video(completed_videos, video_id):
+    """添加已完成视频到记录中（追加事件日志，累计到阈值后合并快照）"""
+    timestamp = now_timestamp()
+    
+    completed_videos.add(video_id)
+    if PROGRESS_BACKEND == "sqlite":
+        db = get_progress_db()
+        with db:
+            db.execute(
+                "INSERT INTO videos (video, status, added_at, updated_at, completed_at) "
+                "VALUES (?, 'completed', ?, ?, ?) "
+                "ON CONFLICT(video) DO UPDATE SET status = 'completed', updated_at = excluded.updated_at, "
+                "completed_at = excluded.completed_at",
+                (video_id, timestamp, timestamp, timestamp))
+            db.execute(
+                "UPDATE videos SET duration = (SELECT SUM(duration) FROM episodes WHERE episodes.video = videos.video), "
+                "episodes = (SELECT COUNT(*) FROM episodes WHERE episodes.video = videos.video AND completed = 1) "
+                "WHERE video = ?", (video_id,))
+    else:
+        journal_size = append_journal(COMPLETED_JOURNAL_PATH, {
+            "op": "completed",
+            "video": video_id,
+            "timestamp": timestamp
+        })
+        if journal_size >= JOURNAL_COMPACT_THRESHOLD:
+            save_completed_videos(completed_videos)
+    print(f"✅ 已记录完成视频: {video_id}")
 
 def save_failed_videos(failed_videos):
-    """保存失败视频列表到文件"""
-    try:
-        with open(FAILED_VIDEOS_PATH, 'w', encoding='utf-8') as f:
-            # 如果是旧格式(只有URL的列表)，转换为新格式
-            if failed_videos and isinstance(next(iter(failed_videos)), str):
-                failed_dict = {}
-                for url in failed_videos:
-                    failed_dict[url] = {
-                        "reason": "未知原因",
-                        "timestamp": "未知时间"
-                    }
-                json.dump(failed_dict, f, ensure_ascii=False, indent=2)
-            else:
-                json.dump(failed_videos, f, ensure_ascii=False, indent=2)
+    """保存失败视频列表到快照文件，并合并清空事件日志"""
+    try:
+        if PROGRESS_BACKEND == "sqlite":
+            get_progress_db().commit()
+            return True
+        # 如果是旧格式(只有URL的列表)，转换为新格式
+        if failed_videos and isinstance(next(iter(failed_videos)), str) and not isinstance(failed_videos, dict):
+            failed_dict = {}
+            for url in failed_videos:
+                failed_dict[url] = {
+                    "reason": "未知原因",
+                    "timestamp": "未知时间"
+                }
+            atomic_write_json(FAILED_VIDEOS_PATH, failed_dict)
+        else:
+            atomic_write_json(FAILED_VIDEOS_PATH, failed_videos)
+        truncate_journal(FAILED_JOURNAL_PATH)
         print(f"⚠️  失败视频记录已保存到 {FAILED_VIDEOS_PATH}")
         return True
     except Exception as e:
@@ -133,27 +828,28 @@ def save_failed_videos(failed_videos):
         return False
 
 def load_failed_videos():
-    """从文件加载失败视频列表"""
+    """从快照文件（或SQLite进度库）加载失败视频列表，并回放事件日志"""
     try:
-        if not os.path.exists(FAILED_VIDEOS_PATH):
+        if PROGRESS_BACKEND == "sqlite":
+            failed_videos = {}
+            for url, reason, updated_at, kind, failures, retry_at in get_progress_db().execute(
+                    "SELECT video, reason, updated_at, failure_kind, failures, retry_at FROM videos "
+                    "WHERE status = 'failed'"):
+                failed_videos[url] = {"reason": reason or "未知原因", "timestamp": updated_at or "未知时间"}
+                if kind:  # 旧版记录没有类型，按原因重新分类
+                    failed_videos[url].update({"kind": kind, "failures": failures, "retry_at": retry_at})
+                normalize_failure(failed_videos[url])
+            print(f"⚠️  已从 {PROGRESS_DB_PATH} 加载 {len(failed_videos)} 个失败视频记录")
+            return failed_videos
+        
+        if not os.path.exists(FAILED_VIDEOS_PATH) and not os.path.exists(FAILED_JOURNAL_PATH):
             print("📝 未找到失败视频记录文件，将创建新记录")
             return {}
         
-        with open(FAILED_VIDEOS_PATH, 'r', encoding='utf-8') as f:
-            failed_data = json.load(f)
-        
-        # 兼容旧格式(列表)和新格式(字典)
-        if isinstance(failed_data, list):
-            # 旧格式：转换为新格式
-            failed_videos = {}
-            for url in failed_data:
-                failed_videos[url] = {
-                    "reason": "未知原因",
-                    "timestamp": "未知时间"
-                }
-        else:
-            # 新格式：直接使用
-            failed_videos = failed_data
+        failed_videos = read_failed_records()
+        journal_size = _journal_event_counts.get(FAILED_JOURNAL_PATH, 0)
+        if journal_size:
+            print(f"📜 已回放 {journal_size} 条失败事件日志")
         
         print(f"⚠️  已加载 {len(failed_videos)} 个失败视频记录")
         
@@ -165,7 +861,7 @@ def load_failed_videos():
                 short_url = url if len(url) <= 40 else url[:37] + "..."
                 reason = failed_videos[url].get("reason", "未知")
                 timestamp = failed_videos[url].get("timestamp", "未知")
-                print(f"   {i}. {short_url} [{reason}] ({timestamp})")
+                print(f"   {i}. {short_url} [{reason}] ({timestamp}) {describe_retry(failed_videos[url])}")
             if len(failed_videos) > 3:
                 print(f"   ... (还有 {len(failed_videos) - 3} 个)")
         
@@ -174,17 +870,516 @@ def load_failed_videos():
         print(f"❌ 加载失败视频记录失败: {str(e)}")
         return {}
 
-def add_failed_video(failed_videos, video_url, reason=""):
-    """添加失败视频到记录中"""
-    import datetime
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def describe_retry(info):
+    """失败记录的重试状态说明"""
+    if info.get("retry_at"):
+        return f"{info.get('kind')}，第{info.get('failures')}次失败，{info['retry_at']} 后重试"
+    return f"{info.get('kind')}，第{info.get('failures')}次失败，已停放"
+
+def add_failed_video(failed_videos, video_id, reason=""):
+    """
+    添加失败视频到记录中（追加事件日志，累计到阈值后合并快照）
+    按原因分类，临时故障按失败次数指数退避安排下次重试，硬失败和重试次数用完的停放
+    """
+    timestamp = now_timestamp()
+    kind, transient = classify_failure(reason)
+    failures = failed_videos.get(video_id, {}).get("failures", 0) + 1
     
-    failed_videos[video_url] = {
+    failed_videos[video_id] = {
         "reason": reason or "未知原因",
-        "timestamp": timestamp
+        "timestamp": timestamp,
+        "kind": kind,
+        "failures": failures,
+        "retry_at": schedule_retry(transient, failures)
     }
+    if PROGRESS_BACKEND == "sqlite":
+        db = get_progress_db()
+        with db:
+            db.execute(
+                "INSERT INTO videos (video, status, reason, failure_kind, failures, retry_at, added_at, updated_at) "
+                "VALUES (?, 'failed', ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(video) DO UPDATE SET status = 'failed', reason = excluded.reason, "
+                "failure_kind = excluded.failure_kind, failures = excluded.failures, retry_at = excluded.retry_at, "
+                "updated_at = excluded.updated_at",
+                (video_id, failed_videos[video_id]["reason"], kind, failures, failed_videos[video_id]["retry_at"],
+                 timestamp, timestamp))
+    else:
+        journal_size = append_journal(FAILED_JOURNAL_PATH, {
+            "op": "failed",
+            "video": video_id,
+            **failed_videos[video_id]
+        })
+        if journal_size >= JOURNAL_COMPACT_THRESHOLD:
+            save_failed_videos(failed_videos)
+    print(f"⚠️  已记录失败视频: {reason} - {video_id} ({describe_retry(failed_videos[video_id])})")
+
+def remove_failed_video(failed_videos, video_id):
+    """从失败记录中移除视频（追加事件日志）"""
+    if video_id not in failed_videos:
+        return
+    del failed_videos[video_id]
+    if PROGRESS_BACKEND == "sqlite":
+        db = get_progress_db()
+        with db:
+            db.execute("UPDATE videos SET status = 'pending', failure_kind = NULL, failures = 0, retry_at = NULL, "
+                       "updated_at = ? WHERE video = ? AND status = 'failed'",
+                       (now_timestamp(), video_id))
+        return
+    journal_size = append_journal(FAILED_JOURNAL_PATH, {"op": "removed", "video": video_id})
+    if journal_size >= JOURNAL_COMPACT_THRESHOLD:
+        save_failed_videos(failed_videos)
+
+def release_failed_videos(kinds=None):
+    """
+    把失败记录放回待处理队列（清零失败次数），kinds 指定时只放行这些类型
+    其他失败记录保持不变
+    返回: 退出码
+    """
+    failed_videos = load_failed_videos()
+    released = [video for video, info in failed_videos.items() if not kinds or info.get("kind") in kinds]
+    for video in released:
+        remove_failed_video(failed_videos, video)
     save_failed_videos(failed_videos)
-    print(f"⚠️  已记录失败视频: {reason} - {video_url}")
+    print(f"🔁 已放行 {len(released)} 个失败视频，下次运行会重新播放（剩余失败记录 {len(failed_videos)} 个）")
+    return EXIT_OK
+
+def next_retry(failed_videos, retry_queue):
+    """
+    队列处理完后取出最早到期的本次失败视频，必要时等待到期
+    等待超过 RETRY_MAX_WAIT_IN_RUN 的留给下次运行
+    返回: 要重试的视频链接，没有则返回None
+    """
+    for video in [video for video in retry_queue if not failed_videos.get(video, {}).get("retry_at")]:
+        del retry_queue[video]  # 已完成或已停放
+    if not retry_queue:
+        return None
+    video = min(retry_queue, key=lambda video: parse_timestamp(failed_videos[video]["retry_at"]))
+    wait = parse_timestamp(failed_videos[video]["retry_at"]) - time.time()
+    if wait > RETRY_MAX_WAIT_IN_RUN:
+        print(f"⏳ 还有 {len(retry_queue)} 个视频等待重试（最早 {failed_videos[video]['retry_at']}），留到下次运行")
+        return None
+    if wait > 0:
+        print(f"⏳ 等待 {wait / 60:.1f} 分钟后重试失败的视频")
+        time.sleep(wait)
+    return retry_queue.pop(video)
+
+def next_queued_url(failed_videos, retry_queue, lease, completed_videos):
+    """
+    当前队列处理完后的下一个视频：共享队列模式只向协调器租用（失败重试由协调器退避后重新租出），
+    否则重试本次失败的视频
+    """
+    if lease is not None:
+        return next_leased_url(lease, completed_videos)
+    return next_retry(failed_videos, retry_queue)
+
+def query_progress(failed_limit=20):
+    """
+    直接在SQLite进度库上回答：还剩多少、大概还要多久、哪些失败了以及原因
+    不加载全部记录到内存
+    """
+    if PROGRESS_BACKEND != "sqlite":
+        print(f"💡 query 需要SQLite进度库，请将 PROGRESS_BACKEND 设置为 \"sqlite\"（首次运行会自动导入JSON记录）")
+        return 1
+    
+    sync_video_queue(get_video_urls())
+    db = get_progress_db()
+    
+    counts = dict(db.execute(
+        "SELECT status, COUNT(*) FROM videos WHERE list_order IS NOT NULL GROUP BY status").fetchall())
+    total = sum(counts.values())
+    pending = counts.get("pending", 0)
+    print(f"📊 视频进度统计 ({PROGRESS_DB_PATH}):")
+    print(f"   📋 总视频数: {total}")
+    print(f"   ✅ 已完成: {counts.get('completed', 0)}")
+    print(f"   ❌ 已失败: {counts.get('failed', 0)}")
+    print(f"   ⏳ 待处理: {pending}")
+    
+    # 用已完成视频的平均时长（没有则用成功尝试的平均耗时）估算剩余时间
+    avg_duration, = db.execute(
+        "SELECT AVG(duration) FROM videos WHERE status = 'completed' AND duration > 0").fetchone()
+    if avg_duration is None:
+        avg_duration, = db.execute("SELECT AVG(elapsed) FROM attempts WHERE success = 1").fetchone()
+    if pending and avg_duration:
+        print(f"   ⏱️  预计剩余: {pending * avg_duration / 3600:.1f} 小时 (按平均 {avg_duration / 60:.1f} 分钟/个)")
+    elif pending:
+        print("   ⏱️  预计剩余: 暂无时长数据")
+    
+    failed_by_reason = db.execute(
+        "SELECT reason, COUNT(*) FROM videos WHERE status = 'failed' AND list_order IS NOT NULL "
+        "GROUP BY reason ORDER BY COUNT(*) DESC").fetchall()
+    if failed_by_reason:
+        print("\n⚠️  失败原因统计:")
+        for reason, count in failed_by_reason:
+            print(f"   {count:>5}  {reason or '未知原因'}")
+        print("\n🔁 失败类型:")
+        for kind, count, waiting in db.execute(
+                "SELECT COALESCE(failure_kind, 'unknown'), COUNT(*), COUNT(retry_at) FROM videos "
+                "WHERE status = 'failed' AND list_order IS NOT NULL GROUP BY failure_kind ORDER BY COUNT(*) DESC"):
+            print(f"   {count:>5}  {kind} (等待重试 {waiting}, 已停放 {count - waiting})")
+        print(f"\n⚠️  失败视频（最近 {failed_limit} 个）:")
+        for url, reason, attempts, updated_at, retry_at in db.execute(
+                "SELECT COALESCE(url, video), reason, attempts, updated_at, retry_at FROM videos "
+                "WHERE status = 'failed' AND list_order IS NOT NULL ORDER BY updated_at DESC LIMIT ?",
+                (failed_limit,)):
+            retry_text = f"{retry_at} 后重试" if retry_at else "已停放"
+            print(f"   {url} [{reason or '未知原因'}] 尝试{attempts}次 ({updated_at}) {retry_text}")
+    return 0
+
+# 各阶段耗时累计：{"run": {阶段: [次数, 总秒数]}, "video": {...}}，以及本次运行/当前视频的起点
+_metrics = {"run": {}, "video": {}, "video_url": None, "video_started": None, "video_commands": None,
+            "run_started": time.time(), "last_video_finished": None, "videos": 0, "video_seconds": 0.0,
+            "network": []}
+
+# 指标端点读取的当前运行状态：播放线程写入，HTTP线程只读
+_live = {"account": None, "browser": None, "video": None, "episode": None, "episode_label": None, "position": None,
+         "duration": None, "progress_at": None, "completed": 0, "failed": 0, "recoveries": collections.Counter()}
+
+def write_metric(record):
+    """追加一条指标到 METRICS_PATH（不fsync，指标丢最后几行无所谓，不能拖慢播放）"""
+    if not METRICS_ENABLED:
+        return
+    try:
+        with open(METRICS_PATH, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"ts": round(time.time(), 3), **record}, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+def record_span(name, elapsed, ok=True, scopes=("run", "video")):
+    """记录一个阶段的耗时，同时累计到本次运行和当前视频"""
+    for scope in scopes:
+        entry = _metrics[scope].setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+    write_metric({"type": "span", "name": name, "elapsed": round(elapsed, 3), "ok": ok,
+                  "video": _metrics["video_url"]})
+
+@contextlib.contextmanager
+def metric_span(name):
+    """with metric_span("阶段"): ... 记录代码块耗时"""
+    started = time.time()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        record_span(name, time.time() - started, ok)
+
+def timed(name):
+    """函数耗时装饰器，函数返回False或抛异常时记为失败"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.time()
+            result = False
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                record_span(name, time.time() - started, result is not False)
+        return wrapper
+    return decorator
+
+# 缓冲监控：video元素进入waiting（开始播放之后）到重新playing记为一次缓冲，统计保存在window上，跨集累计
+REBUFFER_MONITOR_JS = """
+var v = arguments[0];
+var stats = window.__zlRebuffer = window.__zlRebuffer || {count: 0, seconds: 0, since: null};
+if (v.__zlRebufferMonitor) return;
+v.__zlRebufferMonitor = true;
+var resume = function () {
+    if (stats.since !== null) { stats.seconds += (performance.now() - stats.since) / 1000; stats.since = null; }
+};
+v.addEventListener('waiting', function () {
+    if (stats.since === null && v.currentTime > 0) { stats.count++; stats.since = performance.now(); }
+});
+v.addEventListener('playing', resume);
+v.addEventListener('emptied', resume);
+"""
+
+# 读取并清零缓冲统计（正在缓冲的部分计入本次，剩余部分留给下次）
+REBUFFER_READ_JS = """
+var stats = window.__zlRebuffer;
+if (!stats) return null;
+var now = performance.now();
+var result = {count: stats.count, seconds: stats.seconds + (stats.since !== null ? (now - stats.since) / 1000 : 0)};
+stats.count = 0;
+stats.seconds = 0;
+if (stats.since !== null) stats.since = now;
+return result;
+"""
+
+class NetworkCapture:
+    """
+    网络抓取（NETWORK_CAPTURE）：从Chrome性能日志的 Network.* 事件汇总一个视频的
+    页面首字节时间、媒体请求吞吐量和失败请求，加上video元素的缓冲次数和时长
+    事件按读取时间归到当前视频，预加载下一个视频的页面请求计入当前视频
+    """
+
+    def __init__(self):
+        self.requests = {}  # requestId -> {"url", "type", "started", "status", "mime", "ttfb", "bytes", ...}
+        self.rebuffers = 0
+        self.rebuffer_seconds = 0.0
+
+    def drain(self, driver):
+        """读出chromedriver缓存的性能日志并汇总，返回读到的条数（定期调用，避免日志在chromedriver里堆积）"""
+        try:
+            entries = driver.get_log("performance")
+        except Exception:
+            return 0
+        for entry in entries:
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, TypeError, ValueError):
+                continue
+            self.handle(message.get("method"), message.get("params") or {})
+        return len(entries)
+
+    def handle(self, method, params):
+        """处理一条 Network.* 事件"""
+        request_id = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            # 重定向沿用同一个requestId，以最后一跳为准
+            request = self.requests.setdefault(request_id, {"bytes": 0})
+            request.update(url=params.get("request", {}).get("url", ""), type=params.get("type"),
+                           started=params.get("timestamp"))
+            return
+        request = self.requests.get(request_id)
+        if request is None:
+            return
+        if method == "Network.responseReceived":
+            response = params.get("response") or {}
+            request["status"] = response.get("status")
+            request["mime"] = response.get("mimeType") or ""
+            timing = response.get("timing") or {}
+            if timing.get("receiveHeadersEnd") is not None:
+                request["ttfb"] = timing["receiveHeadersEnd"] / 1000  # 从请求开始到收到响应头（含DNS/连接）
+        elif method == "Network.dataReceived":
+            request["bytes"] += params.get("encodedDataLength") or 0
+            request["last"] = params.get("timestamp")
+        elif method == "Network.loadingFinished":
+            request["bytes"] = max(request["bytes"], params.get("encodedDataLength") or 0)
+            request["last"] = params.get("timestamp")
+        elif method == "Network.loadingFailed":
+            # 播放器换Range请求时会主动取消媒体请求，省流量模式拦截的请求也不算失败
+            if params.get("blockedReason"):
+                request["blocked"] = True
+            elif not params.get("canceled"):
+                request["error"] = params.get("errorText") or "failed"
+            request["last"] = params.get("timestamp")
+
+    def add_rebuffers(self, stats):
+        if stats:
+            self.rebuffers += stats.get("count") or 0
+            self.rebuffer_seconds += stats.get("seconds") or 0.0
+
+    def summary(self):
+        """汇总为一条记录：首字节、媒体吞吐量、缓冲、失败请求（最多列出5个）"""
+        requests = list(self.requests.values())
+        documents = [request for request in requests if request.get("type") == "Document" and "ttfb" in request]
+        media = [request for request in requests if is_media_request(request)]
+        media_ttfbs = sorted(request["ttfb"] for request in media if "ttfb" in request)
+        media_seconds = sum(request["last"] - request["started"] for request in media
+                            if request.get("last") and request.get("started"))
+        media_bytes = sum(request["bytes"] for request in media)
+        failed = [request for request in requests if request.get("error") or (request.get("status") or 0) >= 400]
+        return {
+            "requests": len(requests),
+            "bytes": sum(request["bytes"] for request in requests),
+            "page_ttfb": round(documents[0]["ttfb"], 3) if documents else None,
+            "media_ttfb": round(media_ttfbs[len(media_ttfbs) // 2], 3) if media_ttfbs else None,
+            "media_requests": len(media),
+            "media_bytes": media_bytes,
+            "throughput_kbps": round(media_bytes * 8 / 1000 / media_seconds, 1) if media_seconds > 0 else None,
+            "rebuffers": self.rebuffers,
+            "rebuffer_seconds": round(self.rebuffer_seconds, 3),
+            "blocked_requests": sum(1 for request in requests if request.get("blocked")),
+            "failed_requests": len(failed),
+            "failures": [f"{request.get('status') or request.get('error')} {request['url'][:120]}"
+                         for request in failed[:5]],
+        }
+
+def is_media_request(request):
+    """是否为视频/音频数据请求（按请求类型、响应类型或链接后缀判断）"""
+    mime = request.get("mime") or ""
+    return (request.get("type") == "Media" or mime.startswith(("video/", "audio/"))
+            or "mpegurl" in mime or "mp2t" in mime or re.search(MEDIA_URL_PATTERN, request.get("url", "")) is not None)
+
+def install_rebuffer_monitor(driver, video):
+    """网络抓取模式下在video元素上挂缓冲监控（同一元素只挂一次）"""
+    if getattr(driver, "_zl_capture", None) is None:
+        return
+    try:
+        driver.execute_script(REBUFFER_MONITOR_JS, video)
+    except Exception as e:
+        print(f"⚠️  安装缓冲监控失败: {str(e)}")
+
+def collect_rebuffers(driver):
+    """页面离开前读出缓冲统计计入当前视频"""
+    capture = getattr(driver, "_zl_capture", None)
+    if capture is None:
+        return
+    try:
+        capture.add_rebuffers(driver.execute_script(REBUFFER_READ_JS))
+    except Exception:
+        pass
+
+def drain_network_capture(driver):
+    """定期读出性能日志（网络抓取模式下）"""
+    capture = getattr(driver, "_zl_capture", None)
+    if capture is not None:
+        capture.drain(driver)
+
+def describe_network(network):
+    """网络汇总的一行说明"""
+    def seconds(value):
+        return "-" if value is None else f"{value:.2f}s"
+    throughput = "-" if network["throughput_kbps"] is None else f"{network['throughput_kbps']:.0f}kbps"
+    blocked = f"，拦截 {network['blocked_requests']} 个请求" if network["blocked_requests"] else ""
+    return (f"传输 {network['bytes'] / 1024 / 1024:.1f}MB{blocked}，"
+            f"页面首字节 {seconds(network['page_ttfb'])}，媒体首字节 {seconds(network['media_ttfb'])}，"
+            f"媒体 {network['media_bytes'] / 1024 / 1024:.1f}MB @ {throughput}，"
+            f"缓冲 {network['rebuffers']}次/{network['rebuffer_seconds']:.1f}s，失败请求 {network['failed_requests']}")
+
+def start_video_metrics(driver, url):
+    """开始统计一个视频：清空当前视频的阶段累计，记录WebDriver命令数起点和视频间隔"""
+    now = time.time()
+    if _metrics["last_video_finished"] is not None:
+        record_span("inter_video_gap", now - _metrics["last_video_finished"], scopes=("run",))
+    _metrics["video"] = {}
+    _metrics["video_url"] = url
+    _metrics["video_started"] = now
+    _metrics["video_commands"] = collections.Counter(count_webdriver_commands(driver))
+    if NETWORK_CAPTURE or BANDWIDTH_SAVER:
+        driver._zl_capture = NetworkCapture()
+
+def finish_video_metrics(driver, success, reason=""):
+    """
+    结束一个视频的统计，写入视频汇总并打印开销占比
+    开销 = 视频总耗时 - 实际播放耗时（页面加载、等待元素、集数查找与切换、卡顿等待与恢复等）
+    """
+    now = time.time()
+    wall = now - _metrics["video_started"]
+    playback = _metrics["video"].get("playback", [0, 0.0])[1]
+    overhead = max(wall - playback, 0.0)
+    commands = count_webdriver_commands(driver) - _metrics["video_commands"]
+    summary = {
+        "type": "video", "url": _metrics["video_url"], "success": success, "reason": reason,
+        "wall": round(wall, 3), "playback": round(playback, 3), "overhead": round(overhead, 3),
+        "overhead_ratio": round(overhead / playback, 4) if playback else None,
+        "commands": sum(commands.values()),
+        "phases": {name: round(total, 3) for name, (count, total) in _metrics["video"].items()},
+    }
+    capture = getattr(driver, "_zl_capture", None)
+    if capture is not None:
+        capture.drain(driver)
+        summary["network"] = capture.summary()
+        _metrics["network"].append(summary["network"])
+        record_network_summary(video_key(_metrics["video_url"]), summary["network"])
+    write_metric(summary)
+    _metrics["videos"] += 1
+    _metrics["video_seconds"] += wall
+    _metrics["last_video_finished"] = now
+    _metrics["video_url"] = None
+    ratio_text = f"{overhead / playback * 100:.1f}%" if playback else "-"
+    print(f"📈 本视频耗时 {wall:.1f}s: 播放 {playback:.1f}s，开销 {overhead:.1f}s ({ratio_text})，"
+          f"WebDriver命令 {summary['commands']} 次")
+    if "network" in summary:
+        print(f"🌐 {describe_network(summary['network'])}")
+        for failure in summary["network"]["failures"]:
+            print(f"   ❌ {failure}")
+    return summary
+
+def report_run_metrics(driver=None):
+    """打印本次运行各阶段耗时汇总（开销占播放时间的比例），并写入运行汇总"""
+    wall = time.time() - _metrics["run_started"]
+    phases = _metrics["run"]
+    playback = phases.get("playback", [0, 0.0])[1]
+    overhead = max(wall - playback, 0.0)
+    commands = sum(count_webdriver_commands(driver).values()) if driver is not None else None
+    write_metric({
+        "type": "run", "wall": round(wall, 3), "playback": round(playback, 3), "overhead": round(overhead, 3),
+        "overhead_ratio": round(overhead / playback, 4) if playback else None,
+        "videos": _metrics["videos"], "commands": commands,
+        "phases": {name: {"count": count, "total": round(total, 3)} for name, (count, total) in phases.items()},
+    })
+    print(f"\n📈 耗时分析: 总计 {wall:.0f}s，播放 {playback:.0f}s，开销 {overhead:.0f}s"
+          f"{f' ({overhead / playback * 100:.1f}%)' if playback else ''}，视频 {_metrics['videos']} 个"
+          f"{f'，WebDriver命令 {commands} 次' if commands is not None else ''}")
+    for name, (count, total) in sorted(phases.items(), key=lambda item: -item[1][1]):
+        if name != "playback":
+            print(f"   {name}: {total:.1f}s / {count}次 (平均 {total / count:.2f}s)")
+    if _metrics["network"]:
+        # 调整 WAIT_TIMEOUT 和卡顿检测参数的依据
+        ttfbs = sorted(network["page_ttfb"] for network in _metrics["network"] if network["page_ttfb"] is not None)
+        throughputs = sorted(network["throughput_kbps"] for network in _metrics["network"]
+                             if network["throughput_kbps"] is not None)
+        if ttfbs:
+            print(f"🌐 页面首字节: 中位 {ttfbs[len(ttfbs) // 2]:.2f}s，最大 {ttfbs[-1]:.2f}s (WAIT_TIMEOUT={WAIT_TIMEOUT}s)")
+        if throughputs:
+            print(f"🌐 媒体吞吐量: 中位 {throughputs[len(throughputs) // 2]:.0f}kbps，最低 {throughputs[0]:.0f}kbps")
+        print(f"🌐 缓冲 {sum(network['rebuffers'] for network in _metrics['network'])} 次 "
+              f"共 {sum(network['rebuffer_seconds'] for network in _metrics['network']):.1f}s，"
+              f"失败请求 {sum(network['failed_requests'] for network in _metrics['network'])} 个")
+
+def log_step_timing(step, elapsed, ok=True):
+    """输出单个等待步骤的耗时，并记入阶段指标"""
+    print(f"⏱️  {step}: {elapsed:.2f}s{'' if ok else ' (超时)'}")
+    record_span(step, elapsed, ok)
+
+def wait_until(driver, step, condition, timeout=None):
+    """
+    等待条件成立并记录该步骤耗时，超时时间取 STEP_TIMEOUTS[step]
+    返回: 条件的返回值，超时返回None（不抛异常，由调用方决定如何处理）
+    """
+    timeout = STEP_TIMEOUTS.get(step, WAIT_TIMEOUT) if timeout is None else timeout
+    started = time.time()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=0.2).until(condition)
+    except TimeoutException:
+        result = None
+    log_step_timing(step, time.time() - started, result is not None)
+    return result
+
+def navigate(driver, url, step="page_load"):
+    """打开页面并记录耗时（eager策略下DOM就绪即返回）"""
+    started = time.time()
+    driver.get(url)
+    log_step_timing(step, time.time() - started)
+
+def document_ready(driver):
+    """等待条件：文档已可交互"""
+    return driver.execute_script("return document.readyState") in ("interactive", "complete")
+
+# 登录用户信息/退出登录元素的选择器（你可能需要根据实际页面调整），等待和检查共用同一组
+USER_INFO_SELECTOR = ".user-info, .username, .user-name, [class*='user'], [class*='User']"
+LOGOUT_SELECTOR = "[href*='logout'], [onclick*='logout'], .logout, [class*='logout']"
+
+def login_state_settled(driver):
+    """等待条件：已跳转到登录页，或页面上出现了用户信息/退出登录元素"""
+    if "login" in driver.current_url.lower():
+        return True
+    return bool(driver.find_elements(By.CSS_SELECTOR, f"{USER_INFO_SELECTOR}, {LOGOUT_SELECTOR}"))
+
+def page_media_state(driver):
+    """当前页面URL和视频源，用于判断切换集数是否生效"""
+    return tuple(driver.execute_script(
+        "var v = document.querySelector(arguments[0]);"
+        "return [location.href, v ? (v.currentSrc || v.src || '') : ''];", VIDEO_SELECTOR))
+
+# 等待video元素加载出元数据（时长可读），已加载则立即返回
+VIDEO_METADATA_JS = """
+var video = arguments[0], done = arguments[arguments.length - 1];
+if (video.readyState >= 1) return done(true);
+var timer = setTimeout(function () { done(false); }, arguments[1]);
+video.addEventListener('loadedmetadata', function () { clearTimeout(timer); done(true); }, {once: true});
+"""
+
+def wait_video_metadata(driver, video):
+    """等待video触发loadedmetadata，返回是否在超时前就绪"""
+    started = time.time()
+    ready = bool(driver.execute_async_script(
+        VIDEO_METADATA_JS, video, STEP_TIMEOUTS["video_metadata"] * 1000))
+    log_step_timing("video_metadata", time.time() - started, ready)
+    return ready
 
 def save_cookies(driver):
     """保存当前浏览器的cookies到文件"""
@@ -198,8 +1393,29 @@ def save_cookies(driver):
         print(f"❌ 保存cookies失败: {str(e)}")
         return False
 
+def default_cookie_domain():
+    """cookie未记录域名时使用的默认域名（www.zjce.gov.cn -> .zjce.gov.cn）"""
+    host = urlparse(BASE_URL).hostname or ""
+    return "." + host[4:] if host.startswith("www.") else host
+
+def to_cdp_cookie(cookie):
+    """把 driver.get_cookies() 导出的cookie转换为CDP Network.setCookies 的格式"""
+    cdp_cookie = {
+        'name': cookie['name'],
+        'value': cookie['value'],
+        'domain': cookie.get('domain') or default_cookie_domain(),
+        'path': cookie.get('path', '/'),
+    }
+    for field in ('secure', 'httpOnly', 'sameSite'):
+        if field in cookie:
+            cdp_cookie[field] = cookie[field]
+    if 'expiry' in cookie:
+        cdp_cookie['expires'] = cookie['expiry']
+    return cdp_cookie
+
+@timed("load_cookies")
 def load_cookies(driver):
-    """从文件加载cookies到浏览器"""
+    """从文件加载cookies到浏览器：优先一次CDP调用批量写入（无需先打开页面），失败时逐个添加"""
     try:
         if not os.path.exists(COOKIES_PATH):
             print("📝 未找到cookies文件，需要重新登录")
@@ -208,9 +1424,16 @@ def load_cookies(driver):
         with open(COOKIES_PATH, 'r', encoding='utf-8') as f:
             cookies = json.load(f)
         
-        # 先访问主站以建立域名上下文
-        driver.get(BASE_URL)
-        time.sleep(2)
+        try:
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": [to_cdp_cookie(cookie) for cookie in cookies]})
+            print(f"✅ Cookies批量加载完成 ({len(cookies)} 个)")
+            return True
+        except Exception as e:
+            print(f"⚠️  批量加载cookies失败，改为逐个加载: {str(e)}")
+        
+        # 先访问主站以建立域名上下文（页面可交互即可添加cookie）
+        navigate(driver, BASE_URL)
+        wait_until(driver, "page_ready", document_ready)
         
         # 加载cookies
         for cookie in cookies:
@@ -219,7 +1442,7 @@ def load_cookies(driver):
                 cookie_to_add = {
                     'name': cookie['name'],
                     'value': cookie['value'],
-                    'domain': cookie.get('domain', '.zjce.gov.cn')
+                    'domain': cookie.get('domain', default_cookie_domain())
                 }
                 
                 # 添加可选字段
@@ -241,12 +1464,13 @@ def load_cookies(driver):
         print(f"❌ 加载cookies失败: {str(e)}")
         return False
 
+@timed("check_login_status")
 def check_login_status(driver):
     """检查登录状态"""
     try:
         print("🔍 正在检查登录状态...")
-        driver.get("https://www.zjce.gov.cn/videos")
-        time.sleep(3)
+        navigate(driver, f"{BASE_URL}/videos")
+        wait_until(driver, "login_check", login_state_settled)
         
         # 检查是否跳转到登录页面
         if "login" in driver.current_url.lower():
@@ -256,12 +1480,10 @@ def check_login_status(driver):
         # 检查页面是否包含登录用户信息的元素
         try:
             # 尝试查找用户信息相关的元素（你可能需要根据实际页面调整选择器）
-            user_elements = driver.find_elements(By.CSS_SELECTOR, 
-                ".user-info, .username, .user-name, [class*='user'], [class*='User']")
+            user_elements = driver.find_elements(By.CSS_SELECTOR, USER_INFO_SELECTOR)
             
             # 检查是否有退出登录的按钮
-            logout_elements = driver.find_elements(By.CSS_SELECTOR, 
-                "[href*='logout'], [onclick*='logout'], .logout, [class*='logout']")
+            logout_elements = driver.find_elements(By.CSS_SELECTOR, LOGOUT_SELECTOR)
             
             if user_elements or logout_elements:
                 print("✅ 已登录状态")
@@ -295,8 +1517,8 @@ def interactive_login(driver):
     try:
         # 打开登录页面
         print("📱 正在打开登录页面...")
-        driver.get(LOGIN_URL)
-        time.sleep(3)
+        navigate(driver, LOGIN_URL)
+        wait_until(driver, "page_ready", document_ready)
         
         print("\n请按照以下步骤操作：")
         print("1. 👀 在浏览器中完成登录操作")
@@ -318,10 +1540,18 @@ def interactive_login(driver):
         print(f"❌ 登录过程中出错: {str(e)}")
         return False
 
+@timed("auto_login")
 def auto_login(driver):
-    """自动登录流程：尝试加载cookies，失败则进行交互式登录"""
+    """自动登录流程：优先复用持久化用户目录中的会话，其次加载cookies，都失败则进行交互式登录"""
     print("🚀 开始自动登录流程...")
     
+    # 0. 持久化用户目录中已有会话时直接检查（只需一次页面加载）
+    if CHROME_USER_DATA_DIR and os.path.isdir(os.path.join(CHROME_USER_DATA_DIR, "Default")):
+        if check_login_status(driver):
+            print("🎉 使用持久化浏览器用户目录中的会话登录成功！")
+            return True
+        print("⚠️  浏览器用户目录中的会话已失效，尝试导入cookies")
+    
     # 1. 尝试加载已保存的cookies
     if load_cookies(driver):
         # 2. 检查cookies是否有效
@@ -332,196 +1562,1060 @@ def auto_login(driver):
             print("⚠️  已保存的cookies无效，需要重新登录")
     
     # 3. Cookies无效或不存在，进行交互式登录
+    if not INTERACTIVE_LOGIN:
+        print("❌ 当前为非交互模式，无法手动登录。请先运行 python zlstudy.py run --account <账号名> 完成一次登录")
+        return False
     print("🔄 开始交互式登录流程...")
     return interactive_login(driver)
 
+def cookie_header_for(cookies, url):
+    """从浏览器导出的cookies中挑出适用于url所在域名的，拼成Cookie请求头"""
+    host = urlparse(url).hostname or ""
+    return "; ".join(
+        f"{cookie['name']}={cookie['value']}" for cookie in cookies
+        if host == cookie.get('domain', host).lstrip('.') or host.endswith(cookie.get('domain', host)))
+
+class NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """不跟随跳转，由调用方根据跳转目标判断（如是否跳到了登录页）"""
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+def http_get(url, cookies, headers=None, timeout=None):
+    """
+    带着浏览器cookies发GET请求，不经过浏览器、不跟随跳转
+    返回: (状态码, 响应头, 内容)；网络异常时抛出 URLError/OSError
+    """
+    request = urllib.request.Request(url, headers={
+        "Cookie": cookie_header_for(cookies, url),
+        "User-Agent": "Mozilla/5.0",
+        **(headers or {}),
+    })
+    opener = urllib.request.build_opener(NoRedirectHandler)
+    try:
+        with opener.open(request, timeout=timeout or WAIT_TIMEOUT) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+def probe_login_session(cookies, user_agent=None):
+    """
+    用浏览器导出的cookies直接发HTTP请求探测登录状态，不经过浏览器
+    只看状态码和跳转，不执行页面脚本，所以 LOGIN_PROBE_PATH 要指向服务端会校验登录的地址
+    返回: (True/False/None, 说明)，None 表示网络异常等无法判断的情况
+    """
+    probe_url = BASE_URL + LOGIN_PROBE_PATH
+    try:
+        status, headers, _ = http_get(probe_url, cookies, {"User-Agent": user_agent or "Mozilla/5.0"},
+                                      LOGIN_PROBE_TIMEOUT)
+        location = headers.get("Location", "")
+    except (urllib.error.URLError, OSError) as e:
+        return None, f"探测请求失败: {e}"
+    
+    if status in (401, 403):
+        return False, f"HTTP {status}"
+    if 300 <= status < 400:
+        if "login" in (location or "").lower():
+            return False, f"跳转到登录页 ({location})"
+        return True, f"HTTP {status} -> {location}"
+    if status == 200:
+        return True, "HTTP 200"
+    return None, f"HTTP {status}"
+
+class LoginProbe:
+    """
+    后台登录探测：定期用浏览器当前cookies的快照发一个普通HTTP请求，
+    不打扰正在播放的标签页；只有探测明确失败时才需要重新登录
+    """
+
+    def __init__(self, interval=None):
+        self.interval = LOGIN_PROBE_INTERVAL if interval is None else interval
+        self.session_ok = True
+        self.last_detail = ""
+        self._cookies = []
+        self._user_agent = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def update_cookies(self, cookies, user_agent=None):
+        """更新cookies快照（由主线程在空闲时调用，探测线程不直接访问WebDriver）"""
+        with self._lock:
+            self._cookies = list(cookies)
+            if user_agent:
+                self._user_agent = user_agent
+
+    def probe_now(self):
+        """立即探测一次，返回 True/False/None"""
+        with self._lock:
+            cookies, user_agent = self._cookies, self._user_agent
+        ok, detail = probe_login_session(cookies, user_agent)
+        self.last_detail = detail
+        if ok is False:
+            if self.session_ok:
+                print(f"⚠️  后台登录探测发现会话失效: {detail}")
+            self.session_ok = False
+        elif ok:
+            self.session_ok = True
+        return ok
+
+    @property
+    def expired(self):
+        return not self.session_ok
+
+    def start(self):
+        if self.interval and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="zlstudy-login-probe", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.probe_now()
+            except Exception as e:
+                print(f"⚠️  后台登录探测出错: {str(e)}")
+
+def video_key(url):
+    """视频记录的规范键：详情页链接中的视频ID（忽略bizType等参数和末尾斜杠）；不是详情页的链接原样返回"""
+    url = url.strip()
+    match = re.search(VIDEO_ID_PATTERN, urlparse(url).path)
+    return match.group(1) if match else url
+
+def iter_video_entries(path):
+    """
+    逐行读取视频链接列表，返回 (视频ID, 链接, 行号)
+    不是视频详情页的行不返回，由调用方报告；同一视频的重复行原样返回，由调用方去重
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for lineno, line in enumerate(f, 1):
+            url = line.strip()
+            if not url:
+                continue
+            match = re.search(VIDEO_ID_PATTERN, urlparse(url).path)
+            yield (match.group(1) if match else None), url, lineno
+
 def get_video_urls():
-    with open(TXT_PATH, 'r', encoding='utf-8') as f:
-        return [line.strip() for line in f if line.strip()]
+    """读取视频链接列表：按视频ID去重（保留第一次出现的链接），跳过并报告不是视频详情页的行"""
+    video_urls = []
+    seen = {}
+    skipped = []
+    duplicates = 0
+    for video_id, url, lineno in iter_video_entries(TXT_PATH):
+        if video_id is None:
+            skipped.append((lineno, url))
+        elif video_id in seen:
+            duplicates += 1
+        else:
+            seen[video_id] = lineno
+            video_urls.append(url)
+    if skipped:
+        print(f"⏭️  跳过 {len(skipped)} 行不是视频详情页的链接:")
+        for lineno, url in skipped[:5]:
+            print(f"   第{lineno}行: {url}")
+        if len(skipped) > 5:
+            print(f"   ... (还有 {len(skipped) - 5} 行)")
+    if duplicates:
+        print(f"🔁 合并了 {duplicates} 个重复的视频链接（同一视频ID）")
+    return video_urls
+
+class CatalogPageParser(HTMLParser):
+    """从课程列表页中找出所有视频详情页链接，连同链接文字/title里的标题和集数"""
+
+    def __init__(self):
+        super().__init__()
+        self.items = []
+        self._current = None  # 正在收集文字的详情页链接
+        self._depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._current is not None:
+            if tag == "a":
+                self._depth += 1
+            return
+        attrs = dict(attrs)
+        if tag != "a" or not re.search(VIDEO_ID_PATTERN, urlparse(attrs.get("href") or "").path):
+            return
+        href = attrs["href"]
+        biz_type = parse_qs(urlparse(href).query).get("bizType", [None])[0]
+        self._current = {"id": video_key(href), "title": (attrs.get("title") or "").strip(),
+                         "biz_type": biz_type, "text": []}
+        self._depth = 0
+
+    def handle_data(self, data):
+        if self._current is not None:
+            self._current["text"].append(data)
+
+    def handle_endtag(self, tag):
+        if self._current is None or tag != "a":
+            return
+        if self._depth:
+            self._depth -= 1
+            return
+        text = " ".join(" ".join(self._current.pop("text")).split())
+        episodes = re.search(r"共\s*(\d+)\s*[集节讲]", text)
+        self._current["episodes"] = int(episodes.group(1)) if episodes else None
+        self._current["title"] = self._current["title"] or re.sub(r"共\s*\d+\s*[集节讲]", "", text).strip()
+        self.items.append(self._current)
+        self._current = None
+
+def parse_catalog_page(html):
+    """解析课程列表页，返回 [{"id", "title", "biz_type", "episodes"}, ...]（同一视频只保留第一次出现）"""
+    parser = CatalogPageParser()
+    parser.feed(html)
+    items, seen = [], set()
+    for item in parser.items:
+        if item["id"] not in seen:
+            seen.add(item["id"])
+            items.append(item)
+    return items
+
+def append_to_video_list(items):
+    """把目录中的新视频追加到视频链接列表末尾（按视频ID判断，已在列表中的不重复添加），返回追加数量"""
+    existing = set()
+    newline = "\n"
+    if os.path.exists(TXT_PATH):
+        existing = {video_id for video_id, _, _ in iter_video_entries(TXT_PATH) if video_id}
+        with open(TXT_PATH, 'rb') as f:
+            content = f.read()
+        newline = "\r\n" if b"\r\n" in content else "\n"
+        needs_newline = bool(content) and not content.endswith(b"\n")
+    else:
+        needs_newline = False
+    lines = []
+    for item in items:
+        if item["id"] in existing:
+            continue
+        existing.add(item["id"])
+        query = f"?bizType={item['biz_type']}" if item.get("biz_type") is not None else ""
+        lines.append(f"{BASE_URL}/videos/detail/{item['id']}{query}")
+    if lines:
+        with open(TXT_PATH, 'a', encoding='utf-8', newline='') as f:
+            f.write((newline if needs_newline else "") + newline.join(lines) + newline)
+    return len(lines)
 
-def watch_video(driver, url):
+def crawl_catalog(max_pages=None):
     """
-    观看视频，支持进度卡住检测和自动播放下一集
-    返回: (是否成功, 失败原因)
+    用cookies.json中的登录状态直接HTTP抓取课程列表页（不启动浏览器），增量更新课程目录并把新视频加入链接列表
+    列表页按 ETag/Last-Modified 条件请求，内容哈希没变的页面直接用缓存的解析结果，目录没变时几乎没有开销
+    返回: 退出码
     """
-    # 保存主窗口句柄
-    main_window = driver.current_window_handle
+    import hashlib
     
-    # 新标签页打开
-    driver.execute_script("window.open('');")
-    driver.switch_to.window(driver.window_handles[-1])
-    driver.get(url)
+    if not os.path.exists(COOKIES_PATH):
+        print(f"❌ 没有找到 {COOKIES_PATH}，请先运行一次 run 完成登录")
+        return EXIT_LOGIN_REQUIRED
+    with open(COOKIES_PATH, 'r', encoding='utf-8') as f:
+        cookies = json.load(f)
+    cache = load_json_snapshot(CATALOG_CACHE_PATH, {})
+    catalog = load_json_snapshot(CATALOG_PATH, {})
+    stats = collections.Counter()
+    new_items = []
+    page_hashes = set()
+    started = time.time()
     
-    episode_count = 0
-    total_episodes_played = 0
+    print(f"🕷️  开始抓取课程目录（最多 {max_pages or CATALOG_MAX_PAGES} 页）...")
+    for page in range(1, (max_pages or CATALOG_MAX_PAGES) + 1):
+        page_url = BASE_URL + CATALOG_PAGE_URL.format(page=page)
+        cached = cache.get(page_url)
+        headers = {}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            status, response_headers, body = http_get(page_url, cookies, headers)
+        except (urllib.error.URLError, OSError) as e:
+            print(f"❌ 抓取第{page}页失败: {str(e)}")
+            stats["errors"] += 1
+            break
+        
+        if status == 304 and cached:
+            stats["not_modified"] += 1
+            digest, items = cached["hash"], cached["items"]
+        elif status == 200:
+            stats["downloaded"] += 1
+            digest = hashlib.sha256(body).hexdigest()
+            if cached and cached.get("hash") == digest:
+                stats["unchanged"] += 1
+                items = cached["items"]
+            else:
+                stats["parsed"] += 1
+                items = parse_catalog_page(body.decode('utf-8', errors='replace'))
+            cache[page_url] = {"etag": response_headers.get("ETag"),
+                               "last_modified": response_headers.get("Last-Modified"),
+                               "hash": digest, "items": items}
+        elif 300 <= status < 400 and "login" in response_headers.get("Location", "").lower():
+            print(f"❌ 登录已失效（跳转到 {response_headers.get('Location')}），请先运行 run 重新登录")
+            return EXIT_LOGIN_REQUIRED
+        else:
+            print(f"❌ 抓取第{page}页失败: HTTP {status}")
+            stats["errors"] += 1
+            break
+        
+        # 没有课程的页面或与前面某页完全相同（站点对超出范围的页码返回最后一页）说明已经到头
+        if not items or digest in page_hashes:
+            break
+        page_hashes.add(digest)
+        for item in items:
+            if item["id"] not in catalog:
+                catalog[item["id"]] = {**item, "page": page, "first_seen": now_timestamp()}
+                new_items.append(item)
+            else:
+                catalog[item["id"]].update({key: value for key, value in item.items() if value is not None})
     
-    try:
-        while episode_count < MAX_EPISODES_PER_VIDEO:
-            episode_count += 1
-            current_episode = f"第{episode_count}集" if episode_count > 1 else "第1集"
-            print(f"🎬 正在播放 {current_episode}")
-            
-            # 等待视频加载
-            video = WebDriverWait(driver, WAIT_TIMEOUT).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, VIDEO_SELECTOR)))
+    atomic_write_json(CATALOG_CACHE_PATH, cache)
+    atomic_write_json(CATALOG_PATH, catalog)
+    appended = append_to_video_list(new_items)
+    print(f"📚 课程目录: 共 {len(catalog)} 个视频，本次新增 {len(new_items)} 个，加入链接列表 {appended} 个")
+    print(f"   列表页: 下载 {stats['downloaded']} 页（内容未变 {stats['unchanged']}，重新解析 {stats['parsed']}），"
+          f"未修改(304) {stats['not_modified']} 页，耗时 {time.time() - started:.2f}s")
+    return EXIT_ERROR if stats["errors"] else EXIT_OK
 
-            # 点击视频区域激活播放（重要！）
-            video.click()
-            print("已激活视频交互")
+# 页面端播放监控脚本：首次调用时在video元素上挂载事件监听，之后每次调用阻塞到有相关事件发生
+# 返回条件：ended/error/stalled/waiting事件、进度停滞超过idleLimit、或阻塞超过maxWait
+PLAYBACK_MONITOR_JS = """
+var video = arguments[0], maxWait = arguments[1], idleLimit = arguments[2];
+var done = arguments[arguments.length - 1];
+var m = video.__zlMonitor;
+if (!m) {
+    m = video.__zlMonitor = {events: [], lastTime: video.currentTime, lastProgress: Date.now(), notify: null};
+    ['timeupdate', 'ended', 'stalled', 'waiting', 'error', 'playing'].forEach(function (type) {
+        video.addEventListener(type, function () {
+            if (video.currentTime !== m.lastTime) {
+                m.lastTime = video.currentTime;
+                m.lastProgress = Date.now();
+            }
+            if (type !== 'timeupdate') m.events.push(type);
+            if (m.notify) m.notify(type);
+        });
+    });
+}
+var start = Date.now(), finished = false, timer = null, idleTimer = null;
+function finish(reason) {
+    if (finished) return;
+    finished = true;
+    m.notify = null;
+    clearTimeout(timer);
+    clearInterval(idleTimer);
+    var events = m.events;
+    m.events = [];
+    done({
+        reason: reason,
+        duration: isFinite(video.duration) ? video.duration : null,
+        currentTime: video.currentTime,
+        paused: video.paused,
+        ended: video.ended,
+        readyState: video.readyState,
+        networkState: video.networkState,
+        error: video.error ? video.error.code : null,
+        idleMs: Date.now() - Math.max(m.lastProgress, start),
+        events: events
+    });
+}
+if (video.ended) return finish('ended');
+if (video.error) return finish('error');
+m.notify = function (type) {
+    if (type === 'ended' || type === 'error' || type === 'stalled' || type === 'waiting') finish(type);
+};
+timer = setTimeout(function () { finish('timeout'); }, maxWait);
+idleTimer = setInterval(function () {
+    if (Date.now() - Math.max(m.lastProgress, start) >= idleLimit) finish('idle');
+}, 500);
+"""
 
-            # 强制通过JavaScript播放（应对点击失效）
-            driver.execute_script("arguments[0].play();", video)
+# 卡顿诊断：就绪状态、网络状态、已缓冲区间和错误
+STALL_DIAGNOSTIC_JS = """
+var v = arguments[0], ranges = [];
+for (var i = 0; i < v.buffered.length; i++) ranges.push([v.buffered.start(i), v.buffered.end(i)]);
+return {
+    currentTime: v.currentTime,
+    duration: isFinite(v.duration) ? v.duration : null,
+    paused: v.paused,
+    readyState: v.readyState,
+    networkState: v.networkState,
+    buffered: ranges,
+    error: v.error ? v.error.code : null,
+    errorMessage: v.error ? (v.error.message || '') : null
+};
+"""
 
-            # 监控播放进度
-            retry_count = 0
-            stuck_count = 0
-            last_time = 0
-            stuck_detection_counter = 0
-            
-            episode_completed = False
-            
-            while True:
-                duration = driver.execute_script("return arguments[0].duration", video)
-                current_time = driver.execute_script("return arguments[0].currentTime", video)
+def diagnose_playback(driver, video):
+    """读取video元素的卡顿诊断信息，元素已失效时返回 {"error": "stale"}"""
+    try:
+        return driver.execute_script(STALL_DIAGNOSTIC_JS, video) or {}
+    except Exception as e:
+        return {"error": "stale", "errorMessage": str(e)[:100]}
 
-                if duration is None or current_time is None:
-                    retry_count += 1
-                    if retry_count > 3:
-                        print(f"❌ 无法获取视频时长，跳过{current_episode}")
-                        return False, f"无法获取视频时长 ({current_episode})"
-                    time.sleep(3)
-                    continue
+def describe_diagnostic(diagnostic):
+    """把诊断信息格式化为一行说明，同时用于日志和恢复记录"""
+    current_time = diagnostic.get("currentTime") or 0
+    buffered = diagnostic.get("buffered") or []
+    ahead = next((end - current_time for start, end in buffered if start <= current_time <= end), 0)
+    text = (f"readyState={diagnostic.get('readyState')} networkState={diagnostic.get('networkState')} "
+            f"位置={current_time:.1f}s 缓冲={','.join(f'{start:.0f}-{end:.0f}' for start, end in buffered) or '无'} "
+            f"(领先{ahead:.1f}s)")
+    if diagnostic.get("error"):
+        text += f" error={diagnostic['error']} {diagnostic.get('errorMessage') or ''}".rstrip()
+    return text
 
-                print(f"进度: {current_time:.1f}/{duration:.1f}s - {current_episode}")
+def choose_recovery_step(stuck_count, diagnostic):
+    """根据连续卡住次数和诊断选择恢复手段：媒体出错或没有可用源时直接重新加载页面"""
+    if diagnostic.get("error") or diagnostic.get("networkState") == 3:  # 3 = NETWORK_NO_SOURCE
+        return "reload"
+    return STALL_RECOVERY_STEPS[min(stuck_count, len(STALL_RECOVERY_STEPS)) - 1]
 
-                # 检查视频是否完成
-                if current_time >= duration - COMPLETION_THRESHOLD:
-                    print(f"✅ {current_episode}播放完成")
-                    episode_completed = True
-                    total_episodes_played += 1
+def wait_playback_event(driver, video):
+    """
+    事件驱动等待播放状态变化（一次WebDriver调用）
+    耗时按播放位置最后一次前进的时间拆开：之前记为 playback，之后没有前进的部分（卡顿、缓冲、空闲超时）记为 stall_wait
+    返回: 状态快照字典（duration、currentTime、ended、reason等）
+    """
+    started = time.time()
+    state = None
+    try:
+        state = driver.execute_async_script(
+            PLAYBACK_MONITOR_JS, video,
+            EVENT_WAIT_TIMEOUT * 1000, STUCK_DETECTION_INTERVAL * 1000) or {}
+        return state
+    finally:
+        elapsed = time.time() - started
+        if state is None:
+            record_span("stall_wait", elapsed, False)
+        else:
+            idle = min(max((state.get("idleMs") or 0) / 1000, 0.0), elapsed)
+            if elapsed > idle:
+                record_span("playback", elapsed - idle)
+            if idle:
+                record_span("stall_wait", idle)
+
+# 一次性收集页面上所有可能是集数的元素（集数列表元素优先，其次普通可点击元素），
+# 给每个元素打上 data-zl-candidate 序号，之后可以直接定位点击而不用再逐个查询
+EPISODE_SNAPSHOT_JS = """
+var seen = new Set(), result = [];
+function collect(el, inEpisodeList) {
+    if (seen.has(el)) return;
+    seen.add(el);
+    el.setAttribute('data-zl-candidate', result.length);
+    result.push({
+        candidate: result.length,
+        text: (el.innerText || el.textContent || '').trim().slice(0, 100),
+        title: el.getAttribute('title') || '',
+        inEpisodeList: inEpisodeList
+    });
+}
+document.querySelectorAll(arguments[0]).forEach(function (el) { collect(el, true); });
+document.querySelectorAll("a, button, [onclick], [role='button']").forEach(function (el) { collect(el, false); });
+return result;
+"""
+
+# 点击指定序号的候选元素，返回点击前的 [页面URL, 视频源]；元素已不存在时返回null
+EPISODE_CLICK_JS = """
+var el = document.querySelector('[data-zl-candidate="' + arguments[0] + '"]');
+if (!el) return null;
+var v = document.querySelector(arguments[1]);
+var before = [location.href, v ? (v.currentSrc || v.src || '') : ''];
+el.click();
+return before;
+"""
+
+# 集数文本格式：第1集、第01集、EP1、集1、1集
+EPISODE_NUMBER_PATTERNS = [r"第\s*0*(\d+)\s*集", r"[Ee][Pp]\s*0*(\d+)", r"集\s*0*(\d+)", r"0*(\d+)\s*集"]
+EPISODE_TOTAL_PATTERN = r"[共全总]\s*\d+\s*集"  # "共12集"之类的总集数说明，不是某一集
+
+def parse_episode_number(text, allow_bare_number=False):
+    """
+    从元素文本中解析集数；同时包含多个集数的文本（如整个集数列表容器）和总集数说明返回None
+    allow_bare_number: 纯数字（如"3"）也当作集数，只用于集数列表中的元素，普通链接里的数字多是分页或评论数
+    """
+    text = text.strip()
+    if re.search(EPISODE_TOTAL_PATTERN, text):
+        return None
+    for pattern in EPISODE_NUMBER_PATTERNS:
+        numbers = set(int(number) for number in re.findall(pattern, text))
+        if len(numbers) == 1:
+            return numbers.pop()
+        if len(numbers) > 1:
+            return None
+    if allow_bare_number and text.isdigit() and len(text) <= 3:
+        return int(text)
+    return None
+
+def build_episode_playlist(candidates):
+    """
+    把页面快照解析成按集数排序的播放列表
+    返回: [{"index": 集数, "label": 显示文本, "target": 候选元素序号, "in_episode_list": bool}, ...]
+    """
+    playlist = {}
+    # 页面有集数列表时只用列表中的元素，其余可点击元素（分页、评论数等）不参与
+    if any(candidate.get("inEpisodeList") for candidate in candidates):
+        candidates = [candidate for candidate in candidates if candidate.get("inEpisodeList")]
+    for candidate in candidates:
+        text = candidate.get("text", "")
+        if candidate.get("inEpisodeList"):
+            number = parse_episode_number(text, True) or parse_episode_number(candidate.get("title", ""))
+        elif len(text) <= 20:  # 避免匹配过长的文本
+            number = parse_episode_number(text)
+        else:
+            number = None
+        if number is None or not 1 <= number <= MAX_EPISODES_PER_VIDEO:
+            continue
+        # 集数列表中的元素优先于普通可点击元素
+        existing = playlist.get(number)
+        if existing is None or (candidate.get("inEpisodeList") and not existing["in_episode_list"]):
+            playlist[number] = {
+                "index": number,
+                "label": text or candidate.get("title") or f"第{number}集",
+                "target": candidate["candidate"],
+                "in_episode_list": bool(candidate.get("inEpisodeList")),
+            }
+    return [playlist[number] for number in sorted(playlist)]
+
+@timed("episode_discovery")
+def discover_episode_playlist(driver):
+    """一次WebDriver调用抓取页面快照并解析为播放列表"""
+    return build_episode_playlist(driver.execute_script(EPISODE_SNAPSHOT_JS, EPISODE_SELECTOR) or [])
+
+@timed("episode_switch_total")
+def switch_to_episode(driver, playlist, index):
+    """
+    直接点击播放列表中的第index集，并等待页面URL或视频源变化
+    页面重新渲染导致元素标记丢失时重新抓取一次快照（会原地更新playlist）
+    返回: 是否切换成功
+    """
+    for attempt in range(2):
+        entry = next((entry for entry in playlist if entry["index"] == index), None)
+        if entry is None:
+            return False
+        before = driver.execute_script(EPISODE_CLICK_JS, entry["target"], VIDEO_SELECTOR)
+        if before is not None:
+            return wait_until(driver, "episode_switch",
+                              lambda d: page_media_state(d) != tuple(before)) is not None
+        if attempt == 0:
+            playlist[:] = discover_episode_playlist(driver)
+    return False
+
+def reload_and_seek(driver, url, playlist, episode, position):
+    """
+    重新加载当前页面，回到第episode集并定位到position附近继续播放
+    返回: 新的video元素，失败返回None
+    """
+    reload_url = driver.current_url
+    collect_rebuffers(driver)
+    navigate(driver, reload_url, step="stall_reload")
+    video = wait_until(driver, "video_present", EC.presence_of_element_located((By.CSS_SELECTOR, VIDEO_SELECTOR)))
+    if video is None:
+        return None
+    # 集数没有体现在页面地址里时，重新加载后会回到第1集，需要重新切换
+    if episode > 1 and reload_url == url and playlist is not None:
+        playlist[:] = discover_episode_playlist(driver)
+        if not switch_to_episode(driver, playlist, episode):
+            return None
+        video = wait_until(driver, "video_present",
+                           EC.presence_of_element_located((By.CSS_SELECTOR, VIDEO_SELECTOR)))
+        if video is None:
+            return None
+    driver.execute_script("arguments[0].play();", video)
+    wait_video_metadata(driver, video)
+    video = select_lowest_quality(driver, video)
+    install_rebuffer_monitor(driver, video)
+    target = position - EPISODE_RESUME_REWIND
+    if target > 0:
+        driver.execute_script("arguments[0].currentTime = arguments[1];", video, target)
+    return video
+
+def recover_playback(driver, video, step, url, playlist, episode, position):
+    """
+    执行一级卡顿恢复
+    nudge: 点击并调用play()；seek: 在当前位置重新定位，迫使浏览器重新请求数据；reload: 见 reload_and_seek
+    返回: (video元素（reload后为新元素，失败为None）, 动作是否执行成功)
+    """
+    try:
+        if step == "nudge":
+            try:
+                video.click()
+            except Exception:
+                pass  # 元素被遮挡时点击失败不影响play()
+            driver.execute_script("arguments[0].play();", video)
+        elif step == "seek":
+            driver.execute_script(
+                "var v = arguments[0]; v.currentTime = Math.max(v.currentTime - 0.5, 0); v.play();", video)
+        else:
+            new_video = reload_and_seek(driver, url, playlist, episode, position)
+            return new_video, new_video is not None
+        return video, True
+    except Exception as e:
+        print(f"⚠️  恢复播放 ({step}) 出错: {str(e)}")
+        return (None if step == "reload" else video), False
+
+def count_webdriver_commands(driver):
+    """
+    包装 driver.execute 统计WebDriver命令（每条命令即一次HTTP往返）
+    返回: 按命令名计数的Counter，重复调用返回同一个计数器
+    """
+    counts = getattr(driver, "_zl_command_counts", None)
+    if counts is None:
+        counts = collections.Counter()
+        original_execute = driver.execute
+
+        def execute(driver_command, params=None):
+            counts[driver_command] += 1
+            return original_execute(driver_command, params)
+
+        driver.execute = execute
+        driver._zl_command_counts = counts
+    return counts
+
+def find_resume_episode(playlist, saved_episodes):
+    """
+    根据断点记录找到第一个未完成的集数
+    返回: 集数；播放列表中的集数（单集视频即第1集）都已完成时返回None
+    """
+    indexes = [entry["index"] for entry in playlist] or [1]
+    for index in indexes:
+        if not saved_episodes.get(index, {}).get("completed"):
+            return index
+    return None
+
+def resume_position(driver, video, saved_episode):
+    """未完成的集数从上次确认的位置继续播放，返回跳转到的秒数（没有跳转返回None）"""
+    if not saved_episode or saved_episode.get("completed"):
+        return None
+    target = (saved_episode.get("position") or 0) - EPISODE_RESUME_REWIND
+    if target <= 0:
+        return None
+    return driver.execute_script(
+        "var v = arguments[0];"
+        "if (!v.duration || arguments[1] >= v.duration - 1) return null;"
+        "v.currentTime = arguments[1]; return v.currentTime;", video, target)
+
+def open_worker_tab(driver):
+    """切换到复用的播放标签页，不存在（首次使用或被关闭）时新开一个"""
+    handle = getattr(driver, "_zl_worker_tab", None)
+    if handle is None or handle not in driver.window_handles:
+        driver.execute_script("window.open('');")
+        handle = driver.window_handles[-1]
+        driver._zl_worker_tab = handle
+    driver.switch_to.window(handle)
+    apply_bandwidth_saver(driver)
+    return handle
+
+def apply_bandwidth_saver(driver):
+    """省流量模式下在当前标签页上拦截 BLOCKED_URL_PATTERNS（规则按标签页生效，每个标签页设置一次）"""
+    if not BANDWIDTH_SAVER:
+        return
+    handle = driver.current_window_handle
+    applied = getattr(driver, "_zl_saver_tabs", None)
+    if applied is None:
+        applied = driver._zl_saver_tabs = set()
+    if handle in applied:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+        applied.add(handle)
+    except Exception as e:
+        print(f"⚠️  设置请求拦截失败: {str(e)}")
+
+# 选择播放器提供的最低清晰度：按名称中的分辨率（360P）或 QUALITY_RANKS 中的名称排序
+LOWEST_QUALITY_JS = """
+var ranks = arguments[0];
+var items = Array.prototype.slice.call(document.querySelectorAll('.dplayer-quality-item'));
+if (!items.length) return null;
+var rank = function (text) {
+    var match = text.match(/(\\d{3,4})\\s*[pP]/);
+    if (match) return parseInt(match[1], 10);
+    for (var name in ranks) if (text.indexOf(name) >= 0) return ranks[name];
+    return null;
+};
+var best = null, bestRank = null;
+items.forEach(function (item) {
+    var r = rank(item.textContent.trim());
+    if (r !== null && (bestRank === null || r < bestRank)) { best = item; bestRank = r; }
+});
+var labels = items.map(function (item) { return item.textContent.trim(); });
+if (!best) return {label: null, labels: labels};
+var label = best.textContent.trim();
+var current = document.querySelector('.dplayer-quality-icon');
+if (current && current.textContent.trim() === label) return {label: label, switched: false, labels: labels};
+best.click();
+return {label: label, switched: true, labels: labels};
+"""
+
+def select_lowest_quality(driver, video):
+    """
+    省流量模式下切换到播放器提供的最低清晰度（播放速度不变）
+    DPlayer切换清晰度会换上新的video元素，返回新元素；没有清晰度选项或无法识别时返回原元素
+    """
+    if not BANDWIDTH_SAVER:
+        return video
+    try:
+        result = driver.execute_script(LOWEST_QUALITY_JS, QUALITY_RANKS)
+    except Exception as e:
+        print(f"⚠️  选择清晰度失败: {str(e)}")
+        return video
+    if not result:
+        return video
+    if not result.get("label"):
+        print(f"⚠️  无法识别清晰度选项 {result.get('labels')}，保持默认清晰度")
+        return video
+    if not result.get("switched"):
+        return video
+    print(f"📉 已切换到最低清晰度: {result['label']} (可选: {', '.join(result['labels'])})")
+    new_video = wait_until(driver, "quality_switch", lambda d: next(
+        (element for element in d.find_elements(By.CSS_SELECTOR, VIDEO_SELECTOR) if element != video), False))
+    if new_video is None:
+        return video
+    wait_video_metadata(driver, new_video)
+    return new_video
+
+# 预加载标签页在每个新文档加载前注入：视频一开始加载或播放就静音并暂停，直到取用时解除
+PREFETCH_HOLD_JS = """
+(function () {
+    window.__zlPrefetchHold = true;
+    var hold = function (e) {
+        var v = e.target;
+        if (!window.__zlPrefetchHold || !v || v.tagName !== 'VIDEO') return;
+        v.__zlHeld = true;
+        v.autoplay = false;
+        v.muted = true;
+        v.pause();
+    };
+    ['loadstart', 'play', 'playing'].forEach(function (type) { document.addEventListener(type, hold, true); });
+})();
+"""
+
+# 取用预加载页面时解除暂停保护，恢复被静音的视频（之后由 watch_video 正常播放）
+PREFETCH_RELEASE_JS = """
+window.__zlPrefetchHold = false;
+document.querySelectorAll('video').forEach(function (v) { if (v.__zlHeld) { v.muted = false; } });
+"""
+
+# 预加载页面检查：暂停可能已自动播放的视频，返回页面和视频元素状态，以及页面是否显示已学完
+PREFETCH_CHECK_JS = """
+var v = document.querySelector(arguments[0]);
+var nav = performance.getEntriesByType('navigation')[0];
+if (v) { v.pause(); }
+return {
+    href: location.href,
+    readyState: document.readyState,
+    status: (nav && nav.responseStatus) || null,
+    hasVideo: !!v,
+    duration: v && isFinite(v.duration) ? v.duration : null,
+    error: v && v.error ? v.error.code : null,
+    completed: !!(arguments[1] && document.querySelector(arguments[1]))
+};
+"""
+
+@timed("prefetch_start")
+def start_prefetch(driver, url):
+    """
+    在后台标签页打开下一个视频（不影响正在播放的视频，完成后切回当前窗口）
+    先打开空白页并注入 PREFETCH_HOLD_JS 再跳转，页面上的视频一出现就静音暂停，不会和当前视频同时播放
+    """
+    previous = getattr(driver, "_zl_prefetch", None)
+    before = set(driver.window_handles)
+    driver.execute_script("window.open('about:blank', arguments[0]);", PREFETCH_WINDOW_NAME)
+    new_handles = [handle for handle in driver.window_handles if handle not in before]
+    # 同名窗口已存在时 window.open 会复用它
+    handle = new_handles[0] if new_handles else (previous and previous["handle"])
+    hold_script = None
+    if handle:
+        current = driver.current_window_handle
+        driver.switch_to.window(handle)
+        try:
+            # 省流量模式下拦截规则也要在跳转前设置，页面的图片、字体和统计脚本从一开始就被拦截
+            apply_bandwidth_saver(driver)
+            hold_script = driver.execute_cdp_cmd(
+                "Page.addScriptToEvaluateOnNewDocument", {"source": PREFETCH_HOLD_JS}).get("identifier")
+            driver.execute_script("location.href = arguments[0];", url)
+        finally:
+            driver.switch_to.window(current)
+    driver._zl_prefetch = {"url": url, "handle": handle, "started": time.time(),
+                           "hold_script": hold_script} if handle else None
+    if handle:
+        print(f"📥 已在后台预加载下一个视频")
+
+def classify_prefetch(state, age):
+    """
+    判断预加载页面是否可用
+    返回: (分类, 说明)，分类为
+        ready: 可直接使用；fallback: 不使用，交给正常流程重新打开；
+        failed: 链接本身有问题，说明为失败原因，可以直接记为失败；completed: 页面显示已学完，可以直接记为完成
+    """
+    href = (state.get("href") or "").lower()
+    if "login" in href:
+        return "fallback", None  # 会话问题而不是链接问题，交给正常流程重新登录
+    status = state.get("status")
+    if status and status >= 400:
+        return "failed", f"页面返回HTTP {status}"
+    if state.get("completed"):
+        return "completed", "页面显示已学完"
+    if state.get("error"):
+        return "failed", f"视频加载错误 (code={state['error']})"
+    if not state.get("hasVideo"):
+        # 预加载时间不够长时不下结论，交给watch_video继续等待
+        if age >= STEP_TIMEOUTS["video_present"] and state.get("readyState") == "complete":
+            return "failed", "页面没有视频元素"
+    return "ready", None
+
+def release_prefetch_hold(driver, prefetch):
+    """在（已切换到的）预加载标签页上解除暂停保护，之后在这个标签页重新加载页面也不再注入"""
+    try:
+        driver.execute_script(PREFETCH_RELEASE_JS)
+        if prefetch.get("hold_script"):
+            driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument",
+                                   {"identifier": prefetch["hold_script"]})
+    except Exception as e:
+        print(f"⚠️  解除预加载页面的暂停保护失败: {str(e)}")
+
+def close_tab(driver, handle, return_to):
+    """关闭指定标签页并切换回return_to"""
+    try:
+        driver.switch_to.window(handle)
+        driver.close()
+    except Exception:
+        pass
+    driver.switch_to.window(return_to)
+
+@timed("prefetch_handoff")
+def take_prefetched(driver, url):
+    """
+    取用为url预加载的标签页：检查通过则把它作为新的播放标签页（旧播放标签页关闭），
+    发现链接问题或页面显示已学完时关闭它
+    返回: (分类, 说明)，见 classify_prefetch；没有可用的预加载页面时为 ("fallback", None)
+    """
+    prefetch = getattr(driver, "_zl_prefetch", None)
+    driver._zl_prefetch = None
+    if not prefetch:
+        return "fallback", None
+    main_window = driver.current_window_handle
+    handles = driver.window_handles
+    if prefetch["handle"] not in handles:
+        return "fallback", None
+    if prefetch["url"] != url:
+        close_tab(driver, prefetch["handle"], main_window)
+        return "fallback", None
+
+    driver.switch_to.window(prefetch["handle"])
+    state = driver.execute_script(PREFETCH_CHECK_JS, VIDEO_SELECTOR, PREFETCH_COMPLETED_SELECTOR) or {}
+    release_prefetch_hold(driver, prefetch)
+    kind, detail = classify_prefetch(state, time.time() - prefetch["started"])
+    if kind != "ready":
+        close_tab(driver, prefetch["handle"], main_window)
+        return kind, detail
+
+    old_worker = getattr(driver, "_zl_worker_tab", None)
+    if old_worker in handles and old_worker != prefetch["handle"]:
+        close_tab(driver, old_worker, main_window)
+    else:
+        driver.switch_to.window(main_window)
+    driver._zl_worker_tab = prefetch["handle"]
+    if state.get("duration") is None:
+        print(f"⚠️  预加载页面暂时读不到视频时长，播放时再等待")
+    return "ready", None
+
+def watch_video(driver, url, next_url=None, prefetched=False):
+    """
+    观看视频，支持进度卡住检测和自动播放下一集
+    next_url: 下一个要播放的视频，当前视频开始播放后在后台标签页预加载
+    prefetched: 播放标签页已经是预加载好的url页面（见 take_prefetched），不再重新打开
+    返回: (是否成功, 失败原因)
+    """
+    # 保存主窗口句柄
+    main_window = driver.current_window_handle
+    
+    # 在复用的播放标签页中打开
+    open_worker_tab(driver)
+    if prefetched:
+        print("⚡ 使用后台预加载好的页面")
+    else:
+        navigate(driver, url)
+    
+    episode_count = 0
+    total_episodes_played = 0
+    playlist = None  # 本视频的集数列表，视频元素出现后一次性从页面快照解析
+    saved_episodes = load_episode_progress(video_key(url))  # 上次运行留下的单集断点
+    
+    try:
+        while episode_count < MAX_EPISODES_PER_VIDEO:
+            episode_count += 1
+            current_episode = f"第{episode_count}集" if episode_count > 1 else "第1集"
+            print(f"🎬 正在播放 {current_episode}")
+            
+            # 等待视频加载
+            video = wait_until(driver, "video_present",
+                               EC.presence_of_element_located((By.CSS_SELECTOR, VIDEO_SELECTOR)))
+            if video is None:
+                print(f"❌ 等待视频元素超时，跳过{current_episode}")
+                return False, f"视频元素加载超时 ({current_episode})"
+
+            if playlist is None:
+                playlist = discover_episode_playlist(driver)
+                if len(playlist) > 1:
+                    print(f"📑 发现 {len(playlist)} 集: {', '.join(entry['label'] for entry in playlist[:5])}"
+                          f"{' ...' if len(playlist) > 5 else ''}")
+
+                # 断点续播：跳过上次已经看完的集数
+                resume_index = find_resume_episode(playlist, saved_episodes)
+                if resume_index is None:
+                    print(f"⏩ 断点记录显示所有集数都已完成")
+                    return True, f"播放完成，共{len(playlist) or 1}集（断点记录）"
+                if resume_index > episode_count:
+                    print(f"⏩ 断点续播：前{resume_index - 1}集已完成，直接跳到第{resume_index}集")
+                    if switch_to_episode(driver, playlist, resume_index):
+                        episode_count = resume_index
+                        total_episodes_played = resume_index - 1
+                        current_episode = f"第{episode_count}集"
+                        video = wait_until(driver, "video_present",
+                                           EC.presence_of_element_located((By.CSS_SELECTOR, VIDEO_SELECTOR)))
+                        if video is None:
+                            print(f"❌ 等待视频元素超时，跳过{current_episode}")
+                            return False, f"视频元素加载超时 ({current_episode})"
+                    else:
+                        print(f"⚠️  跳转到第{resume_index}集失败，从第1集开始播放")
+
+            # 点击视频区域激活播放（重要！）
+            video.click()
+            print("已激活视频交互")
+
+            # 强制通过JavaScript播放（应对点击失效）
+            driver.execute_script("arguments[0].play();", video)
+            wait_video_metadata(driver, video)
+            video = select_lowest_quality(driver, video)
+            install_rebuffer_monitor(driver, video)
+            if next_url:
+                try:
+                    start_prefetch(driver, next_url)
+                except Exception as e:
+                    print(f"⚠️  预加载下一个视频失败: {str(e)}")
+                next_url = None
+            resumed_at = resume_position(driver, video, saved_episodes.get(episode_count))
+            if resumed_at is not None:
+                print(f"⏩ 从上次位置 {resumed_at:.1f}s 继续播放{current_episode}")
+
+            # 监控播放进度
+            retry_count = 0
+            stuck_count = 0  # 连续卡住次数，决定恢复手段的级别
+            recovery_count = 0  # 本集已经尝试恢复的次数
+            last_good_time = resumed_at or 0  # 最后确认在正常推进的播放位置，重新加载后回到这里
+            last_time = 0
+            stuck_detection_counter = 0
+            last_checkpoint = time.time()
+            poll_slept, poll_position = 0.0, None  # 轮询模式：上次等待的秒数和等待前的播放位置
+            
+            episode_completed = False
+            
+            while True:
+                if MONITOR_MODE == "event":
+                    # 事件模式：一次长轮询拿到完整状态快照，结束/卡顿时立即返回
+                    state = wait_playback_event(driver, video)
+                    duration = state.get("duration")
+                    current_time = state.get("currentTime")
+                else:
+                    state = None
+                    duration = driver.execute_script("return arguments[0].duration", video)
+                    current_time = driver.execute_script("return arguments[0].currentTime", video)
+                    if poll_slept:
+                        # 等待期间播放位置前进了才算播放时间，否则是卡顿等待
+                        advanced = current_time is not None and poll_position is not None and current_time > poll_position
+                        record_span("playback" if advanced else "stall_wait", poll_slept)
+                        poll_slept = 0.0
+
+                if duration is None or current_time is None:
+                    retry_count += 1
+                    if retry_count > 3:
+                        print(f"❌ 无法获取视频时长，跳过{current_episode}")
+                        return False, f"无法获取视频时长 ({current_episode})"
+                    if state is None:
+                        time.sleep(3)
+                    continue
+
+                print(f"进度: {current_time:.1f}/{duration:.1f}s - {current_episode}")
+                # 只有播放位置前进时才刷新进度时间，卡住的会话在指标里表现为进度时间不再更新
+                if (_live["episode"] != episode_count or _live["position"] is None
+                        or round(current_time, 1) > _live["position"]):
+                    _live["progress_at"] = time.time()
+                _live.update(episode=episode_count, episode_label=current_episode, position=round(current_time, 1),
+                             duration=round(duration, 1))
+
+                # 检查视频是否完成
+                if current_time >= duration - COMPLETION_THRESHOLD or (state and state.get("ended")):
+                    print(f"✅ {current_episode}播放完成")
+                    episode_completed = True
+                    total_episodes_played += 1
+                    record_episode_progress(video_key(url), episode_count, current_episode, duration, current_time, True)
                     break
 
-                # 进度卡住检测 - 每隔几次检查进度是否有变化
-                stuck_detection_counter += 1
-                if stuck_detection_counter >= (STUCK_DETECTION_INTERVAL / POLL_FREQUENCY):
-                    if abs(current_time - last_time) < 0.1:  # 进度几乎没有变化
+                # 定期保存断点位置，中断后可以从这里继续
+                if time.time() - last_checkpoint >= EPISODE_CHECKPOINT_INTERVAL:
+                    record_episode_progress(video_key(url), episode_count, current_episode, duration, current_time, False)
+                    drain_network_capture(driver)
+                    last_checkpoint = time.time()
+
+                # 进度卡住检测 - 事件模式由页面端判断停滞，轮询模式每隔几次检查进度是否有变化
+                if state is not None:
+                    progress_stalled = state.get("reason") in ("idle", "error")
+                    stuck_check_due = progress_stalled or abs(current_time - last_time) >= 0.1
+                    if state.get("error"):
+                        print(f"⚠️  视频元素报告错误 (code={state.get('error')}) - {current_episode}")
+                else:
+                    stuck_detection_counter += 1
+                    stuck_check_due = stuck_detection_counter >= (STUCK_DETECTION_INTERVAL / POLL_FREQUENCY)
+                    progress_stalled = abs(current_time - last_time) < 0.1
+                if stuck_check_due:
+                    if progress_stalled:  # 进度几乎没有变化
                         stuck_count += 1
-                        print(f"⚠️  检测到进度可能卡住 ({stuck_count}/{MAX_STUCK_COUNT}) - {current_episode}")
+                        recovery_count += 1
+                        diagnostic = diagnose_playback(driver, video)
+                        diagnostic_text = describe_diagnostic(diagnostic)
+                        print(f"⚠️  检测到进度卡住 ({recovery_count}/{MAX_STUCK_COUNT}) - {current_episode}: {diagnostic_text}")
                         
-                        if stuck_count >= MAX_STUCK_COUNT:
-                            print(f"❌ {current_episode}进度卡住超过{MAX_STUCK_COUNT}次，跳过此集")
-                            return False, f"进度卡住 ({current_episode})"
+                        if recovery_count > MAX_STUCK_COUNT:
+                            print(f"❌ {current_episode}恢复{MAX_STUCK_COUNT}次后仍然卡住，跳过此集")
+                            return False, f"进度卡住 ({current_episode}): {diagnostic_text}"
                         
-                        # 尝试重新激活视频播放
-                        try:
-                            video.click()
-                            driver.execute_script("arguments[0].play();", video)
-                            print(f"🔄 尝试重新激活{current_episode}播放")
-                        except Exception as e:
-                            print(f"⚠️  重新激活播放失败: {str(e)}")
+                        # 按卡住次数逐级升级恢复手段
+                        step = choose_recovery_step(stuck_count, diagnostic)
+                        print(f"🔄 尝试恢复{current_episode}播放: {step}")
+                        with metric_span("stall_recovery"):
+                            video, recovered = recover_playback(
+                                driver, video, step, url, playlist, episode_count, last_good_time)
+                        record_recovery(video_key(url), episode_count, step, diagnostic_text, last_good_time, recovered)
+                        if video is None:
+                            print(f"❌ 重新加载后没有找到视频，跳过{current_episode}")
+                            return False, f"卡顿恢复失败 ({current_episode}): {diagnostic_text}"
                             
                     else:
                         stuck_count = 0  # 重置卡住计数
+                        last_good_time = current_time
                     
                     last_time = current_time
                     stuck_detection_counter = 0
 
-                time.sleep(POLL_FREQUENCY)
+                if state is None:
+                    poll_position, sleep_started = current_time, time.time()
+                    time.sleep(POLL_FREQUENCY)
+                    poll_slept = time.time() - sleep_started
             
             # 如果当前集播放完成，检查是否有下一集
             if episode_completed:
                 next_episode_found = False
                 
-                # 寻找下一集的链接
+                # 在本视频的播放列表中直接定位下一集
                 try:
-                    print(f"🔍 检查是否有下一集...")
-                    
-                    # 等待页面稳定
-                    time.sleep(2)
-                    
-                    # 尝试多种可能的下一集选择器
-                    next_episode_selectors = [
-                        f"[href*='第{episode_count+1}集'], [title*='第{episode_count+1}集']",
-                        f"[href*='第0{episode_count+1}集'], [title*='第0{episode_count+1}集']",
-                        f"[href*='{episode_count+1}'], [title*='{episode_count+1}']",
-                        f".episode-{episode_count+1}, .ep-{episode_count+1}",
-                        f"[data-episode='{episode_count+1}']",
-                        ".next-episode, .episode-next",
-                        f"a:contains('第{episode_count+1}集')",
-                        f"a:contains('{episode_count+1}')"
-                    ]
-                    
-                    # 也尝试通用的集数选择器
-                    episode_elements = driver.find_elements(By.CSS_SELECTOR, EPISODE_SELECTOR)
-                    
-                    # 检查是否有包含下一集数字的元素
-                    for element in episode_elements:
-                        try:
-                            element_text = element.text.strip()
-                            element_title = element.get_attribute('title') or ""
-                            element_href = element.get_attribute('href') or ""
-                            
-                            # 检查是否包含下一集的标识
-                            next_episode_indicators = [
-                                f"第{episode_count+1}集", f"第0{episode_count+1}集",
-                                f"集{episode_count+1}", f"{episode_count+1}集",
-                                f"EP{episode_count+1}", f"ep{episode_count+1}",
-                                str(episode_count+1)
-                            ]
-                            
-                            for indicator in next_episode_indicators:
-                                if (indicator in element_text or 
-                                    indicator in element_title or 
-                                    indicator in element_href):
-                                    
-                                    print(f"🎯 找到下一集: {element_text or element_title}")
-                                    
-                                    # 点击下一集
-                                    driver.execute_script("arguments[0].click();", element)
-                                    time.sleep(3)
-                                    
-                                    # 检查页面是否有变化
-                                    new_video = driver.find_elements(By.CSS_SELECTOR, VIDEO_SELECTOR)
-                                    if new_video:
-                                        print(f"✅ 成功切换到第{episode_count+1}集")
-                                        next_episode_found = True
-                                        break
-                                    else:
-                                        print(f"⚠️  切换集数失败，没有找到新的视频元素")
-                                        
-                            if next_episode_found:
-                                break
-                                
-                        except Exception as e:
-                            print(f"⚠️  检查集数元素时出错: {str(e)}")
-                            continue
-                    
-                    if not next_episode_found:
-                        # 尝试直接查找包含数字的可点击元素
-                        try:
-                            all_links = driver.find_elements(By.CSS_SELECTOR, "a, button, [onclick], [role='button']")
-                            for link in all_links:
-                                try:
-                                    text = link.text.strip()
-                                    if (f"{episode_count+1}" in text and 
-                                        len(text) <= 20 and  # 避免匹配过长的文本
-                                        ("集" in text or "EP" in text or "ep" in text or text.isdigit())):
-                                        
-                                        print(f"🎯 尝试点击可能的下一集: {text}")
-                                        driver.execute_script("arguments[0].click();", link)
-                                        time.sleep(3)
-                                        
-                                        # 检查是否成功
-                                        new_video = driver.find_elements(By.CSS_SELECTOR, VIDEO_SELECTOR)
-                                        if new_video:
-                                            print(f"✅ 成功切换到下一集: {text}")
-                                            next_episode_found = True
-                                            break
-                                except:
-                                    continue
-                        except Exception as e:
-                            print(f"⚠️  搜索下一集链接时出错: {str(e)}")
-                    
+                    if playlist is None:
+                        playlist = discover_episode_playlist(driver)
+                    next_index = episode_count + 1
+                    next_entry = next((entry for entry in playlist if entry["index"] == next_index), None)
+                    if next_entry is not None:
+                        print(f"🎯 找到下一集: {next_entry['label']}")
+                        if switch_to_episode(driver, playlist, next_index):
+                            print(f"✅ 成功切换到第{next_index}集")
+                            next_episode_found = True
+                        else:
+                            print(f"⚠️  切换集数失败，页面和视频源都没有变化")
                 except Exception as e:
                     print(f"❌ 检查下一集时出错: {str(e)}")
                 
@@ -547,47 +2641,903 @@ def watch_video(driver, url):
         return False, f"处理异常: {str(e)}"
     finally:
         try:
-            # 安全地关闭当前标签页并切换回主窗口
-            current_window = driver.current_window_handle
-            if len(driver.window_handles) > 1:
-                driver.close()
-                # 切换回主窗口
-                if main_window in driver.window_handles:
-                    driver.switch_to.window(main_window)
-                else:
-                    # 如果主窗口句柄不存在，切换到第一个可用窗口
-                    driver.switch_to.window(driver.window_handles[0])
-            time.sleep(1)  # 防止快速切换导致崩溃
+            # 播放标签页留着给下一个视频复用，只换成空白页停止播放、释放页面内存
+            collect_rebuffers(driver)
+            driver.get("about:blank")
+            driver.switch_to.window(main_window)
         except Exception as e:
             print(f"❌ 窗口切换时出错：{str(e)}")
-            # 如果出错，尝试重新创建一个主窗口
             try:
-                if len(driver.window_handles) == 0:
-                    driver.execute_script("window.open('about:blank');")
+                if main_window in driver.window_handles:
+                    driver.switch_to.window(main_window)
+                elif driver.window_handles:
                     driver.switch_to.window(driver.window_handles[0])
-            except:
+            except Exception:
                 pass
 
 
-def main():
+def get_process_tree(pid):
+    """返回进程及其全部子孙进程的PID列表（进程不存在时返回空列表）"""
+    if psutil is not None:
+        try:
+            return [pid] + [child.pid for child in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+    if not os.path.isdir('/proc'):
+        return [pid]
+    if not os.path.exists(f'/proc/{pid}'):
+        return []
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+def get_process_usage(pids):
+    """统计一组进程的常驻内存（字节）与累计CPU时间（秒）"""
+    rss = 0
+    cpu_seconds = 0.0
+    for pid in pids:
+        try:
+            if psutil is not None:
+                process = psutil.Process(pid)
+                rss += process.memory_info().rss
+                cpu_times = process.cpu_times()
+                cpu_seconds += cpu_times.user + cpu_times.system
+            else:
+                with open(f'/proc/{pid}/statm', 'r') as f:
+                    rss += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+                with open(f'/proc/{pid}/stat', 'r') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+                cpu_seconds += (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        except Exception:
+            continue  # 进程可能已经退出
+    return rss, cpu_seconds
+
+def is_renderer_process(pid):
+    """是否是Chrome渲染进程（命令行带 --type=renderer）"""
+    try:
+        if psutil is not None:
+            cmdline = psutil.Process(pid).cmdline()
+        else:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                cmdline = f.read().decode('utf-8', errors='replace').split('\0')
+    except Exception:
+        return False
+    return "--type=renderer" in cmdline
+
+def get_browser_memory(driver):
+    """
+    统计浏览器会话内存（只读进程信息，不发WebDriver命令，可在后台线程调用）
+    返回: {"rss_mb": 会话总内存, "renderer_mb": 渲染进程内存}，拿不到驱动进程时返回None
+    """
+    try:
+        driver_pid = driver.service.process.pid
+    except AttributeError:
+        return None
+    pids = get_process_tree(driver_pid)
+    rss, _ = get_process_usage(pids)
+    renderer_rss, _ = get_process_usage([pid for pid in pids if is_renderer_process(pid)])
+    return {"rss_mb": rss / 1024 / 1024, "renderer_mb": renderer_rss / 1024 / 1024}
+
+def kill_process_tree(pid):
+    """结束进程及其子孙进程（工作进程被杀时连带清理它启动的chromedriver/Chrome）"""
+    pids = get_process_tree(pid)
+    for child_pid in reversed(pids):
+        try:
+            if psutil is not None:
+                psutil.Process(child_pid).kill()
+            elif os.name == 'nt':
+                import subprocess
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(child_pid)], capture_output=True)
+            else:
+                import signal
+                os.kill(child_pid, signal.SIGKILL)
+        except Exception:
+            continue
+
+# 浏览器会话上一次资源采样：chromedriver pid -> (累计CPU秒数, 采样时间)
+_resource_samples = {}
+
+def report_browser_resources(driver, quiet=False):
+    """
+    统计浏览器会话（chromedriver及其全部Chrome子进程）的内存和CPU占用，并对照会话预算
+    返回: {"rss_mb": ..., "renderer_mb": ..., "cpu_percent": ...}，CPU为距上次采样的平均占用，首次采样为None
+    """
+    try:
+        driver_pid = driver.service.process.pid
+    except AttributeError:
+        return None
+    
+    pids = get_process_tree(driver_pid)
+    rss, cpu_seconds = get_process_usage(pids)
+    renderer_rss, _ = get_process_usage([pid for pid in pids if is_renderer_process(pid)])
+    sampled_at = time.time()
+    previous = _resource_samples.get(driver_pid)
+    _resource_samples[driver_pid] = (cpu_seconds, sampled_at)
+    cpu_percent = None
+    if previous is not None:
+        cpu_percent = (cpu_seconds - previous[0]) / max(sampled_at - previous[1], 0.001) * 100
+    usage = {"rss_mb": rss / 1024 / 1024, "renderer_mb": renderer_rss / 1024 / 1024, "cpu_percent": cpu_percent}
+    
+    if not quiet:
+        cpu_text = "采样中" if cpu_percent is None else f"{cpu_percent:.0f}%"
+        print(f"🖥️  浏览器资源: 内存 {usage['rss_mb']:.0f}/{SESSION_RSS_BUDGET_MB}MB "
+              f"(渲染进程 {usage['renderer_mb']:.0f}MB), "
+              f"CPU {cpu_text}/{SESSION_CPU_BUDGET_PERCENT}% ({BROWSER_PROFILE})")
+        if usage["rss_mb"] > SESSION_RSS_BUDGET_MB:
+            print(f"⚠️  浏览器内存超出会话预算 {SESSION_RSS_BUDGET_MB}MB")
+        if cpu_percent is not None and cpu_percent > SESSION_CPU_BUDGET_PERCENT:
+            print(f"⚠️  浏览器CPU超出会话预算 {SESSION_CPU_BUDGET_PERCENT}%")
+    return usage
+
+def build_chrome_options(profile=None):
+    """按浏览器配置（default / lean）生成Chrome启动参数"""
+    profile = profile or BROWSER_PROFILE
     options = ChromeOptions()  # 修改为Chrome选项
     options.add_argument("--mute-audio")
     options.add_argument("--disable-infobars")
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
     options.add_argument("--autoplay-policy=no-user-gesture-required")
-    # macOS上添加无头模式选项（可选）
-    # options.add_argument("--headless")
+    options.page_load_strategy = PAGE_LOAD_STRATEGY
+    if profile == "lean":
+        # 无头、小窗口、无GPU、关闭扩展/同步/后台联网，并限制渲染进程数
+        for argument in LEAN_CHROME_ARGUMENTS:
+            options.add_argument(argument)
+        options.add_argument(f"--window-size={LEAN_WINDOW_SIZE}")
+        options.add_argument(f"--renderer-process-limit={LEAN_RENDERER_PROCESS_LIMIT}")
+    elif profile != "default":
+        raise ValueError(f"未知的浏览器配置: {profile}")
+    if CHROME_USER_DATA_DIR:
+        options.add_argument(f"--user-data-dir={os.path.abspath(CHROME_USER_DATA_DIR)}")
+    if NETWORK_CAPTURE or BANDWIDTH_SAVER:
+        # 性能日志只记录Network事件，由 NetworkCapture 定期读出
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+    return options
+
+def find_chrome_binary():
+    """查找本机Chrome可执行文件，找不到返回None"""
+    if CHROME_BINARY:
+        return CHROME_BINARY
+    for name in ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome"):
+        path = shutil.which(name)
+        if path:
+            return path
+    candidates = [
+        "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+        os.path.expandvars(r"%ProgramFiles%\Google\Chrome\Application\chrome.exe"),
+        os.path.expandvars(r"%ProgramFiles(x86)%\Google\Chrome\Application\chrome.exe"),
+        os.path.expandvars(r"%LocalAppData%\Google\Chrome\Application\chrome.exe"),
+    ]
+    for path in candidates:
+        if os.path.isfile(path):
+            return path
+    return None
 
-    # 使用webdriver-manager自动管理Chrome驱动程序
-    service = Service(ChromeDriverManager().install())
+def read_major_version(executable):
+    """运行 `<程序> --version` 解析主版本号（Chrome和chromedriver通用），失败返回None"""
+    try:
+        output = subprocess.run([executable, "--version"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.search(r"(\d+)\.\d+\.\d+(\.\d+)?", output or "")
+    return int(match.group(1)) if match else None
+
+def get_chrome_major_version(chrome_binary):
+    """获取本机Chrome主版本号；Windows上 chrome --version 不输出，改读注册表"""
+    if os.name == "nt":
+        try:
+            import winreg
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Google\Chrome\BLBeacon") as key:
+                version, _ = winreg.QueryValueEx(key, "version")
+            return int(version.split(".")[0])
+        except (OSError, ValueError, ImportError):
+            pass
+    return read_major_version(chrome_binary) if chrome_binary else None
+
+def find_local_chromedrivers(chrome_major):
+    """列出本地可用的chromedriver候选：缓存目录中对应版本优先，其次缓存目录其他位置、webdriver-manager缓存和PATH"""
+    candidates = []
+    if chrome_major:
+        candidates.append(os.path.join(DRIVER_CACHE_DIR, str(chrome_major), DRIVER_EXECUTABLE))
+    candidates.extend(str(path) for path in sorted(Path(DRIVER_CACHE_DIR).glob(f"**/{DRIVER_EXECUTABLE}")))
+    candidates.extend(str(path) for path in sorted(
+        (Path.home() / ".wdm" / "drivers" / "chromedriver").glob(f"**/{DRIVER_EXECUTABLE}"), reverse=True))
+    path_driver = shutil.which("chromedriver")
+    if path_driver:
+        candidates.append(path_driver)
+    
+    seen = set()
+    for candidate in candidates:
+        candidate = os.path.abspath(candidate)
+        if candidate not in seen and os.path.isfile(candidate):
+            seen.add(candidate)
+            yield candidate
+
+def resolve_chromedriver():
+    """
+    解析与本机Chrome主版本匹配的chromedriver路径，全程不联网
+    解析结果按Chrome路径和修改时间缓存在 DRIVER_CACHE_DIR/resolved.json，下次启动无需再运行 --version
+    只有 ALLOW_DRIVER_DOWNLOAD 为True时才退回webdriver-manager联网下载
+    """
+    chrome_binary = find_chrome_binary()
+    chrome_mtime = os.path.getmtime(chrome_binary) if chrome_binary and os.path.exists(chrome_binary) else None
+    cache_path = os.path.join(DRIVER_CACHE_DIR, "resolved.json")
+    cached = load_json_snapshot(cache_path, {}) if os.path.exists(cache_path) else {}
+    driver_path = cached.get("driver_path")
+    if (cached.get("chrome_binary") == chrome_binary and cached.get("chrome_mtime") == chrome_mtime
+            and driver_path and os.path.isfile(driver_path)
+            and cached.get("driver_mtime") == os.path.getmtime(driver_path)):
+        return driver_path
+    
+    chrome_major = get_chrome_major_version(chrome_binary)
+    driver_path = None
+    for candidate in find_local_chromedrivers(chrome_major):
+        driver_major = read_major_version(candidate)
+        if chrome_major is None or driver_major == chrome_major:
+            driver_path = candidate
+            break
+        print(f"⏭️  跳过版本不匹配的驱动 {candidate} (ChromeDriver {driver_major}, Chrome {chrome_major})")
+    
+    if driver_path is None:
+        if not ALLOW_DRIVER_DOWNLOAD:
+            raise RuntimeError(
+                f"本地未找到与 Chrome {chrome_major or '未知版本'} 匹配的chromedriver。"
+                f"请把驱动放到 {os.path.join(DRIVER_CACHE_DIR, str(chrome_major or '<主版本号>'), DRIVER_EXECUTABLE)}，"
+                f"或使用 run --allow-driver-download 允许联网下载")
+        print("🌐 本地没有匹配的驱动，使用webdriver-manager联网下载...")
+        from webdriver_manager.chrome import ChromeDriverManager  # 添加webdriver管理器
+        downloaded_path = ChromeDriverManager().install()
+        # 复制进本地缓存目录，之后的启动不再联网
+        cache_dir = os.path.join(DRIVER_CACHE_DIR, str(chrome_major or read_major_version(downloaded_path)))
+        os.makedirs(cache_dir, exist_ok=True)
+        driver_path = os.path.abspath(os.path.join(cache_dir, DRIVER_EXECUTABLE))
+        shutil.copy2(downloaded_path, driver_path)
+    
+    os.makedirs(DRIVER_CACHE_DIR, exist_ok=True)
+    atomic_write_json(cache_path, {
+        "chrome_binary": chrome_binary,
+        "chrome_mtime": chrome_mtime,
+        "chrome_major": chrome_major,
+        "driver_path": driver_path,
+        "driver_mtime": os.path.getmtime(driver_path),
+    })
+    print(f"🔧 使用chromedriver: {driver_path} (Chrome {chrome_major or '未知版本'})")
+    return driver_path
+
+def create_driver(profile=None):
+    """按浏览器配置启动Chrome并完成通用的会话设置，报告驱动解析和浏览器启动耗时"""
+    load_selenium()
+    options = build_chrome_options(profile)
+
+    resolve_started = time.time()
+    service = Service(resolve_chromedriver())
+    launch_started = time.time()
     driver = webdriver.Chrome(service=service, options=options)
+    launch_finished = time.time()
+    print(f"⏱️  驱动解析 {launch_started - resolve_started:.2f}s，浏览器启动 {launch_finished - launch_started:.2f}s")
+    record_span("driver_resolve", launch_started - resolve_started)
+    record_span("browser_launch", launch_finished - launch_started)
+    count_webdriver_commands(driver)
+    # 事件模式的长轮询需要比单次阻塞时间更长的脚本超时
+    driver.set_script_timeout(EVENT_WAIT_TIMEOUT + WAIT_TIMEOUT)
+    # 记录初始CPU采样，之后每个视频报告一次区间占用
+    report_browser_resources(driver, quiet=True)
+    return driver
+
+def prometheus_label(value):
+    """转义Prometheus文本格式中的标签值"""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def render_live_metrics():
+    """把运行状态整理成Prometheus文本格式（只读进程信息，不发WebDriver命令）"""
+    account = f'account="{prometheus_label(_live["account"] or "")}"'
+    browser = _live["browser"]
+    driver = browser.driver if browser is not None else None
+    process_rss, _ = get_process_usage([os.getpid()])
+    memory = get_browser_memory(driver) if driver is not None else None
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if value is not None:
+                lines.append(f"{name}{{{', '.join([account] + labels)}}} {value}")
+
+    metric("zlstudy_up", "gauge", "会话进程在运行", [([], 1)])
+    metric("zlstudy_start_time_seconds", "gauge", "本次运行开始时间（Unix时间）", [([], round(_metrics["run_started"], 3))])
+    if _live["video"]:
+        metric("zlstudy_current_video_info", "gauge", "正在播放的视频和集数",
+               [([f'video="{prometheus_label(_live["video"])}"',
+                  f'episode="{prometheus_label(_live["episode_label"] or "")}"'], 1)])
+    metric("zlstudy_current_episode", "gauge", "正在播放的集数", [([], _live["episode"])])
+    metric("zlstudy_playback_position_seconds", "gauge", "当前集的播放位置（秒）",
+           [([], _live["position"])])
+    metric("zlstudy_playback_duration_seconds", "gauge", "当前集的时长（秒）", [([], _live["duration"])])
+    metric("zlstudy_last_progress_timestamp_seconds", "gauge", "播放位置最近一次前进的时间（Unix时间），长时间不更新说明会话卡住",
+           [([], _live["progress_at"] and round(_live["progress_at"], 3))])
+    metric("zlstudy_videos_completed_total", "counter", "本次运行完成的视频数", [([], _live["completed"])])
+    metric("zlstudy_videos_failed_total", "counter", "本次运行失败的视频数", [([], _live["failed"])])
+    metric("zlstudy_stall_recoveries_total", "counter", "按步骤和结果统计的卡顿恢复次数",
+           [([f'step="{step}"', f'result="{result}"'], count)
+            for (step, result), count in sorted(dict(_live["recoveries"]).items())])
+    metric("zlstudy_driver_restarts_total", "counter", "本次运行的浏览器重启次数",
+           [([], browser.recycle_count if browser is not None else 0)])
+    metric("zlstudy_process_resident_memory_bytes", "gauge", "本进程常驻内存（字节）", [([], process_rss)])
+    metric("zlstudy_browser_resident_memory_bytes", "gauge", "chromedriver和Chrome进程树的常驻内存（字节）",
+           [([], memory and round(memory["rss_mb"] * 1024 * 1024))])
+    metric("zlstudy_browser_renderer_memory_bytes", "gauge", "Chrome渲染进程的常驻内存（字节）",
+           [([], memory and round(memory["renderer_mb"] * 1024 * 1024))])
+    return "\n".join(lines) + "\n"
+
+def serve_live_metrics(port=None, host=None):
+    """
+    在后台线程启动本机指标端点：GET /metrics 返回Prometheus文本格式，监控据此发现卡住或已退出的会话
+    端口被占用时只打印警告，不影响播放
+    返回: HTTPServer，启动失败返回None
+    """
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            try:
+                data = render_live_metrics().encode("utf-8")
+            except Exception as e:
+                self.send_error(500, str(e))
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    host = host or METRICS_HTTP_HOST
+    try:
+        server = HTTPServer((host, port if port is not None else METRICS_HTTP_PORT), Handler)
+    except OSError as e:
+        print(f"⚠️  指标端点启动失败 ({host}:{port if port is not None else METRICS_HTTP_PORT}): {str(e)}")
+        return None
+    threading.Thread(target=server.serve_forever, name="zlstudy-metrics-http", daemon=True).start()
+    print(f"📡 指标端点: http://{host}:{server.server_port}/metrics")
+    return server
+
+class BrowserSession:
+    """
+    浏览器生命周期管理：后台线程跟踪浏览器/渲染进程内存，
+    播放满 RECYCLE_AFTER_VIDEOS 个视频或内存超过 BROWSER_RECYCLE_RSS_MB 时重启浏览器并恢复登录，
+    进度由记录文件和单集断点保存，重启对播放列表透明
+    """
+
+    def __init__(self, profile=None, interval=None):
+        self.profile = profile
+        self.interval = interval or BROWSER_WATCHDOG_INTERVAL
+        self.driver = None
+        self.videos_since_start = 0
+        self.recycle_count = 0
+        self.last_memory = None
+        self.peak_rss_mb = 0.0
+        self.over_limit = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动浏览器和内存看门狗线程，返回driver"""
+        self.driver = create_driver(self.profile)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="zlstudy-browser-watchdog", daemon=True)
+            self._thread.start()
+        return self.driver
+
+    def stop(self):
+        """停止看门狗并关闭浏览器"""
+        self._stop_event.set()
+        self.quit()
+
+    def quit(self):
+        """关闭浏览器，chromedriver已无响应时直接结束其进程树"""
+        driver, self.driver = self.driver, None
+        if driver is None:
+            return
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"⚠️  正常关闭浏览器失败 ({str(e)})，强制结束进程")
+            try:
+                kill_process_tree(driver.service.process.pid)
+            except AttributeError:
+                pass
+
+    def alive(self):
+        """浏览器是否还能响应WebDriver命令"""
+        try:
+            self.driver.current_window_handle
+            return True
+        except Exception:
+            return False
+
+    def video_finished(self):
+        self.videos_since_start += 1
+
+    def recycle_reason(self):
+        """需要重启浏览器时返回原因，否则返回None"""
+        if not self.alive():
+            return "浏览器已无响应"
+        if self.over_limit:
+            return f"浏览器内存 {self.last_memory['rss_mb']:.0f}MB 超过 {BROWSER_RECYCLE_RSS_MB}MB"
+        if RECYCLE_AFTER_VIDEOS and self.videos_since_start >= RECYCLE_AFTER_VIDEOS:
+            return f"已连续播放 {self.videos_since_start} 个视频"
+        return None
+
+    def recycle(self, reason):
+        """
+        重启浏览器并恢复登录状态（持久化用户目录或cookies.json）
+        返回: 是否重新登录成功
+        """
+        print(f"♻️  重启浏览器: {reason}")
+        if self.driver is not None and self.alive():
+            save_cookies(self.driver)
+        self.quit()
+        self.driver = create_driver(self.profile)
+        self.videos_since_start = 0
+        self.over_limit = False
+        self.last_memory = None
+        self.recycle_count += 1
+        return auto_login(self.driver)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            driver = self.driver
+            if driver is None:
+                continue
+            memory = get_browser_memory(driver)
+            if memory is None:
+                continue
+            self.last_memory = memory
+            self.peak_rss_mb = max(self.peak_rss_mb, memory["rss_mb"])
+            if memory["rss_mb"] > BROWSER_RECYCLE_RSS_MB and not self.over_limit:
+                self.over_limit = True
+                print(f"⚠️  浏览器内存 {memory['rss_mb']:.0f}MB (渲染进程 {memory['renderer_mb']:.0f}MB) "
+                      f"超过 {BROWSER_RECYCLE_RSS_MB}MB，当前视频结束后重启浏览器")
+
+def load_duration_index():
+    """读取时长索引 {视频ID: {"url", "duration", "episodes", "estimated", "probed_at"}}"""
+    return load_json_snapshot(DURATION_INDEX_PATH, {})
+
+def probe_video_metadata(driver, url):
+    """
+    在播放标签页打开视频页面，只读到时长和集数就停（暂停视频、不播放）
+    多集视频只读第1集的时长，总时长按集数估算（estimated=True），播放过的集数再用实际时长修正
+    返回: {"duration": 单集时长, "episodes": 集数, "estimated": bool}，页面没有视频时返回None
+    """
+    navigate(driver, url, step="duration_probe")
+    video = wait_until(driver, "video_present", EC.presence_of_element_located((By.CSS_SELECTOR, VIDEO_SELECTOR)))
+    if video is None:
+        return None
+    driver.execute_script("arguments[0].muted = true; arguments[0].pause();", video)
+    if not wait_video_metadata(driver, video):
+        return None
+    duration = driver.execute_script(
+        "var v = arguments[0]; v.pause(); return isFinite(v.duration) ? v.duration : null;", video)
+    if not duration:
+        return None
+    episodes = len(discover_episode_playlist(driver)) or 1
+    return {"duration": duration, "episodes": episodes, "estimated": episodes > 1}
+
+def build_duration_index(driver, video_urls):
+    """
+    元数据预读：为待处理视频建立时长索引（按视频ID缓存到 DURATION_INDEX_PATH）
+    条目超过 DURATION_INDEX_TTL_DAYS 后重新读取；播放过的集数由单集断点中的实际时长修正（见 remaining_seconds）
+    返回: 时长索引
+    """
+    index = load_duration_index()
+    main_window = driver.current_window_handle
+    stats = collections.Counter()
+    started = time.time()
+    try:
+        for url in video_urls:
+            key = video_key(url)
+            entry = index.get(key)
+            probed_at = parse_timestamp(entry.get("probed_at")) if entry else None
+            if probed_at and time.time() - probed_at < DURATION_INDEX_TTL_DAYS * 86400:
+                stats["cached"] += 1
+                continue
+            open_worker_tab(driver)
+            try:
+                metadata = probe_video_metadata(driver, url)
+            except Exception as e:
+                print(f"⚠️  读取视频时长失败 {url}: {str(e)}")
+                metadata = None
+            if metadata is None:
+                stats["failed"] += 1
+                continue
+            stats["stale" if entry else "probed"] += 1
+            index[key] = {"url": url, **metadata, "probed_at": now_timestamp()}
+            print(f"🗂️  {key}: {metadata['episodes']}集，每集约 {metadata['duration'] / 60:.1f} 分钟")
+    finally:
+        try:
+            driver.get("about:blank")
+            driver.switch_to.window(main_window)
+        except Exception:
+            pass
+        atomic_write_json(DURATION_INDEX_PATH, index)
+    print(f"🗂️  时长索引: 缓存命中 {stats['cached']}，新读取 {stats['probed']}，过期重新读取 {stats['stale']}，"
+          f"读取失败 {stats['failed']}，耗时 {time.time() - started:.1f}s")
+    return index
+
+def remaining_seconds(url, index):
+    """按时长索引和单集断点估算视频剩余播放秒数，索引中没有的返回None"""
+    key = video_key(url)
+    entry = index.get(key)
+    if not entry:
+        return None
+    saved = load_episode_progress(key)
+    total = 0.0
+    for episode in range(1, entry["episodes"] + 1):
+        record = saved.get(episode) or {}
+        duration = record.get("duration") or entry["duration"]
+        total += 0 if record.get("completed") else max(duration - (record.get("position") or 0), 0)
+    return total
+
+def estimate_video_overhead():
+    """每个视频的非播放开销（秒）：取指标文件中最近视频记录的平均值，没有记录时用 SCHEDULE_OVERHEAD_SECONDS"""
+    overheads = []
+    if os.path.exists(METRICS_PATH):
+        with open(METRICS_PATH, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("type") == "video" and record.get("success"):
+                    overheads.append(record["overhead"])
+    overheads = overheads[-200:]
+    return sum(overheads) / len(overheads) if overheads else SCHEDULE_OVERHEAD_SECONDS
+
+def check_schedule_settings(policy=None, deadline=None):
+    """检查调度设置，在启动浏览器之前发现问题；返回问题说明，没有问题返回None"""
+    policy = policy or SCHEDULE_POLICY
+    deadline = deadline or SCHEDULE_DEADLINE
+    if policy not in ("file", "shortest", "deadline"):
+        return f"未知的调度策略: {policy}"
+    if policy != "deadline":
+        return None
+    if not deadline:
+        return "deadline 策略需要设置截止时间（SCHEDULE_DEADLINE 或 --deadline）"
+    try:
+        time.strptime(deadline, DEADLINE_FORMAT)
+    except ValueError:
+        return f"截止时间格式不对: {deadline}（应为 \"YYYY-MM-DD HH:MM\"，如 \"2026-12-31 18:00\"）"
+    return None
+
+def schedule_videos(video_urls, index, policy=None, deadline=None, target=None):
+    """
+    按调度策略排列待处理视频
+    file: 链接列表顺序；shortest: 剩余时长最短的优先（未知时长的排在最后，保持原顺序）；
+    deadline: 在截止时间前能完成的最短视频优先，其余按列表顺序，并提示能否达成目标数量
+    返回: (排好序的链接列表, 每个视频的预计秒数列表，未知为None)
+    """
+    policy = policy or SCHEDULE_POLICY
+    overhead = estimate_video_overhead()
+    estimates = {url: remaining_seconds(url, index) for url in video_urls}
+    known = [seconds for seconds in estimates.values() if seconds is not None]
+    average = sum(known) / len(known) if known else None
+    by_length = sorted(video_urls, key=lambda url: (estimates[url] is None, estimates[url] or 0))
+    if policy == "file":
+        ordered = list(video_urls)
+    elif policy == "shortest":
+        ordered = by_length
+    elif policy == "deadline":
+        deadline = deadline or SCHEDULE_DEADLINE
+        target = target or SCHEDULE_TARGET
+        problem = check_schedule_settings(policy, deadline)
+        if problem:
+            raise ValueError(problem)
+        available = time.mktime(time.strptime(deadline, DEADLINE_FORMAT)) - time.time()
+        selected, used = [], 0.0
+        for url in by_length:
+            cost = (estimates[url] if estimates[url] is not None else average or 0) + overhead
+            if used + cost > available:
+                break
+            selected.append(url)
+            used += cost
+        chosen = set(selected)
+        ordered = selected + [url for url in video_urls if url not in chosen]
+        print(f"🎯 截止 {deadline}（还有 {max(available, 0) / 3600:.1f} 小时）前预计可完成 {len(selected)} 个视频"
+              f"{f'，目标 {target} 个' if target else ''}")
+        if target and len(selected) < target:
+            print(f"⚠️  按当前时长估算无法在截止时间前完成 {target} 个，差 {target - len(selected)} 个")
+    else:
+        raise ValueError(f"未知的调度策略: {policy}")
+    return ordered, [estimates[url] for url in ordered]
+
+def estimate_queue_seconds(estimates):
+    """待处理队列的总剩余秒数（含每个视频的开销，未知时长按已知视频的平均值估算），一个都不知道时返回None"""
+    known = [seconds for seconds in estimates if seconds is not None]
+    if not known:
+        return None
+    return sum(known) + (len(estimates) - len(known)) * (sum(known) / len(known)) + len(estimates) * estimate_video_overhead()
+
+def report_queue_eta(estimates):
+    """打印待处理队列的总剩余时长和预计完成时间"""
+    total = estimate_queue_seconds(estimates)
+    if total is None:
+        return None
+    known = [seconds for seconds in estimates if seconds is not None]
+    unknown = len(estimates) - len(known)
+    overhead = estimate_video_overhead()
+    finish_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(time.time() + total))
+    print(f"⏱️  剩余 {len(estimates)} 个视频: 播放 {sum(known) / 3600:.1f} 小时"
+          f"{f'（另有 {unknown} 个未读取时长，按平均估算）' if unknown else ''}，"
+          f"每个视频开销约 {overhead:.0f}s，合计约 {total / 3600:.1f} 小时，预计 {finish_at} 完成")
+    return total
+
+def pending_video_urls():
+    """链接列表中还需要处理的视频（排除已完成和已停放/未到重试时间的失败记录），不打印记录加载信息"""
+    video_urls, completed, failed = read_progress_snapshot()
+    return [url for url in video_urls if video_key(url) not in completed
+            and (video_key(url) not in failed or retry_due(failed[video_key(url)]))]
+
+def plan_queue(cached_only=False, limit=20):
+    """
+    plan 子命令：读取待处理视频的时长（缓存未命中时启动浏览器预读，cached_only 时只用缓存），
+    按调度策略排好顺序并给出预计完成时间
+    返回: 退出码
+    """
+    video_urls = pending_video_urls()
+    if not video_urls:
+        print("🎉 没有待处理的视频")
+        return EXIT_OK
+    index = load_duration_index()
+    if not cached_only and any(video_key(url) not in index for url in video_urls):
+        browser = BrowserSession()
+        try:
+            driver = browser.start()
+            if not auto_login(driver):
+                print("❌ 登录失败，只使用已缓存的时长")
+            else:
+                index = build_duration_index(driver, video_urls)
+        finally:
+            browser.stop()
+    ordered, estimates = schedule_videos(video_urls, index)
+    print(f"\n📋 播放顺序（{SCHEDULE_POLICY}，前 {min(limit, len(ordered))} 个）:")
+    for i, (url, seconds) in enumerate(zip(ordered[:limit], estimates[:limit]), 1):
+        entry = index.get(video_key(url), {})
+        length = f"{seconds / 60:6.1f} 分钟" if seconds is not None else "  未知时长"
+        episodes = f"{entry['episodes']}集{'(估)' if entry.get('estimated') else ''}" if entry else ""
+        print(f"   {i:>3}. {length}  {episodes:<7} {url}")
+    report_queue_eta(estimates)
+    return EXIT_OK
+
+def progress_store_exists():
+    """当前账号是否已经有进度记录（SQLite进度库文件，或JSON快照/事件日志）"""
+    if PROGRESS_BACKEND == "sqlite":
+        return os.path.exists(PROGRESS_DB_PATH)
+    return any(os.path.exists(path) for path in (COMPLETED_VIDEOS_PATH, COMPLETED_JOURNAL_PATH,
+                                                 FAILED_VIDEOS_PATH, FAILED_JOURNAL_PATH))
+
+def open_progress_db_readonly():
+    """
+    只读打开SQLite进度库，供只读子命令使用：不建表、不迁移、不导入JSON，工作进程运行时也不会写入
+    进度库还不存在时返回一个空的内存库，读到的就是没有任何记录
+    """
+    if not os.path.exists(PROGRESS_DB_PATH):
+        conn = sqlite3.connect(":memory:")
+        conn.executescript(PROGRESS_DB_SCHEMA)
+        return conn
+    return sqlite3.connect(Path(PROGRESS_DB_PATH).resolve().as_uri() + "?mode=ro", uri=True)
+
+def read_progress_snapshot():
+    """
+    只读加载链接列表和完成/失败记录，不打印加载信息（status/failed/export/plan 等子命令使用）
+    SQLite后端以只读方式打开进度库（之后 load_episode_progress 等也用这个只读连接），不同步链接列表
+    返回: (链接列表, 已完成视频ID集合, 失败视频字典)
+    """
+    global _progress_db
+    with contextlib.redirect_stdout(None):
+        video_urls = get_video_urls() if os.path.exists(TXT_PATH) else []
+        if PROGRESS_BACKEND == "sqlite":
+            if _progress_db is None:
+                _progress_db = open_progress_db_readonly()
+            completed = {row[0] for row in _progress_db.execute("SELECT video FROM videos WHERE status = 'completed'")}
+        else:
+            completed = read_completed_records()
+        failed = load_failed_videos()
+    return video_urls, completed, failed
+
+def use_account_files(account):
+    """只读子命令切换到另一个账号的进度文件（不打印）"""
+    with contextlib.redirect_stdout(None):
+        configure_account(account)
+
+def progress_status():
+    """
+    汇总当前账号的进度：数量、失败类型、按时长索引估算的剩余时间和记录最近更新时间
+    返回: 可直接输出为JSON的字典
+    """
+    video_urls, completed, failed = read_progress_snapshot()
+    listed = {video_key(url) for url in video_urls}
+    listed_failed = {key: info for key, info in failed.items() if key in listed and key not in completed}
+    pending = [url for url in video_urls if video_key(url) not in completed
+               and (video_key(url) not in failed or retry_due(failed[video_key(url)]))]
+    index = load_duration_index()
+    remaining = estimate_queue_seconds([remaining_seconds(url, index) for url in pending])
+    updated = [os.path.getmtime(path) for path in (COMPLETED_VIDEOS_PATH, COMPLETED_JOURNAL_PATH, FAILED_VIDEOS_PATH,
+                                                   FAILED_JOURNAL_PATH, PROGRESS_DB_PATH, EPISODE_PROGRESS_PATH,
+                                                   EPISODE_JOURNAL_PATH)
+               if os.path.exists(path)]
+    return {
+        "store": progress_store_exists(),
+        "total": len(video_urls),
+        "completed": len(listed & completed),
+        "failed": len(listed_failed),
+        "pending": len(pending),
+        "retry_due": sum(1 for info in listed_failed.values() if retry_due(info)),
+        "parked": sum(1 for info in listed_failed.values() if not info.get("retry_at")),
+        "failure_kinds": dict(collections.Counter(info.get("kind", "unknown") for info in listed_failed.values())),
+        "remaining_hours": round(remaining / 3600, 2) if remaining is not None else None,
+        "updated_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(max(updated))) if updated else None,
+    }
+
+def accounts_for_command(accounts_path, names=None, all_accounts=False):
+    """只读子命令要处理的账号：all_accounts 时为账号列表中的全部账号，否则为 names 指定的账号；都没有时返回 [None]（当前目录）"""
+    if not names and not all_accounts:
+        return [None]
+    accounts = load_accounts(accounts_path)
+    if all_accounts:
+        return accounts
+    by_name = {account["name"]: account for account in accounts}
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        raise ValueError(f"账号列表 {accounts_path} 中没有 {', '.join(missing)}")
+    return [by_name[name] for name in names]
+
+def show_status(accounts_path=None, names=None, all_accounts=False, as_json=False):
+    """
+    status 子命令：不启动浏览器，只读进度记录输出每个账号的进度（--json 便于监控脚本轮询）
+    返回: 退出码
+    """
+    try:
+        accounts = accounts_for_command(accounts_path, names, all_accounts)
+    except (OSError, ValueError) as e:
+        print(f"❌ {str(e)}")
+        return EXIT_ERROR
+    results = []
+    for account in accounts:
+        if account is not None:
+            use_account_files(account)
+        results.append({"account": account["name"] if account else None, **progress_status()})
+    if as_json:
+        print(json.dumps(results if len(accounts) > 1 or all_accounts else results[0], ensure_ascii=False, indent=2))
+        return EXIT_OK
+    for status in results:
+        title = f" ({status['account']})" if status["account"] else ""
+        print(f"📊 视频进度统计{title}:")
+        if not status["store"]:
+            print(f"   📭 还没有进度记录（{PROGRESS_DB_PATH if PROGRESS_BACKEND == 'sqlite' else COMPLETED_VIDEOS_PATH} 不存在）")
+        print(f"   📋 总视频数: {status['total']}")
+        print(f"   ✅ 已完成: {status['completed']}")
+        print(f"   ❌ 已失败: {status['failed']} (到期重试 {status['retry_due']}, 已停放 {status['parked']})")
+        if status["failure_kinds"]:
+            print("   🔁 失败类型: " + ", ".join(f"{kind} {count}" for kind, count in
+                                              sorted(status["failure_kinds"].items(), key=lambda item: -item[1])))
+        print(f"   ⏳ 待处理: {status['pending']}")
+        if status["remaining_hours"] is not None:
+            print(f"   ⏱️  预计剩余: {status['remaining_hours']:.1f} 小时（按时长索引）")
+        print(f"   🕒 记录更新: {status['updated_at'] or '暂无记录'}")
+    return EXIT_OK
+
+def list_failed(kinds=None, limit=50, as_json=False):
+    """
+    failed 子命令：不启动浏览器，列出失败视频（类型、原因、失败次数、重试时间），最近失败的在前
+    返回: 退出码
+    """
+    video_urls, completed, failed = read_progress_snapshot()
+    urls = {video_key(url): url for url in video_urls}
+    rows = [{"video": key, "url": urls.get(key, key), "kind": info.get("kind", "unknown"),
+             "reason": info.get("reason"), "failures": info.get("failures"),
+             "failed_at": info.get("timestamp"), "retry_at": info.get("retry_at")}
+            for key, info in failed.items() if key not in completed and (not kinds or info.get("kind") in kinds)]
+    rows.sort(key=lambda row: parse_timestamp(row["failed_at"]) or 0, reverse=True)
+    if limit:
+        rows = rows[:limit]
+    if as_json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return EXIT_OK
+    if not rows:
+        print("🎉 没有失败的视频")
+        return EXIT_OK
+    print(f"⚠️  失败视频（{len(rows)} 个）:")
+    for row in rows:
+        retry_text = f"{row['retry_at']} 后重试" if row["retry_at"] else "已停放"
+        print(f"   {row['url']} [{row['kind']}: {row['reason'] or '未知原因'}] "
+              f"失败{row['failures']}次 ({row['failed_at']}) {retry_text}")
+    return EXIT_OK
+
+EXPORT_FIELDS = ["video", "url", "status", "kind", "reason", "failures", "failed_at", "retry_at",
+                 "episodes", "episode_duration", "remaining_seconds"]
+
+def export_progress(output="-", fmt="csv"):
+    """
+    export 子命令：不启动浏览器，按链接列表顺序导出每个视频的状态、失败信息和剩余时长（CSV或JSON）
+    output 为 "-" 时写到标准输出
+    返回: 退出码
+    """
+    import csv
+    video_urls, completed, failed = read_progress_snapshot()
+    index = load_duration_index()
+    rows = []
+    for url in video_urls:
+        key = video_key(url)
+        info = failed.get(key) if key not in completed else None
+        entry = index.get(key, {})
+        remaining = 0 if key in completed else remaining_seconds(url, index)
+        rows.append({
+            "video": key, "url": url,
+            "status": "completed" if key in completed else "failed" if info else "pending",
+            "kind": info.get("kind") if info else None, "reason": info.get("reason") if info else None,
+            "failures": info.get("failures") if info else None,
+            "failed_at": info.get("timestamp") if info else None, "retry_at": info.get("retry_at") if info else None,
+            "episodes": entry.get("episodes"), "episode_duration": entry.get("duration"),
+            "remaining_seconds": round(remaining) if remaining is not None else None,
+        })
+    f = sys.stdout if output == "-" else open(output, 'w', encoding='utf-8', newline='')
+    try:
+        if fmt == "json":
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        else:
+            writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    if output != "-":
+        print(f"📤 已导出 {len(rows)} 个视频到 {output}")
+    return EXIT_OK
+
+def main(report=None, lease=None):
+    """
+    登录并按视频链接列表自动播放
+    report: 可选回调 report(event, **info)，多账号工作池用它汇总统计
+    lease: 可选 NodeLease，共享队列模式下视频从协调器逐个租用（不读本地链接列表），结果集中上报
+    返回: 退出码（EXIT_OK / EXIT_ERROR / EXIT_LOGIN_REQUIRED / EXIT_INTERRUPTED）
+    """
+    _metrics["run_started"] = time.time()
+    browser = BrowserSession()
+    try:
+        driver = browser.start()
+    except RuntimeError as e:
+        print(f"❌ 浏览器启动失败: {str(e)}")
+        return EXIT_ERROR
+    _live["browser"] = browser
+    metrics_server = serve_live_metrics() if METRICS_HTTP_PORT else None
 
     try:
         print("🎯 浙江继续教育视频自动播放工具")
         print("=" * 50)
         print("📝 功能说明:")
         print("   ✅ 自动跳过已完成的视频")
-        print("   ⚠️  自动跳过失败的视频")
+        print("   ⚠️  临时故障自动退避重试，硬失败自动跳过")
         print("   🎮 智能检测视频卡住并自动处理")
         print("   🎬 自动播放下一集（支持多集视频）")
         print("   💾 自动保存学习进度")
@@ -603,16 +3553,34 @@ def main():
         # 使用新的自动登录流程
         if not auto_login(driver):
             print("❌ 登录失败，程序退出")
-            return
+            return EXIT_LOGIN_REQUIRED
         
         print("\n🎬 开始处理视频列表...")
-        video_urls = get_video_urls()
+        video_urls = get_video_urls() if lease is None else []
         total_videos = len(video_urls)
         
-        # 过滤掉已完成和失败的视频
-        remaining_videos = [url for url in video_urls if url not in completed_videos and url not in failed_videos]
-        completed_count = len([url for url in video_urls if url in completed_videos])
-        failed_count = len([url for url in video_urls if url in failed_videos])
+        sync_video_queue(video_urls)
+        
+        # 过滤掉已完成和失败的视频（单次遍历同时完成统计）
+        # 到了重试时间的临时失败重新加入队列，硬失败和未到期的跳过
+        remaining_videos = []
+        completed_count = 0
+        failed_count = 0
+        retry_count = 0
+        for url in video_urls:
+            key = video_key(url)
+            if key in completed_videos:
+                completed_count += 1
+            elif key in failed_videos and not retry_due(failed_videos[key]):
+                failed_count += 1
+            else:
+                retry_count += key in failed_videos
+                remaining_videos.append(url)
+        if lease is not None:
+            # 共享队列模式：每次只向协调器租一个视频，处理完再租下一个
+            print(f"🤝 共享队列模式：视频由协调器分配给节点 {lease.node}（账号 {lease.account}）")
+            first_url = next_leased_url(lease, completed_videos)
+            remaining_videos = [first_url] if first_url else []
         
         print(f"📊 视频进度统计:")
         print(f"   📋 总视频数: {total_videos}")
@@ -620,49 +3588,141 @@ def main():
             print(f"   ✅ 已完成: {completed_count} ({completed_count/total_videos*100:.1f}%)")
             print(f"   ❌ 已失败: {failed_count} ({failed_count/total_videos*100:.1f}%)")
             print(f"   ⏳ 待处理: {len(remaining_videos)} ({len(remaining_videos)/total_videos*100:.1f}%)")
+            if retry_count:
+                print(f"   🔁 其中到期重试: {retry_count}")
         else:
             print(f"   ✅ 已完成: {completed_count}")
             print(f"   ❌ 已失败: {failed_count}")
             print(f"   ⏳ 待处理: {len(remaining_videos)}")
         
+        if report:
+            report("run_started", total=total_videos, completed=completed_count,
+                   failed=failed_count, remaining=len(remaining_videos))
+        
         if completed_count > 0 or failed_count > 0:
             print(f"   ⏭️  本次跳过: {completed_count + failed_count} 个视频 (已完成: {completed_count}, 已失败: {failed_count})")
         
         if len(remaining_videos) == 0:
-            if total_videos == 0:
+            if lease is not None:
+                print("🎉 共享队列中该账号没有待处理的视频")
+            elif total_videos == 0:
                 print("❌ 未找到任何视频链接，请检查 zlstudy.txt 文件")
             else:
                 print("🎉 所有视频都已处理完成！")
-            return
+            if report:
+                report("run_done", successful=0, failed=0)
+            return EXIT_OK
+        
+        if lease is None:
+            # 非 file 策略需要先预读时长再排序，file 策略只用已缓存的时长估算完成时间
+            index = build_duration_index(driver, remaining_videos) if SCHEDULE_POLICY != "file" else load_duration_index()
+            remaining_videos, estimates = schedule_videos(remaining_videos, index)
+            report_queue_eta(estimates)
         
         # 在开始处理视频前，再次保存一下cookies（确保是最新的）
+        # 使用持久化用户目录时浏览器自己保存会话，但 crawl 等不启动浏览器的HTTP请求从 cookies.json 读取登录状态，
+        # 所以运行中的检查点照样导出
         save_cookies(driver)
         
         successful_count = 0
         failed_count = 0
+        retry_queue = {}  # 本次运行中失败、稍后可以重试的视频 {视频ID: 链接}
+        
+        # 后台HTTP登录探测，取代每10个视频打开一次/videos页面检查
+        login_probe = LoginProbe()
+        login_probe.update_cookies(driver.get_cookies(), driver.execute_script("return navigator.userAgent"))
+        login_probe.start()
         
         for i, url in enumerate(remaining_videos, 1):
             print(f"\n🎥 正在处理第 {i}/{len(remaining_videos)} 个视频")
             print(f"🔗 URL: {url}")
             
-            # 每隔一段时间检查一下登录状态并更新cookies
-            if i % 10 == 0:  # 每处理10个视频检查一次
-                print("🔄 检查登录状态并更新cookies...")
-                if check_login_status(driver):
-                    save_cookies(driver)
-                else:
-                    print("⚠️  登录状态异常，尝试重新登录...")
-                    if not auto_login(driver):
-                        print("❌ 重新登录失败，程序退出")
-                        return
+            # 只有后台探测明确发现会话失效时才重新登录
+            if login_probe.expired:
+                print(f"⚠️  登录状态异常 ({login_probe.last_detail})，尝试重新登录...")
+                if not auto_login(driver):
+                    print("❌ 重新登录失败，程序退出")
+                    return EXIT_LOGIN_REQUIRED
+                login_probe.update_cookies(driver.get_cookies())
+                login_probe.session_ok = True
+                save_cookies(driver)
+            elif i % 10 == 0:  # 每处理10个视频更新一次cookies
+                save_cookies(driver)
+            
+            key = video_key(url)  # 进度记录以视频ID为键
+            _live.update(video=key, episode=None, episode_label=None, position=None, duration=None)
+            
+            # 取用上一个视频播放时预加载的页面，链接本身有问题时直接记为失败，页面显示已学完时直接记为完成
+            next_url = remaining_videos[i] if PREFETCH_NEXT_VIDEO and i < len(remaining_videos) else None
+            prefetched = False
+            if PREFETCH_NEXT_VIDEO:
+                try:
+                    prefetch_kind, detail = take_prefetched(driver, url)
+                except Exception as e:
+                    prefetch_kind, detail = "fallback", None
+                    print(f"⚠️  检查预加载页面失败: {str(e)}")
+                prefetched = prefetch_kind == "ready"
+                if prefetch_kind == "completed":
+                    add_completed_video(completed_videos, key)
+                    record_attempt(key, time.time(), 0, True, detail)
+                    if lease is not None:
+                        lease.finish(url, True, detail)
+                    successful_count += 1
+                    _live["completed"] += 1
+                    if key in failed_videos:
+                        remove_failed_video(failed_videos, key)
+                    print(f"✅ {detail}，跳过播放 {i}/{len(remaining_videos)}")
+                    if report:
+                        report("video_done", url=url, success=True, reason=detail, browser_rss_mb=None)
+                    retry_url = next_queued_url(failed_videos, retry_queue, lease, completed_videos) \
+                        if i == len(remaining_videos) else None
+                    if retry_url:
+                        remaining_videos.append(retry_url)
+                    continue
+                if prefetch_kind == "failed":
+                    reason = f"预检失败: {detail}"
+                    add_failed_video(failed_videos, key, reason)
+                    record_attempt(key, time.time(), 0, False, reason)
+                    if lease is not None:
+                        lease.finish(url, False, reason)
+                    failed_count += 1
+                    _live["failed"] += 1
+                    if failed_videos[key]["retry_at"]:
+                        retry_queue[key] = url
+                    print(f"❌ 视频失败，已记录到失败列表 {i}/{len(remaining_videos)} - {reason}")
+                    if report:
+                        report("video_done", url=url, success=False, reason=reason, browser_rss_mb=None)
+                    retry_url = next_queued_url(failed_videos, retry_queue, lease, completed_videos) \
+                        if i == len(remaining_videos) else None
+                    if retry_url:
+                        remaining_videos.append(retry_url)
+                    continue
             
-            # 观看视频
-            video_completed, reason = watch_video(driver, url)
+            # 观看视频（浏览器中途崩溃时重启浏览器并重试一次，已看完的集数由断点跳过）
+            attempt_started = time.time()
+            start_video_metrics(driver, url)
+            video_completed, reason = watch_video(driver, url, next_url, prefetched)
+            if not video_completed and not browser.alive():
+                if not browser.recycle("浏览器已无响应"):
+                    print("❌ 重启浏览器后登录失败，程序退出")
+                    return EXIT_LOGIN_REQUIRED
+                driver = browser.driver
+                login_probe.update_cookies(driver.get_cookies())
+                print("🔄 浏览器已重启，重试该视频")
+                video_completed, reason = watch_video(driver, url)
+            record_attempt(key, attempt_started, time.time() - attempt_started, video_completed, reason)
+            if lease is not None:
+                lease.finish(url, video_completed, reason)
+            finish_video_metrics(driver, video_completed, reason)
+            browser.video_finished()
+            # 刷新探测用的cookies快照（一次WebDriver调用，不影响页面）
+            login_probe.update_cookies(driver.get_cookies())
             
             if video_completed:
                 # 视频成功完成，记录到已完成列表
-                add_completed_video(completed_videos, url)
+                add_completed_video(completed_videos, key)
                 successful_count += 1
+                _live["completed"] += 1
                 
                 # 显示播放的集数信息
                 if "共" in reason and "集" in reason:
@@ -671,44 +3731,77 @@ def main():
                     print(f"✅ 成功完成视频 {i}/{len(remaining_videos)}")
                 
                 # 如果这个视频之前在失败列表中，移除它
-                if url in failed_videos:
-                    del failed_videos[url]
-                    save_failed_videos(failed_videos)
+                if key in failed_videos:
+                    remove_failed_video(failed_videos, key)
                     print(f"🔄 已从失败列表中移除该视频")
             else:
                 # 视频失败或卡住，记录到失败列表
-                add_failed_video(failed_videos, url, reason)
+                add_failed_video(failed_videos, key, reason)
                 failed_count += 1
+                _live["failed"] += 1
+                if failed_videos[key]["retry_at"]:
+                    retry_queue[key] = url
                 print(f"❌ 视频失败，已记录到失败列表 {i}/{len(remaining_videos)} - {reason}")
             
-            time.sleep(2)
+            usage = report_browser_resources(driver)
+            if report:
+                report("video_done", url=url, success=video_completed, reason=reason,
+                       browser_rss_mb=usage and usage["rss_mb"])
             
+            # 按播放数量或内存重启浏览器，保持长时间运行的内存平稳
+            recycle_reason = browser.recycle_reason()
+            if usage and usage["rss_mb"] > BROWSER_RECYCLE_RSS_MB and recycle_reason is None:
+                recycle_reason = f"浏览器内存 {usage['rss_mb']:.0f}MB 超过 {BROWSER_RECYCLE_RSS_MB}MB"
+            if recycle_reason and i < len(remaining_videos):
+                if not browser.recycle(recycle_reason):
+                    print("❌ 重启浏览器后登录失败，程序退出")
+                    return EXIT_LOGIN_REQUIRED
+                driver = browser.driver
+                login_probe.update_cookies(driver.get_cookies())
+            
+            # 队列处理完后，共享队列模式下租用下一个视频，然后重试本次失败且很快到期的临时故障视频
+            retry_url = next_queued_url(failed_videos, retry_queue, lease, completed_videos) \
+                if i == len(remaining_videos) else None
+            if retry_url:
+                remaining_videos.append(retry_url)
+            
+        # 将本次运行的事件日志合并进快照文件
+        save_completed_videos(completed_videos)
+        save_failed_videos(failed_videos)
+        
         print(f"\n🎉 视频处理完成！")
         print(f"📊 统计结果：")
         print(f"   ✅ 成功完成: {successful_count} 个")
         print(f"   ❌ 失败跳过: {failed_count} 个")
         print(f"   📋 总已完成: {len(completed_videos)} 个")
         print(f"   ⚠️  总失败记录: {len(failed_videos)} 个")
+        if browser.recycle_count:
+            print(f"   ♻️  浏览器重启: {browser.recycle_count} 次 (内存峰值 {browser.peak_rss_mb:.0f}MB)")
+        report_run_metrics(driver)
         
         # 如果本次有失败的视频，显示详细信息
         if failed_count > 0:
             print(f"\n⚠️  本次失败的视频:")
-            current_failed = [url for url in remaining_videos if url in failed_videos]
+            current_failed = [url for url in dict.fromkeys(remaining_videos) if video_key(url) in failed_videos]
             for i, url in enumerate(current_failed, 1):
                 short_url = url if len(url) <= 50 else url[:47] + "..."
-                reason = failed_videos[url].get("reason", "未知")
-                print(f"   {i}. {short_url} [{reason}]")
+                reason = failed_videos[video_key(url)].get("reason", "未知")
+                print(f"   {i}. {short_url} [{reason}] {describe_retry(failed_videos[video_key(url)])}")
             
             print(f"\n💡 提示：")
-            print(f"   - 失败的视频已记录到 {FAILED_VIDEOS_PATH}")
-            print(f"   - 这些视频在下次运行时会被自动跳过")
-            print(f"   - 如需重新尝试，请手动删除失败记录文件")
+            print(f"   - 失败的视频已记录到 {FAILED_VIDEOS_PATH if PROGRESS_BACKEND != 'sqlite' else PROGRESS_DB_PATH}")
+            print(f"   - 超时、卡住、浏览器异常等临时故障会按退避时间自动重试，最多失败{RETRY_MAX_ATTEMPTS}次")
+            print(f"   - 已停放的视频不再自动重试，可用 python zlstudy.py retry [--kind 类型] 重新加入队列")
         
         print("💾 最终保存登录状态...")
         save_cookies(driver)
+        if report:
+            report("run_done", successful=successful_count, failed=failed_count)
+        return EXIT_OK
         
     except KeyboardInterrupt:
         print("\n⏹️  用户手动停止程序")
+        report_run_metrics(driver)
         print("💾 保存当前登录状态...")
         save_cookies(driver)
         # 确保已完成视频记录被保存
@@ -717,6 +3810,7 @@ def main():
         # 确保失败视频记录被保存
         if 'failed_videos' in locals():
             save_failed_videos(failed_videos)
+        return EXIT_INTERRUPTED
     except Exception as e:
         print(f"❌ 主程序出错：{str(e)}")
         print("💾 尝试保存登录状态...")
@@ -727,10 +3821,810 @@ def main():
         # 确保失败视频记录被保存
         if 'failed_videos' in locals():
             save_failed_videos(failed_videos)
+        return EXIT_ERROR
     finally:
-        driver.quit()
+        if 'login_probe' in locals():
+            login_probe.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+        browser.stop()
         print("🏁 程序结束")
 
 
+def load_accounts(accounts_path=None):
+    """读取账号列表文件，返回 [{"name": ..., "dir": ...}, ...]"""
+    accounts_path = accounts_path or ACCOUNTS_PATH
+    with open(accounts_path, 'r', encoding='utf-8') as f:
+        accounts = json.load(f)
+    
+    seen_names = set()
+    for account in accounts:
+        name = account.get("name")
+        if not name:
+            raise ValueError(f"{accounts_path} 中存在没有 name 的账号")
+        if name in seen_names:
+            raise ValueError(f"{accounts_path} 中账号名重复: {name}")
+        seen_names.add(name)
+        account.setdefault("dir", os.path.join(ACCOUNTS_DIR, name))
+    return accounts
+
+def configure_account(account):
+    """
+    把所有按账号区分的路径（链接列表、Cookie、进度记录、Chrome用户目录）指向该账号的目录，
+    并关闭上一个账号的进度库连接、清空单集断点缓存（node 模式在同一进程里依次处理多个账号）
+    """
+    global _progress_db, _episode_progress
+    if _progress_db is not None:
+        _progress_db.close()
+    _progress_db = _episode_progress = None
+    account_dir = account.get("dir") or os.path.join(ACCOUNTS_DIR, account["name"])
+    if not _read_only_files:
+        os.makedirs(account_dir, exist_ok=True)
+    for setting, filename in ACCOUNT_FILE_SETTINGS.items():
+        globals()[setting] = os.path.join(account_dir, filename)
+    _live["account"] = account["name"]
+    print(f"👤 当前账号: {account['name']} ({account_dir})")
+    return account_dir
+
+def run_account_worker(account, stats_queue, cpu_set=None, metrics_port=None, login_probe_path=None):
+    """工作进程入口：一个进程对应一个账号、一个Chrome，统计通过队列发回监督进程"""
+    global INTERACTIVE_LOGIN, BROWSER_PROFILE, METRICS_HTTP_PORT, LOGIN_PROBE_PATH
+    INTERACTIVE_LOGIN = False
+    BROWSER_PROFILE = POOL_BROWSER_PROFILE
+    METRICS_HTTP_PORT = metrics_port  # spawn出的子进程不继承监督进程修改过的全局设置
+    LOGIN_PROBE_PATH = login_probe_path or LOGIN_PROBE_PATH
+    
+    # 各账号的输出写到自己的日志文件，避免多个进程在同一终端里交错
+    account_dir = account.get("dir") or os.path.join(ACCOUNTS_DIR, account["name"])
+    os.makedirs(account_dir, exist_ok=True)
+    log_file = open(os.path.join(account_dir, WORKER_LOG_NAME), 'a', encoding='utf-8', buffering=1)
+    sys.stdout = sys.stderr = log_file
+    print(f"\n===== 工作进程启动 {now_timestamp()} (pid={os.getpid()}) =====")
+    configure_account(account)
+    
+    # 绑定的CPU核会被chromedriver/Chrome子进程继承
+    if cpu_set and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpu_set)
+    
+    def report(event, **info):
+        info.update(account=account["name"], event=event)
+        stats_queue.put(info)
+    
+    sys.exit(main(report=report))
+
+def run_worker_pool(accounts_path=None, max_workers=None):
+    """
+    多账号工作池监督进程：每个账号一个工作进程，异常退出自动重启，
+    超出内存上限时连同Chrome进程树一起重启，并汇总各账号统计
+    """
+    import multiprocessing
+    import queue
+    
+    accounts = load_accounts(accounts_path)
+    max_workers = max_workers or POOL_MAX_WORKERS
+    if not accounts:
+        print("❌ 账号列表为空")
+        return EXIT_ERROR
+    
+    # spawn方式在各平台行为一致，子进程不会继承监督进程的状态
+    context = multiprocessing.get_context("spawn")
+    stats_queue = context.Queue()
+    
+    # 为每个并发槽位分配互不重叠的CPU核
+    cpu_slots = [None] * max_workers
+    if WORKER_PIN_CPUS and hasattr(os, 'sched_getaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+        per_worker = max(1, len(cpus) // max_workers)
+        cpu_slots = [set(cpus[i * per_worker:(i + 1) * per_worker]) or None for i in range(max_workers)]
+    
+    stats = {
+        account["name"]: {
+            "status": "等待", "completed": 0, "failed": 0, "remaining": None,
+            "restarts": 0, "crashes": 0, "rss_mb": 0.0, "cpu_percent": 0.0,
+        } for account in accounts
+    }
+    pending = list(accounts)  # 等待启动（或等待重启）的账号
+    not_before = {}  # 账号 -> 最早可重启时间
+    running = {}  # 账号名 -> {"process", "account", "slot", "cpu_seconds", "sampled_at", "rss_killed"}
+    free_slots = list(range(max_workers))
+    last_report = time.time()
+    
+    print(f"🏭 多账号工作池启动：{len(accounts)} 个账号，最多同时运行 {max_workers} 个")
+    
+    def handle_message(message):
+        account_stats = stats.get(message.get("account"))
+        if account_stats is None:
+            return
+        event = message.get("event")
+        if event == "run_started":
+            account_stats["remaining"] = message.get("remaining")
+        elif event == "video_done":
+            account_stats["completed" if message.get("success") else "failed"] += 1
+            account_stats["crashes"] = 0  # 工作进程还在正常推进，之前的异常退出不再累计
+            if account_stats["remaining"]:
+                account_stats["remaining"] -= 1
+    
+    def print_summary(title):
+        print(f"\n📊 {title} ({now_timestamp()})")
+        for name, account_stats in stats.items():
+            remaining = account_stats["remaining"]
+            print(f"   {name}: {account_stats['status']} | ✅ {account_stats['completed']} "
+                  f"❌ {account_stats['failed']} ⏳ {'-' if remaining is None else remaining} "
+                  f"| 重启 {account_stats['restarts']} | {account_stats['rss_mb']:.0f}MB "
+                  f"{account_stats['cpu_percent']:.0f}%CPU")
+        print(f"   合计: ✅ {sum(a['completed'] for a in stats.values())} "
+              f"❌ {sum(a['failed'] for a in stats.values())}")
+    
+    try:
+        while pending or running:
+            # 启动等待中的账号
+            now = time.time()
+            for account in list(pending):
+                if not free_slots:
+                    break
+                if not_before.get(account["name"], 0) > now:
+                    continue
+                slot = free_slots.pop(0)
+                process = context.Process(
+                    target=run_account_worker,
+                    args=(account, stats_queue, cpu_slots[slot], METRICS_HTTP_PORT and METRICS_HTTP_PORT + slot,
+                          LOGIN_PROBE_PATH),
+                    name=f"zlstudy-{account['name']}")
+                process.start()
+                pending.remove(account)
+                running[account["name"]] = {
+                    "process": process, "account": account, "slot": slot,
+                    "cpu_seconds": 0.0, "sampled_at": time.time(), "rss_killed": False,
+                }
+                stats[account["name"]]["status"] = "运行中"
+                print(f"▶️  已启动账号 {account['name']} (pid={process.pid})")
+            
+            # 收集统计消息，同时作为监控间隔的等待
+            deadline = time.time() + POOL_MONITOR_INTERVAL
+            while True:
+                try:
+                    handle_message(stats_queue.get(timeout=max(0.1, deadline - time.time())))
+                except queue.Empty:
+                    break
+                if time.time() >= deadline:
+                    break
+            
+            # 检查各工作进程：退出码、内存和CPU
+            for name, worker in list(running.items()):
+                process = worker["process"]
+                account_stats = stats[name]
+                if not process.is_alive():
+                    process.join()
+                    del running[name]
+                    free_slots.append(worker["slot"])
+                    exit_code = process.exitcode
+                    if exit_code == EXIT_OK:
+                        account_stats["status"] = "已完成"
+                        print(f"🎉 账号 {name} 的视频已全部处理")
+                    elif exit_code == EXIT_LOGIN_REQUIRED:
+                        account_stats["status"] = "需要登录"
+                        print(f"🔐 账号 {name} 需要手动登录：python zlstudy.py run --account {name}")
+                    elif worker["rss_killed"]:
+                        # 监督进程主动结束的，不算异常退出，立即重启
+                        account_stats["restarts"] += 1
+                        account_stats["status"] = "等待重启"
+                        pending.append(worker["account"])
+                        print(f"♻️  账号 {name} 因内存超限已结束，立即重启")
+                    elif account_stats["crashes"] < WORKER_MAX_RESTARTS:
+                        account_stats["crashes"] += 1
+                        account_stats["restarts"] += 1
+                        delay = WORKER_RESTART_DELAY * account_stats["crashes"]
+                        account_stats["status"] = "等待重启"
+                        not_before[name] = time.time() + delay
+                        pending.append(worker["account"])
+                        print(f"🔄 账号 {name} 异常退出 (code={exit_code})，{delay} 秒后第 "
+                              f"{account_stats['crashes']}/{WORKER_MAX_RESTARTS} 次重启")
+                    else:
+                        account_stats["status"] = "已放弃"
+                        print(f"❌ 账号 {name} 重启次数已达上限，不再重启")
+                    continue
+                
+                rss, cpu_seconds = get_process_usage(get_process_tree(process.pid))
+                sampled_at = time.time()
+                cpu_percent = (cpu_seconds - worker["cpu_seconds"]) / max(sampled_at - worker["sampled_at"], 0.001) * 100
+                worker["cpu_seconds"], worker["sampled_at"] = cpu_seconds, sampled_at
+                account_stats["rss_mb"] = rss / 1024 / 1024
+                account_stats["cpu_percent"] = cpu_percent
+                if cpu_percent > WORKER_CPU_LIMIT_PERCENT:
+                    print(f"⚠️  账号 {name} CPU占用 {cpu_percent:.0f}% 超过 {WORKER_CPU_LIMIT_PERCENT}%")
+                if account_stats["rss_mb"] > WORKER_RSS_LIMIT_MB and not worker["rss_killed"]:
+                    # 进度都已落盘，直接结束整个进程树，由上面的退出处理立即重启（不计入重启上限）
+                    print(f"⚠️  账号 {name} 内存 {account_stats['rss_mb']:.0f}MB 超过 "
+                          f"{WORKER_RSS_LIMIT_MB}MB，重启工作进程")
+                    worker["rss_killed"] = True
+                    kill_process_tree(process.pid)
+            
+            if time.time() - last_report >= POOL_REPORT_INTERVAL:
+                print_summary("工作池统计")
+                last_report = time.time()
+    except KeyboardInterrupt:
+        print("\n⏹️  用户手动停止工作池，正在结束所有工作进程...")
+        for worker in running.values():
+            worker["process"].join(timeout=30)
+            if worker["process"].is_alive():
+                kill_process_tree(worker["process"].pid)
+        return EXIT_INTERRUPTED
+    finally:
+        while True:
+            try:
+                handle_message(stats_queue.get_nowait())
+            except queue.Empty:
+                break
+        print_summary("工作池最终统计")
+    
+    if any(account_stats["status"] != "已完成" for account_stats in stats.values()):
+        return EXIT_ERROR
+    return EXIT_OK
+
+COORDINATOR_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    name TEXT PRIMARY KEY,
+    holder TEXT,                            -- 持有账号租约的节点，同一账号同时只交给一个节点
+    lease_expires REAL,                     -- 租约到期时间戳，过期后其他节点可以接手
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS work (
+    account TEXT NOT NULL,
+    video TEXT NOT NULL,                    -- 视频ID（见 video_key）
+    url TEXT NOT NULL,
+    list_order INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending', -- pending / leased / completed / failed
+    holder TEXT,                            -- 持有视频租约的节点
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    reason TEXT,
+    failure_kind TEXT,                      -- 失败类型（见 FAILURE_KINDS）
+    failures INTEGER NOT NULL DEFAULT 0,    -- 连续失败次数，完成或手动放行后清零
+    retry_at TEXT,                          -- 临时故障退回 pending 后最早可以再租出的时间
+    updated_at TEXT,
+    PRIMARY KEY (account, video)
+);
+CREATE INDEX IF NOT EXISTS idx_work_queue ON work(account, status, list_order);
+"""
+
+# 可以通过HTTP协调服务调用的 LeaseCoordinator 方法
+COORDINATOR_RPC_METHODS = ("add_videos", "claim_account", "lease_video", "heartbeat", "complete",
+                           "release_account", "retry_failed", "status")
+
+class LeaseCoordinator:
+    """
+    共享工作队列：把(账号, 视频)以带到期时间的租约分给各节点
+    节点靠心跳续租，失联节点的租约过期后账号和视频会交给其他节点；完成/失败结果集中记录
+    所有状态在一个SQLite文件里，多个进程可以同时打开
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or COORDINATOR_PATH
+        self.conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(COORDINATOR_DB_SCHEMA)
+        # 给旧版队列补上失败重试字段
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(work)")}
+        for column, definition in (("failure_kind", "TEXT"), ("failures", "INTEGER NOT NULL DEFAULT 0"),
+                                   ("retry_at", "TEXT")):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE work ADD COLUMN {column} {definition}")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """写事务：BEGIN IMMEDIATE 先拿写锁，两个节点不会领到同一份租约"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def add_videos(self, account, urls):
+        """把账号的视频链接列表加入队列（已有的只更新顺序和链接），返回新增数量"""
+        timestamp = now_timestamp()
+        with self._transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO accounts (name, updated_at) VALUES (?, ?)", (account, timestamp))
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO work (account, video, url, list_order, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(account, video_key(url), url, order, timestamp) for order, url in enumerate(urls)])
+            added = conn.total_changes - before
+            conn.executemany(
+                "UPDATE work SET url = ?, list_order = ? WHERE account = ? AND video = ?",
+                [(url, order, account, video_key(url)) for order, url in enumerate(urls)])
+        return added
+
+    def claim_account(self, node, accounts=None, lease_seconds=None):
+        """
+        为节点领取一个还有待处理视频、且没有被其他节点持有（或租约已过期）的账号
+        accounts: 节点本地配置了的账号名列表，None表示不限
+        返回: 账号名，没有可领取的返回None
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            for name, holder, lease_expires in conn.execute(
+                    "SELECT name, holder, lease_expires FROM accounts ORDER BY name").fetchall():
+                if accounts is not None and name not in accounts:
+                    continue
+                if holder not in (None, node) and (lease_expires or 0) > now:
+                    continue
+                if conn.execute("SELECT 1 FROM work WHERE account = ? AND "
+                                "((status = 'pending' AND (retry_at IS NULL OR retry_at <= ?)) OR "
+                                "(status = 'leased' AND (holder = ? OR lease_expires < ?))) LIMIT 1",
+                                (name, now_timestamp(), node, now)).fetchone() is None:
+                    continue
+                if holder not in (None, node):
+                    print(f"♻️  节点 {holder} 的账号 {name} 租约已过期，交给节点 {node}")
+                conn.execute("UPDATE accounts SET holder = ?, lease_expires = ?, updated_at = ? WHERE name = ?",
+                             (node, now + (lease_seconds or COORDINATOR_LEASE_SECONDS), now_timestamp(), name))
+                return name
+        return None
+
+    def lease_video(self, node, account, lease_seconds=None):
+        """
+        从节点持有的账号中租出下一个视频：优先交回该节点自己之前未完成的租约，
+        然后回收已过期的租约，再按列表顺序取待处理视频（退避中的临时失败到了重试时间才会租出）
+        返回: {"video", "url"}，账号不归该节点或没有视频时返回None
+        """
+        now = time.time()
+        expires = now + (lease_seconds or COORDINATOR_LEASE_SECONDS)
+        with self._transaction() as conn:
+            row = conn.execute("SELECT holder, lease_expires FROM accounts WHERE name = ?", (account,)).fetchone()
+            if row is None or row[0] != node:
+                return None
+            conn.execute("UPDATE work SET status = 'pending', holder = NULL WHERE account = ? AND status = 'leased' "
+                         "AND holder != ? AND lease_expires < ?", (account, node, now))
+            row = conn.execute(
+                "SELECT video, url FROM work WHERE account = ? AND "
+                "((status = 'pending' AND (retry_at IS NULL OR retry_at <= ?)) OR (status = 'leased' AND holder = ?)) "
+                "ORDER BY status = 'pending', list_order LIMIT 1", (account, now_timestamp(), node)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE work SET status = 'leased', holder = ?, lease_expires = ?, attempts = attempts + 1, "
+                         "updated_at = ? WHERE account = ? AND video = ?",
+                         (node, expires, now_timestamp(), account, row[0]))
+            conn.execute("UPDATE accounts SET lease_expires = ? WHERE name = ?", (expires, account))
+        return {"video": row[0], "url": row[1]}
+
+    def heartbeat(self, node, account, lease_seconds=None):
+        """续租节点持有的账号和视频，返回账号是否仍归该节点（False时节点应停止处理该账号）"""
+        expires = time.time() + (lease_seconds or COORDINATOR_LEASE_SECONDS)
+        with self._transaction() as conn:
+            held = conn.execute("UPDATE accounts SET lease_expires = ? WHERE name = ? AND holder = ?",
+                                (expires, account, node)).rowcount
+            conn.execute("UPDATE work SET lease_expires = ? WHERE account = ? AND holder = ? AND status = 'leased'",
+                         (expires, account, node))
+        return bool(held)
+
+    def complete(self, node, account, video, success, reason=""):
+        """
+        集中记录视频结果（完成记录不会被之后的失败覆盖），释放视频租约
+        失败按原因分类：临时故障按失败次数退避后退回 pending，硬失败和次数用完的记为 failed（停放）
+        """
+        with self._transaction() as conn:
+            if success:
+                conn.execute(
+                    "UPDATE work SET status = 'completed', reason = ?, failure_kind = NULL, failures = 0, "
+                    "retry_at = NULL, holder = NULL, lease_expires = NULL, updated_at = ? "
+                    "WHERE account = ? AND video = ? AND status != 'completed'",
+                    (reason, now_timestamp(), account, video))
+                return True
+            row = conn.execute("SELECT failures FROM work WHERE account = ? AND video = ? AND status != 'completed'",
+                               (account, video)).fetchone()
+            if row is None:
+                return True
+            kind, transient = classify_failure(reason)
+            failures = (row[0] or 0) + 1
+            retry_at = schedule_retry(transient, failures)
+            conn.execute(
+                "UPDATE work SET status = ?, reason = ?, failure_kind = ?, failures = ?, retry_at = ?, "
+                "holder = NULL, lease_expires = NULL, updated_at = ? WHERE account = ? AND video = ?",
+                ("pending" if retry_at else "failed", reason, kind, failures, retry_at, now_timestamp(),
+                 account, video))
+        return True
+
+    def retry_failed(self, account=None, kinds=None):
+        """
+        把停放的失败视频（以及退避中的临时失败）放回待处理，立即可以再租出，失败次数清零
+        account: 只处理该账号，None表示全部；kinds: 只处理这些失败类型，None表示全部
+        返回: 放行数量
+        """
+        conditions = ["(status = 'failed' OR (status = 'pending' AND retry_at IS NOT NULL))"]
+        params = []
+        if account:
+            conditions.append("account = ?")
+            params.append(account)
+        if kinds:
+            conditions.append(f"COALESCE(failure_kind, 'unknown') IN ({', '.join('?' * len(kinds))})")
+            params.extend(kinds)
+        with self._transaction() as conn:
+            released = conn.execute(
+                "UPDATE work SET status = 'pending', failures = 0, retry_at = NULL, updated_at = ? WHERE "
+                + " AND ".join(conditions), [now_timestamp()] + params).rowcount
+        return released
+
+    def release_account(self, node, account):
+        """节点正常退出时交还账号，未完成的视频租约退回待处理"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE work SET status = 'pending', holder = NULL, lease_expires = NULL "
+                         "WHERE account = ? AND holder = ? AND status = 'leased'", (account, node))
+            conn.execute("UPDATE accounts SET holder = NULL, lease_expires = NULL, updated_at = ? "
+                         "WHERE name = ? AND holder = ?", (now_timestamp(), account, node))
+        return True
+
+    def status(self):
+        """
+        各账号的队列统计：{账号: {"holder", "lease_expires", "pending", "waiting", "next_retry_at",
+        "leased", "completed", "failed"}}，waiting 为退避中、还没到重试时间的临时失败
+        """
+        summary = {}
+        for name, holder, lease_expires in self.conn.execute(
+                "SELECT name, holder, lease_expires FROM accounts ORDER BY name"):
+            summary[name] = {"holder": holder, "lease_expires": lease_expires, "pending": 0, "waiting": 0,
+                             "next_retry_at": None, "leased": 0, "completed": 0, "failed": 0}
+        for account, status, count in self.conn.execute(
+                "SELECT account, CASE WHEN status = 'pending' AND retry_at > ? THEN 'waiting' ELSE status END, "
+                "COUNT(*) FROM work GROUP BY 1, 2", (now_timestamp(),)):
+            summary[account][status] = count
+        for account, next_retry_at in self.conn.execute(
+                "SELECT account, MIN(retry_at) FROM work WHERE status = 'pending' AND retry_at > ? GROUP BY account",
+                (now_timestamp(),)):
+            summary[account]["next_retry_at"] = next_retry_at
+        return summary
+
+class CoordinatorClient:
+    """协调服务的HTTP客户端，方法与 LeaseCoordinator 相同"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def __getattr__(self, method):
+        if method not in COORDINATOR_RPC_METHODS:
+            raise AttributeError(method)
+        return functools.partial(self._call, method)
+
+    def _call(self, method, *args, **params):
+        request = urllib.request.Request(
+            f"{self.base_url}/rpc/{method}", data=json.dumps({"args": args, "params": params}).encode("utf-8"),
+            headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=COORDINATOR_HTTP_TIMEOUT) as response:
+            return json.loads(response.read().decode("utf-8"))["result"]
+
+def connect_coordinator(target=None):
+    """按地址打开协调器：http(s)://开头的连协调服务，否则直接打开SQLite文件"""
+    target = target or COORDINATOR_PATH
+    if target.startswith(("http://", "https://")):
+        return CoordinatorClient(target)
+    return LeaseCoordinator(target)
+
+def serve_coordinator(db_path=None, host="127.0.0.1", port=None):
+    """运行协调服务：POST /rpc/<方法>，请求体 {"args": [...], "params": {...}}，返回 {"result": ...}"""
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    coordinator = LeaseCoordinator(db_path)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            method = self.path.rsplit("/", 1)[-1]
+            if not self.path.startswith("/rpc/") or method not in COORDINATOR_RPC_METHODS:
+                self.send_json(404, {"error": f"未知方法: {self.path}"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                result = getattr(coordinator, method)(*body.get("args", []), **body.get("params", {}))
+            except Exception as e:
+                self.send_json(500, {"error": str(e)})
+                return
+            self.send_json(200, {"result": result})
+
+        def send_json(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    # 单线程处理请求：每个请求只是一个很短的SQLite事务，串行处理也不需要给连接加锁
+    server = HTTPServer((host, port if port is not None else COORDINATOR_PORT), Handler)
+    print(f"🤝 协调服务已启动: http://{host}:{server.server_port} ({coordinator.db_path})")
+    return server
+
+class NodeLease:
+    """
+    共享队列模式下 main() 的视频来源：从协调器逐个租用视频，
+    后台线程定期续租，结果集中上报
+    """
+
+    def __init__(self, coordinator, node, account, interval=None):
+        self.coordinator = coordinator
+        self.node = node
+        self.account = account
+        self.interval = COORDINATOR_HEARTBEAT_INTERVAL if interval is None else interval
+        self.lost = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def next_url(self):
+        """租用下一个视频，账号租约已丢失或没有视频时返回None"""
+        if self.lost:
+            return None
+        lease = self.coordinator.lease_video(self.node, self.account)
+        return lease and lease["url"]
+
+    def finish(self, url, success, reason=""):
+        try:
+            self.coordinator.complete(self.node, self.account, video_key(url), success, reason)
+        except Exception as e:
+            # 上报失败时租约会自然过期，视频之后会被重新分配
+            print(f"⚠️  向协调器上报结果失败: {str(e)}")
+
+    def start(self):
+        if self.interval and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="zlstudy-lease-heartbeat", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                if not self.coordinator.heartbeat(self.node, self.account):
+                    print(f"⚠️  账号 {self.account} 的租约已被其他节点接手，处理完当前视频后停止")
+                    self.lost = True
+                    return
+            except Exception as e:
+                print(f"⚠️  续租失败: {str(e)}")
+
+def next_leased_url(lease, completed_videos):
+    """从协调器租用下一个视频，本地记录已经完成的直接上报完成"""
+    while True:
+        url = lease.next_url()
+        if url is None or video_key(url) not in completed_videos:
+            return url
+        lease.finish(url, True, "本地记录已完成")
+
+def load_coordinator_queue(target=None, accounts_path=None):
+    """把账号列表中每个账号的视频链接列表加入共享队列"""
+    coordinator = connect_coordinator(target)
+    for account in load_accounts(accounts_path):
+        configure_account(account)
+        if not os.path.exists(TXT_PATH):
+            print(f"⚠️  账号 {account['name']} 没有视频链接列表 {TXT_PATH}")
+            continue
+        added = coordinator.add_videos(account["name"], get_video_urls())
+        print(f"📥 账号 {account['name']}: 新增 {added} 个视频到共享队列")
+    print_coordinator_status(coordinator)
+    return EXIT_OK
+
+def print_coordinator_status(coordinator):
+    """打印共享队列各账号的进度和租约持有者"""
+    print(f"\n🤝 共享队列状态 ({now_timestamp()})")
+    for name, info in coordinator.status().items():
+        holder = info["holder"] if info["holder"] and (info["lease_expires"] or 0) > time.time() else "-"
+        waiting = f" 🔁 {info['waiting']} (最早 {info['next_retry_at']})" if info.get("waiting") else ""
+        print(f"   {name}: ⏳ {info['pending']}{waiting} 🔒 {info['leased']} ✅ {info['completed']} ❌ {info['failed']} "
+              f"| 节点 {holder}")
+
+def run_node(target=None, accounts_path=None, node=None):
+    """
+    节点模式：反复从协调器领取账号，用本机该账号的目录和登录状态播放租到的视频，
+    直到共享队列里没有本机能处理的视频
+    """
+    coordinator = connect_coordinator(target)
+    node = node or f"{socket.gethostname()}-{os.getpid()}"
+    accounts = {account["name"]: account for account in load_accounts(accounts_path)}
+    skipped = set()  # 本次运行中需要手动登录的账号，不再领取
+    exit_code = EXIT_OK
+    print(f"🤝 节点 {node} 已连接协调器 {target or COORDINATOR_PATH}")
+    while True:
+        account = coordinator.claim_account(node, [name for name in accounts if name not in skipped])
+        if account is None:
+            # 其他节点持有的账号可能在租约过期后交给本节点
+            # 退避中的临时失败只在 RETRY_MAX_WAIT_IN_RUN 内到期时才等待，否则留给之后的运行
+            retry_deadline = time.time() + RETRY_MAX_WAIT_IN_RUN
+            waiting = sum(info["pending"] + info["leased"]
+                          + (info.get("waiting", 0) if (parse_timestamp(info.get("next_retry_at")) or 0) <= retry_deadline
+                             else 0)
+                          for name, info in coordinator.status().items() if name in accounts and name not in skipped)
+            if not waiting:
+                break
+            print(f"⏳ 暂无可领取的账号（{waiting} 个视频由其他节点处理中），{COORDINATOR_IDLE_WAIT} 秒后再试")
+            time.sleep(COORDINATOR_IDLE_WAIT)
+            continue
+        print(f"📋 节点 {node} 领取账号 {account}")
+        configure_account(accounts[account])
+        lease = NodeLease(coordinator, node, account)
+        lease.start()
+        try:
+            result = main(lease=lease)
+        finally:
+            lease.stop()
+            coordinator.release_account(node, account)
+        if result == EXIT_INTERRUPTED:
+            return result
+        if result != EXIT_OK:
+            skipped.add(account)
+            exit_code = result
+    print_coordinator_status(coordinator)
+    return exit_code
+
+def run_report_command(args):
+    """执行只读子命令 status/failed/export（不启动浏览器、不导入selenium，不改动进度文件）"""
+    global _read_only_files
+    _read_only_files = True
+    if args.command == "status":
+        return show_status(args.accounts, args.account, args.all_accounts, args.json)
+    if args.account:
+        try:
+            use_account_files(accounts_for_command(args.accounts, [args.account])[0])
+        except (OSError, ValueError) as e:
+            print(f"❌ {str(e)}")
+            return EXIT_ERROR
+    if args.command == "failed":
+        return list_failed(args.kind, args.limit, args.json)
+    return export_progress(args.output, args.format)
+
+def cli(argv=None):
+    """
+    命令行入口：默认运行播放流程，只有 run/plan/crawl/pool/node 会启动浏览器；
+    status/failed/export 子命令只读进度记录（不导入selenium），query 子命令查询进度库，retry 子命令放行失败记录，
+    pool 子命令运行多账号工作池，coord/node 子命令运行多台机器共享的工作队列，plan 子命令预读时长并给出播放顺序
+    """
+    global BROWSER_PROFILE, ALLOW_DRIVER_DOWNLOAD, CHROME_USER_DATA_DIR, NETWORK_CAPTURE, BANDWIDTH_SAVER
+    global SCHEDULE_POLICY, SCHEDULE_DEADLINE, SCHEDULE_TARGET, METRICS_HTTP_PORT, LOGIN_PROBE_PATH
+    import argparse
+    parser = argparse.ArgumentParser(description="浙江继续教育视频自动播放工具")
+    subparsers = parser.add_subparsers(dest="command")
+    run_parser = subparsers.add_parser("run", help="登录并按视频链接列表自动播放（默认）")
+    run_parser.add_argument("--account", help="使用账号列表中该账号的目录（首次可用来手动登录）")
+    run_parser.add_argument("--accounts", default=ACCOUNTS_PATH, help="账号列表文件")
+    run_parser.add_argument("--profile", choices=["default", "lean"], help="浏览器配置（默认取 BROWSER_PROFILE）")
+    run_parser.add_argument("--user-data-dir", help="使用持久化Chrome用户目录保存登录状态（如 ./chrome_profile）")
+    run_parser.add_argument("--capture-network", action="store_true",
+                            help="抓取网络事件，按视频统计首字节、媒体吞吐量、缓冲和失败请求")
+    run_parser.add_argument("--bandwidth-saver", action="store_true",
+                            help="省流量模式：最低清晰度、拦截图片/字体/统计脚本，并报告每个视频的传输字节数")
+    run_parser.add_argument("--allow-driver-download", action="store_true",
+                            help="本地没有匹配的chromedriver时允许联网下载")
+    plan_parser = subparsers.add_parser("plan", help="预读待处理视频的时长，按调度策略给出播放顺序和预计完成时间")
+    plan_parser.add_argument("--account", help="使用账号列表中该账号的目录和登录状态")
+    plan_parser.add_argument("--accounts", default=ACCOUNTS_PATH, help="账号列表文件")
+    plan_parser.add_argument("--cached-only", action="store_true", help="只使用已缓存的时长，不启动浏览器")
+    plan_parser.add_argument("--limit", type=int, default=20, help="最多列出的视频数量")
+    for schedule_parser in (run_parser, plan_parser):
+        schedule_parser.add_argument("--policy", choices=["file", "shortest", "deadline"],
+                                     help="播放顺序（默认取 SCHEDULE_POLICY）")
+        schedule_parser.add_argument("--deadline", help="deadline 策略的截止时间，如 \"2026-12-31 18:00\"")
+        schedule_parser.add_argument("--target", type=int, help="deadline 策略的目标完成数量")
+    status_parser = subparsers.add_parser("status", help="不启动浏览器，输出进度统计（可一次查看多个账号）")
+    status_parser.add_argument("--account", action="append", help="账号列表中的账号（可重复），默认当前目录的记录")
+    status_parser.add_argument("--all-accounts", action="store_true", help="账号列表中的全部账号")
+    status_parser.add_argument("--accounts", default=ACCOUNTS_PATH, help="账号列表文件")
+    status_parser.add_argument("--json", action="store_true", help="输出JSON（便于监控脚本轮询）")
+    failed_parser = subparsers.add_parser("failed", help="不启动浏览器，列出失败视频和重试时间")
+    failed_parser.add_argument("--kind", action="append", choices=[kind for kind, _, _ in FAILURE_KINDS] + ["unknown"],
+                               help="只列出这些失败类型（可重复），默认全部")
+    failed_parser.add_argument("--limit", type=int, default=50, help="最多列出的数量（0表示全部）")
+    failed_parser.add_argument("--json", action="store_true", help="输出JSON")
+    export_parser = subparsers.add_parser("export", help="不启动浏览器，导出每个视频的状态、失败信息和剩余时长")
+    export_parser.add_argument("--format", choices=["csv", "json"], default="csv", help="导出格式")
+    export_parser.add_argument("--output", default="-", help="输出文件，默认标准输出")
+    for record_parser in (failed_parser, export_parser):
+        record_parser.add_argument("--account", help="使用账号列表中该账号的进度记录")
+        record_parser.add_argument("--accounts", default=ACCOUNTS_PATH, help="账号列表文件")
+    query_parser = subparsers.add_parser("query", help="查询SQLite进度库：剩余数量、预计耗时、失败原因")
+    query_parser.add_argument("--failed-limit", type=int, default=20, help="最多列出的失败视频数量")
+    retry_parser = subparsers.add_parser("retry", help="把失败记录放回待处理队列，下次运行重新播放")
+    retry_parser.add_argument("--kind", action="append", choices=[kind for kind, _, _ in FAILURE_KINDS] + ["unknown"],
+                              help="只放行这些失败类型（可重复），默认全部")
+    retry_parser.add_argument("--account", help="使用账号列表中该账号的进度记录")
+    retry_parser.add_argument("--accounts", default=ACCOUNTS_PATH, help="账号列表文件")
+    crawl_parser = subparsers.add_parser("crawl", help="抓取课程列表页，增量更新课程目录并把新视频加入链接列表")
+    crawl_parser.add_argument("--account", help="使用账号列表中该账号的目录和登录状态")
+    crawl_parser.add_argument("--accounts", default=ACCOUNTS_PATH, help="账号列表文件")
+    crawl_parser.add_argument("--max-pages", type=int, default=None, help="最多抓取的列表页数")
+    pool_parser = subparsers.add_parser("pool", help="多账号工作池：每个账号一个Chrome进程")
+    pool_parser.add_argument("--accounts", default=ACCOUNTS_PATH, help="账号列表文件")
+    pool_parser.add_argument("--max-workers", type=int, default=None, help="同时运行的工作进程数")
+    coord_parser = subparsers.add_parser(
+        "coord", help="多台机器共享的工作队列：serve 运行协调服务，load 导入各账号视频，status 查看，retry 放行失败视频")
+    coord_parser.add_argument("action", choices=["serve", "load", "status", "retry"])
+    coord_parser.add_argument("--coordinator", default=COORDINATOR_PATH,
+                              help="SQLite文件或协调服务地址 http://host:port（serve 时为数据库文件）")
+    coord_parser.add_argument("--accounts", default=ACCOUNTS_PATH, help="账号列表文件（load 时使用）")
+    coord_parser.add_argument("--host", default="127.0.0.1", help="协调服务监听地址")
+    coord_parser.add_argument("--port", type=int, default=COORDINATOR_PORT, help="协调服务监听端口")
+    coord_parser.add_argument("--account", help="retry 时只放行该账号的失败视频，默认全部账号")
+    coord_parser.add_argument("--kind", action="append", choices=[kind for kind, _, _ in FAILURE_KINDS] + ["unknown"],
+                              help="retry 时只放行这些失败类型（可重复），默认全部")
+    node_parser = subparsers.add_parser("node", help="节点模式：从共享队列领取账号和视频播放")
+    node_parser.add_argument("--coordinator", default=COORDINATOR_PATH, help="SQLite文件或协调服务地址 http://host:port")
+    node_parser.add_argument("--accounts", default=ACCOUNTS_PATH, help="本机的账号列表文件")
+    node_parser.add_argument("--name", help="节点名（默认 主机名-进程号）")
+    node_parser.add_argument("--profile", choices=["default", "lean"], help="浏览器配置（默认取 BROWSER_PROFILE）")
+    for session_parser in (run_parser, pool_parser, node_parser):
+        session_parser.add_argument("--metrics-port", type=int,
+                                    help="开启本机指标端点 http://127.0.0.1:端口/metrics（pool 模式下各槽位依次加1）")
+        session_parser.add_argument("--login-probe-path",
+                                    help="后台登录探测访问的地址（默认取 LOGIN_PROBE_PATH），应是未登录时返回401/403或跳转登录页的接口")
+    args = parser.parse_args(argv)
+    if getattr(args, "metrics_port", None):
+        METRICS_HTTP_PORT = args.metrics_port
+    if getattr(args, "login_probe_path", None):
+        LOGIN_PROBE_PATH = args.login_probe_path
+    
+    if args.command in ("status", "failed", "export"):
+        try:
+            return run_report_command(args)
+        except BrokenPipeError:
+            # 输出被 head 等提前关闭：剩下的内容丢弃，退出时也不再报错
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return EXIT_OK
+    if args.command == "query":
+        return query_progress(failed_limit=args.failed_limit)
+    if args.command == "pool":
+        return run_worker_pool(args.accounts, args.max_workers)
+    if args.command == "coord":
+        if args.action == "serve":
+            server = serve_coordinator(args.coordinator, args.host, args.port)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                print("\n⏹️  协调服务已停止")
+            return EXIT_OK
+        if args.action == "load":
+            return load_coordinator_queue(args.coordinator, args.accounts)
+        if args.action == "retry":
+            coordinator = connect_coordinator(args.coordinator)
+            released = coordinator.retry_failed(args.account, args.kind)
+            print(f"🔁 已把 {released} 个失败视频放回共享队列")
+            print_coordinator_status(coordinator)
+            return EXIT_OK
+        print_coordinator_status(connect_coordinator(args.coordinator))
+        return EXIT_OK
+    if getattr(args, "profile", None):
+        BROWSER_PROFILE = args.profile
+    if getattr(args, "allow_driver_download", False):
+        ALLOW_DRIVER_DOWNLOAD = True
+    if getattr(args, "capture_network", False):
+        NETWORK_CAPTURE = True
+    if getattr(args, "bandwidth_saver", False):
+        BANDWIDTH_SAVER = True
+    if getattr(args, "policy", None):
+        SCHEDULE_POLICY = args.policy
+    if getattr(args, "deadline", None):
+        SCHEDULE_DEADLINE = args.deadline
+    if getattr(args, "target", None):
+        SCHEDULE_TARGET = args.target
+    if args.command in (None, "run", "plan"):
+        problem = check_schedule_settings()
+        if problem:
+            parser.error(problem)
+    if getattr(args, "account", None):
+        accounts = {account["name"]: account for account in load_accounts(args.accounts)}
+        if args.account not in accounts:
+            print(f"❌ 账号列表 {args.accounts} 中没有 {args.account}")
+            return EXIT_ERROR
+        configure_account(accounts[args.account])
+    if args.command == "crawl":
+        return crawl_catalog(args.max_pages)
+    if args.command == "plan":
+        return plan_queue(cached_only=args.cached_only, limit=args.limit)
+    if args.command == "node":
+        return run_node(args.coordinator, args.accounts, args.name)
+    if args.command == "retry":
+        return release_failed_videos(args.kind)
+    if getattr(args, "user_data_dir", None):
+        CHROME_USER_DATA_DIR = args.user_data_dir
+    return main()
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    raise SystemExit(cli())
\ No newline at end of file
@@ -0,0 +1,827 @@
+﻿#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+浙江继续教育本地模拟站点
+
+用标准库HTTP服务模拟 zlstudy.py 访问的页面，播放合成的静音音频，
+不依赖真实站点、真实账号和长视频，用于验证浏览器配置、播放监控等改动。
+
+页面说明：
+- /login: 登录页，/login?user=<名字> 直接登录（写入SESSION cookie并跳转到 /videos）
+- /videos?page=<页码>: 需要登录的课程列表页（每页 CATALOG_PAGE_SIZE 个课程，带ETag，支持304），未登录时302跳转到 /login
+- /videos/detail/<id>?len=<秒>: 含 video.dplayer-video-current 的详情页
+- /videos/detail/<id>?len=<秒>&episodes=<集数>&noise=<链接数>&format=<cn|ep|bare>: 多集详情页，
+  集数格式分别为 第1集 / EP01 / 1，带集数列表和大量无关链接
+- /videos/detail/<id>?len=<秒>&stall=<秒>&hold=<秒>[&once=1]: 播放到第stall秒时数据停止下发hold秒，
+  模拟网络卡顿（once=1 时同一视频只卡一次，重新加载即可恢复）
+- /videos/detail/<id>?missing=1: 返回404，模拟已下架的视频链接
+- /videos/detail/<id>?len=<秒>&done=1: 页面带"已学完"标识（.video-finished），模拟站点上已经学完的视频
+- /media/<秒>.wav: 合成的静音音频（支持Range请求，可拖动进度）
+- /_mock/expire: 让所有会话立即失效，模拟登录过期
+- /_mock/catalog/add?title=<标题>: 在课程列表最前面加一门新课程
+- 启动时指定 expire_after_videos=N：每打开N个详情页让会话失效一次
+
+使用方法：
+    python zlstudy_mock.py serve [--port 8765]   只启动模拟站点，手动访问
+    python zlstudy_mock.py check-lean            用 lean 浏览器配置验证播放推进、ended 事件和资源占用
+    python zlstudy_mock.py check-probe           验证后台HTTP登录探测能发现会话过期（不需要浏览器）
+    python zlstudy_mock.py check-crawl           验证课程目录抓取：首次抓全、目录不变时全部304、新课程增量加入
+    python zlstudy_mock.py check-coordinator     用多个进程模拟节点排空共享队列（SQLite文件和HTTP协调服务各一遍），
+                                                 其中一个节点中途宕机，验证它的账号和视频被其他节点接手
+    python zlstudy_mock.py check-node-accounts   一个节点依次处理两个账号（JSON和SQLite后端各一遍），验证进度不串用（不需要浏览器）
+    python zlstudy_mock.py bench-episodes        统计多集视频每集的WebDriver往返次数
+    python zlstudy_mock.py bench [--output r.json] 用 zlstudy.main() 跑完整基准（单集、多集、卡顿、登录过期），
+                                                 报告每个视频的非播放开销、WebDriver命令数和内存
+"""
+
+import argparse
+import collections
+import hashlib
+import re
+import secrets
+import struct
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_PORT = 8765
+DEFAULT_VIDEO_SECONDS = 5  # 模拟视频默认时长（秒）
+WAV_SAMPLE_RATE = 8000
+
+DETAIL_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+<div class="dplayer">
+    <video class="dplayer-video dplayer-video-current" src="{media_url}" preload="auto"></video>
+</div>
+</body>
+</html>
+"""
+
+EPISODES_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+<div class="dplayer">
+    <video class="dplayer-video dplayer-video-current" src="{media_url}{ep_param}1" preload="auto"></video>
+</div>
+<ul class="episode-list">
+{episodes}
+</ul>
+<div class="related">
+{noise}
+</div>
+<script>
+function switchEpisode(n) {{
+    var video = document.querySelector('video.dplayer-video-current');
+    video.src = '{media_url}{ep_param}' + n;
+    video.play();
+}}
+</script>
+</body>
+</html>
+"""
+
+DEFAULT_BENCH_EPISODES = 3
+DEFAULT_NOISE_LINKS = 50  # 多集详情页上的无关链接数，模拟真实页面的导航栏、推荐列表
+DEFAULT_STALL_HOLD = 15  # 卡顿视频默认停止下发数据的秒数
+
+# 不同站点版本的集数元素写法，{n} 为集数
+EPISODE_ITEM_FORMATS = {
+    "cn": '    <li class="video-episode" onclick="switchEpisode({n})">第{n}集</li>',
+    "ep": '    <a class="episode-item" href="javascript:void(0)" onclick="switchEpisode({n})">EP{n:02d}</a>',
+    "bare": '    <li class="video-episode" onclick="switchEpisode({n})">{n}</li>',
+}
+
+CATALOG_PAGE_SIZE = 10  # 模拟课程列表每页课程数
+DEFAULT_CATALOG_SIZE = 25  # check-crawl 使用的课程数
+
+# check-coordinator：模拟节点数、账号数、每个账号的视频数，以及模拟节点使用的短租约
+SIM_NODES = 3
+SIM_ACCOUNTS = 4
+SIM_VIDEOS_PER_ACCOUNT = 6
+SIM_LEASE_SECONDS = 2
+SIM_CRASH_AFTER_VIDEOS = 2  # 第一个节点处理这么多个视频后，在持有租约时直接退出，模拟机器宕机
+
+# 完整基准的视频列表：(视频ID, 查询参数, 说明)
+BENCH_SCENARIOS = [
+    ("single-1", "len=3", "单集"),
+    ("single-2", "len=3", "单集"),
+    ("multi-cn", "len=2&episodes=3&format=cn", "多集 第N集"),
+    ("multi-ep", "len=2&episodes=3&format=ep", "多集 EPNN"),
+    ("multi-bare", "len=2&episodes=3&format=bare", "多集 纯数字"),
+    ("stall", "len=4&stall=2&hold=8&once=1", "播放中卡顿"),
+    ("missing", "missing=1", "已下架（预期失败）"),
+    ("done", "len=3&done=1", "已学完（预加载时跳过，不计入视频耗时）"),
+    ("single-3", "len=3", "单集（登录过期之后）"),
+]
+BENCH_EXPIRE_AFTER_VIDEOS = 5  # 完整基准中打开第几个详情页后让会话失效
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>登录</title></head>
+<body>
+<form action="/login" method="get">
+    <input name="user" value="demo"><button type="submit">登录</button>
+</form>
+</body>
+</html>
+"""
+
+VIDEOS_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>视频列表</title></head>
+<body>
+<div class="user-info">{user}</div>
+<a class="logout" href="/logout">退出登录</a>
+<ul class="course-list">
+{items}
+</ul>
+</body>
+</html>
+"""
+
+# 合成音频缓存：时长 -> WAV字节
+_wav_cache = {}
+
+def make_wav(seconds, sample_rate=WAV_SAMPLE_RATE):
+    """生成指定时长的8位单声道静音WAV，video元素可以直接播放"""
+    if seconds not in _wav_cache:
+        data = b'\x80' * int(seconds * sample_rate)
+        header = struct.pack(
+            '<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + len(data), b'WAVE', b'fmt ', 16,
+            1, 1, sample_rate, sample_rate, 1, 8, b'data', len(data))
+        _wav_cache[seconds] = header + data
+    return _wav_cache[seconds]
+
+
+class MockSiteHandler(BaseHTTPRequestHandler):
+    """模拟站点请求处理"""
+
+    def log_message(self, format, *args):
+        pass  # 不打印访问日志，避免淹没检查输出
+
+    def send_page(self, body):
+        """发送带ETag的页面，请求头 If-None-Match 与ETag相同时返回304"""
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.server.page_statuses[304 if self.headers.get('If-None-Match') == etag else 200] += 1
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_body(body, 'text/html; charset=utf-8', headers={'ETag': etag})
+
+    def send_body(self, body, content_type, status=200, stall_offset=None, hold=0, headers=None):
+        """
+        发送响应体，媒体文件支持单段Range请求
+        stall_offset: 发送到该字节位置时暂停hold秒再继续，模拟网络卡顿
+        """
+        start = 0
+        range_match = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range', ''))
+        if range_match and status == 200:
+            start = int(range_match.group(1) or 0)
+            end = int(range_match.group(2)) if range_match.group(2) else len(body) - 1
+            end = min(end, len(body) - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+            body = body[start:end + 1]
+        else:
+            self.send_response(status)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+        if stall_offset is not None and start <= stall_offset < start + len(body):
+            self.wfile.write(body[:stall_offset - start])
+            self.wfile.flush()
+            time.sleep(hold)
+            body = body[stall_offset - start:]
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def send_redirect(self, location, cookie=None):
+        self.send_response(302)
+        self.send_header('Location', location)
+        if cookie:
+            self.send_header('Set-Cookie', cookie)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def current_user(self):
+        """根据SESSION cookie返回已登录用户名，未登录或会话已失效返回None"""
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        token = cookie['SESSION'].value if 'SESSION' in cookie else None
+        return self.server.sessions.get(token)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+
+        if parsed.path == '/login':
+            if 'user' in query:
+                token = secrets.token_hex(16)
+                self.server.sessions[token] = query['user'][0]
+                self.send_redirect('/videos', f'SESSION={token}; Path=/')
+            else:
+                self.send_body(LOGIN_PAGE.encode('utf-8'), 'text/html; charset=utf-8')
+            return
+
+        if parsed.path == '/_mock/expire':
+            self.server.sessions.clear()
+            self.send_body(b'expired', 'text/plain')
+            return
+
+        if parsed.path == '/_mock/catalog/add':
+            course_id = secrets.token_hex(16)
+            self.server.catalog.insert(0, (course_id, query.get('title', [f"新课程 {course_id[:6]}"])[0], 3))
+            self.send_body(course_id.encode('utf-8'), 'text/plain')
+            return
+
+        if parsed.path == '/videos':
+            user = self.current_user()
+            if user is None:
+                self.send_redirect('/login')
+            else:
+                page = int(query.get('page', [1])[0])
+                courses = self.server.catalog[(page - 1) * CATALOG_PAGE_SIZE:page * CATALOG_PAGE_SIZE]
+                items = "\n".join(
+                    f'    <li><a href="/videos/detail/{course_id}?bizType=0"><span class="title">{title}</span>'
+                    f'<span class="count">共{episodes}集</span></a></li>' for course_id, title, episodes in courses)
+                self.send_page(VIDEOS_PAGE_TEMPLATE.format(user=user, items=items).encode('utf-8'))
+            return
+
+        detail_match = re.match(r'^/videos/detail/([\w-]+)$', parsed.path)
+        if detail_match:
+            self.server.detail_views += 1
+            expire_after = self.server.expire_after_videos
+            if expire_after and self.server.detail_views % expire_after == 0:
+                self.server.sessions.clear()
+            if 'missing' in query:
+                self.send_body('视频不存在'.encode('utf-8'), 'text/plain; charset=utf-8', status=404)
+                return
+            seconds = int(query.get('len', [DEFAULT_VIDEO_SECONDS])[0])
+            episode_total = int(query.get('episodes', [1])[0])
+            title = f"模拟视频 {detail_match.group(1)}"
+            media_url = f"/media/{seconds}.wav"
+            if 'stall' in query:
+                # 卡顿参数带到媒体地址上，卡顿发生在媒体请求里
+                media_url += f"?video={detail_match.group(1)}&stall={query['stall'][0]}" \
+                             f"&hold={query.get('hold', [DEFAULT_STALL_HOLD])[0]}&once={query.get('once', [0])[0]}"
+            if episode_total > 1:
+                noise_total = int(query.get('noise', [DEFAULT_NOISE_LINKS])[0])
+                item_format = EPISODE_ITEM_FORMATS[query.get('format', ['cn'])[0]]
+                html = EPISODES_PAGE_TEMPLATE.format(
+                    title=title, media_url=media_url, ep_param="&ep=" if "?" in media_url else "?ep=",
+                    episodes="\n".join(item_format.format(n=n) for n in range(1, episode_total + 1)),
+                    noise="\n".join(f'    <a href="/videos/detail/related-{n}">推荐课程 {n}</a>'
+                                     for n in range(1, noise_total + 1)))
+            else:
+                html = DETAIL_PAGE_TEMPLATE.format(title=title, media_url=media_url)
+            if 'done' in query:
+                html = html.replace('<div class="dplayer">', '<div class="video-finished">已学完</div>\n<div class="dplayer">')
+            self.send_body(html.encode('utf-8'), 'text/html; charset=utf-8')
+            return
+
+        media_match = re.match(r'^/media/(\d+)\.wav$', parsed.path)
+        if media_match:
+            stall_offset, hold = None, 0
+            if 'stall' in query:
+                stall_key = (query.get('video', [''])[0], query.get('ep', ['1'])[0])
+                if query.get('once', ['0'])[0] != '1' or stall_key not in self.server.stalled:
+                    self.server.stalled.add(stall_key)
+                    stall_offset = 44 + int(float(query['stall'][0]) * WAV_SAMPLE_RATE)  # 44字节WAV头
+                    hold = float(query.get('hold', [DEFAULT_STALL_HOLD])[0])
+            self.send_body(make_wav(int(media_match.group(1))), 'audio/wav', stall_offset=stall_offset, hold=hold)
+            return
+
+        self.send_body('未找到页面'.encode('utf-8'), 'text/plain; charset=utf-8', status=404)
+
+
+def start_mock_site(port=0, expire_after_videos=0, catalog_size=0):
+    """
+    在后台线程启动模拟站点，port=0 表示随机端口，返回 (server, base_url)
+    expire_after_videos: 每打开多少个详情页让所有会话失效一次，0表示不自动失效
+    catalog_size: 课程列表中的课程数
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockSiteHandler)
+    server.daemon_threads = True
+    server.sessions = {}  # SESSION token -> 用户名
+    server.detail_views = 0
+    server.expire_after_videos = expire_after_videos
+    server.stalled = set()  # once=1 时已经卡过的 (视频ID, 集数)
+    server.catalog = [(f"{n:032x}", f"模拟课程 {n}", n % 5 + 1) for n in range(1, catalog_size + 1)]
+    server.page_statuses = collections.Counter()  # 列表页响应状态码计数（200/304）
+    thread = threading.Thread(target=server.serve_forever, name="zlstudy-mock-site", daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def check_lean_profile(seconds=DEFAULT_VIDEO_SECONDS):
+    """
+    用 lean 浏览器配置打开模拟详情页，验证播放会推进、ended 事件会触发，并报告资源占用
+    返回: 0 表示通过，1 表示失败
+    """
+    import zlstudy
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    server, base_url = start_mock_site()
+    print(f"🧪 模拟站点已启动: {base_url}")
+    zlstudy.BROWSER_PROFILE = "lean"
+    driver = zlstudy.create_driver("lean")
+    positions = []
+    ended = False
+    try:
+        driver.get(f"{base_url}/videos/detail/lean-check?len={seconds}")
+        video = WebDriverWait(driver, zlstudy.WAIT_TIMEOUT).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, zlstudy.VIDEO_SELECTOR)))
+        driver.execute_script("arguments[0].play();", video)
+
+        deadline = time.time() + seconds * 3 + zlstudy.WAIT_TIMEOUT
+        while time.time() < deadline:
+            state = zlstudy.wait_playback_event(driver, video)
+            positions.append(state.get("currentTime") or 0)
+            print(f"   进度 {positions[-1]:.1f}/{seconds}s ({state.get('reason')})")
+            if state.get("ended"):
+                ended = True
+                break
+        usage = zlstudy.report_browser_resources(driver)
+    finally:
+        driver.quit()
+        server.shutdown()
+
+    advanced = bool(positions) and max(positions) > 0
+    print(f"{'✅' if advanced else '❌'} 播放进度推进: {advanced}")
+    print(f"{'✅' if ended else '❌'} ended 事件触发: {ended}")
+    if usage:
+        print(f"🖥️  会话资源: 内存 {usage['rss_mb']:.0f}MB (预算 {zlstudy.SESSION_RSS_BUDGET_MB}MB)")
+    return 0 if advanced and ended else 1
+
+
+def bench_episode_discovery(episodes=DEFAULT_BENCH_EPISODES, seconds=2, noise=DEFAULT_NOISE_LINKS):
+    """
+    用 watch_video 播放模拟多集视频，统计每集的WebDriver命令（往返）次数，作为集数查找的回归基准
+    返回: 0 表示所有集都播放完成，1 表示失败
+    """
+    import zlstudy
+
+    server, base_url = start_mock_site()
+    print(f"🧪 模拟站点已启动: {base_url}")
+    zlstudy.BASE_URL = base_url
+    zlstudy.BROWSER_PROFILE = "lean"
+    zlstudy.METRICS_ENABLED = False  # 不往当前目录的 metrics.jsonl 写基准数据
+    driver = zlstudy.create_driver("lean")
+    url = f"{base_url}/videos/detail/bench?len={seconds}&episodes={episodes}&noise={noise}"
+    try:
+        driver.get(f"{base_url}/videos")
+        counts = zlstudy.count_webdriver_commands(driver)
+        counts.clear()
+        start_time = time.time()
+        success, reason = zlstudy.watch_video(driver, url)
+        elapsed = time.time() - start_time
+    finally:
+        driver.quit()
+        server.shutdown()
+
+    total = sum(counts.values())
+    print(f"\n📊 {episodes}集 / {noise}个无关链接: 共 {total} 次WebDriver往返，"
+          f"平均每集 {total / episodes:.1f} 次，耗时 {elapsed:.1f}秒")
+    for command, count in counts.most_common():
+        print(f"   {command}: {count}")
+    passed = success and reason == f"播放完成，共{episodes}集"
+    print(f"{'✅' if passed else '❌'} 播放结果: {reason}")
+    return 0 if passed else 1
+
+
+def run_benchmark(output_path=None, scenarios=None):
+    """
+    用模拟站点完整运行一次 zlstudy.main()（登录、视频列表、单集、多集、卡顿、登录过期后重新登录），
+    从 metrics.jsonl 读出每个视频的耗时，报告非播放开销、WebDriver命令数和浏览器内存
+    output_path: 可选，把结果写成JSON，便于比较改动前后的数字
+    返回: 0 表示全部视频播放成功，1 表示有失败
+    """
+    import json
+    import tempfile
+    import zlstudy
+
+    scenarios = scenarios or BENCH_SCENARIOS
+    server, base_url = start_mock_site(expire_after_videos=BENCH_EXPIRE_AFTER_VIDEOS)
+    print(f"🧪 模拟站点已启动: {base_url}")
+    work_dir = tempfile.mkdtemp(prefix="zlstudy-bench-")
+    zlstudy.configure_account({"name": "bench", "dir": work_dir})
+    zlstudy.BASE_URL = base_url
+    zlstudy.LOGIN_URL = f"{base_url}/login"
+    zlstudy.BROWSER_PROFILE = "lean"
+    zlstudy.LOGIN_PROBE_INTERVAL = 1  # 让后台探测在短视频之间就能发现会话过期
+    zlstudy.CHROME_USER_DATA_DIR = None
+    zlstudy.RETRY_MAX_WAIT_IN_RUN = 0  # 每个场景只跑一遍，不在运行内等待重试失败的视频
+    urls = {f"{base_url}/videos/detail/{video_id}?{params}": (video_id, label) for video_id, params, label in scenarios}
+    with open(zlstudy.TXT_PATH, 'w', encoding='utf-8') as f:
+        f.write("\n".join(urls) + "\n")
+    with open(zlstudy.COOKIES_PATH, 'w', encoding='utf-8') as f:
+        json.dump(mock_login(base_url), f)
+
+    def login_as_user(driver):
+        """代替人工登录：直接打开模拟站点的登录链接"""
+        zlstudy.navigate(driver, f"{base_url}/login?user=bench")
+        if zlstudy.check_login_status(driver):
+            zlstudy.save_cookies(driver)
+            return True
+        return False
+
+    zlstudy.interactive_login = login_as_user
+    rss_by_url = {}
+
+    def report(event, **info):
+        if event == "video_done":
+            rss_by_url[info["url"]] = info.get("browser_rss_mb")
+
+    started = time.time()
+    try:
+        exit_code = zlstudy.main(report)
+    finally:
+        server.shutdown()
+    elapsed = time.time() - started
+
+    videos = []
+    with open(zlstudy.METRICS_PATH, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("type") == "video":
+                video_id, label = urls.get(record["url"], (record["url"], ""))
+                record.update(id=video_id, label=label, rss_mb=rss_by_url.get(record["url"]))
+                videos.append(record)
+
+    print(f"\n📊 基准结果（{len(videos)} 个视频，总耗时 {elapsed:.1f}s，退出码 {exit_code}）")
+    print(f"   {'视频':<12}{'结果':<6}{'总耗时':>8}{'播放':>8}{'开销':>8}{'开销占比':>10}{'命令':>6}{'内存MB':>8}  说明")
+    for video in videos:
+        ratio = f"{video['overhead_ratio'] * 100:.0f}%" if video["overhead_ratio"] is not None else "-"
+        rss = f"{video['rss_mb']:.0f}" if video["rss_mb"] is not None else "-"
+        print(f"   {video['id']:<12}{'✅' if video['success'] else '❌':<6}{video['wall']:>8.1f}{video['playback']:>8.1f}"
+              f"{video['overhead']:>8.1f}{ratio:>10}{video['commands']:>6}{rss:>8}  {video['label']}")
+    total_playback = sum(video["playback"] for video in videos)
+    total_overhead = sum(video["overhead"] for video in videos)
+    if total_playback:
+        print(f"   合计: 播放 {total_playback:.1f}s，开销 {total_overhead:.1f}s "
+              f"({total_overhead / total_playback * 100:.0f}%)，WebDriver命令 {sum(v['commands'] for v in videos)} 次")
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({"elapsed": elapsed, "exit_code": exit_code, "videos": videos}, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存到 {output_path}")
+    # 预检发现的失败和已学完的视频不经过 watch_video，没有视频指标，这里只检查应当播放成功的视频
+    expected = {url for url in urls if "missing=1" not in url and "done=1" not in url}
+    succeeded = {video["url"] for video in videos if video["success"]}
+    skipped_done = {url for url in urls if "done=1" in url} - succeeded
+    passed = exit_code == 0 and expected == succeeded
+    print(f"{'✅' if passed else '❌'} 应当成功的视频全部播放成功: {passed}")
+    done_passed = all(urls[url][0] in zlstudy.read_completed_records() for url in skipped_done) \
+        and len(skipped_done) == sum("done=1" in url for url in urls)
+    print(f"{'✅' if done_passed else '❌'} 已学完的视频在预加载时跳过并记为完成: {done_passed}")
+    return 0 if passed and done_passed else 1
+
+
+def check_catalog_crawl():
+    """
+    验证课程目录抓取：首次抓取拿到全部课程并按视频ID合并进链接列表，
+    目录没变时重新抓取只有304，新增课程后只加入新课程
+    返回: 0 表示通过，1 表示失败
+    """
+    import json
+    import tempfile
+    import zlstudy
+
+    server, base_url = start_mock_site(catalog_size=DEFAULT_CATALOG_SIZE)
+    print(f"🧪 模拟站点已启动: {base_url}")
+    work_dir = tempfile.mkdtemp(prefix="zlstudy-crawl-")
+    zlstudy.configure_account({"name": "crawl", "dir": work_dir})
+    zlstudy.BASE_URL = base_url
+    with open(zlstudy.COOKIES_PATH, 'w', encoding='utf-8') as f:
+        json.dump(mock_login(base_url), f)
+    # 链接列表里已有第一门课程（bizType不同），抓取后不应重复加入
+    first_id = server.catalog[0][0]
+    with open(zlstudy.TXT_PATH, 'w', encoding='utf-8') as f:
+        f.write(f"{base_url}/videos/detail/{first_id}?bizType=1")
+
+    checks = []
+    try:
+        checks.append(("首次抓取成功", zlstudy.crawl_catalog() == 0))
+        queue = zlstudy.get_video_urls()
+        checks.append((f"链接列表包含全部 {DEFAULT_CATALOG_SIZE} 门课程且没有重复", len(queue) == DEFAULT_CATALOG_SIZE))
+        with open(zlstudy.CATALOG_PATH, 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+        checks.append(("解析出标题和集数", catalog[first_id]["title"] == "模拟课程 1" and catalog[first_id]["episodes"] == 2))
+
+        server.page_statuses.clear()
+        zlstudy.crawl_catalog()
+        checks.append(("目录不变时重新抓取全部是304", server.page_statuses[200] == 0 and server.page_statuses[304] > 0))
+
+        urllib.request.urlopen(f"{base_url}/_mock/catalog/add?title=new").read()
+        server.page_statuses.clear()
+        zlstudy.crawl_catalog()
+        checks.append(("新课程增量加入链接列表", len(zlstudy.get_video_urls()) == DEFAULT_CATALOG_SIZE + 1))
+    finally:
+        server.shutdown()
+
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+    return 0 if all(passed for _, passed in checks) else 1
+
+
+def simulate_node(target, node, results, crash_after=0):
+    """
+    模拟节点进程：与 zlstudy.run_node 相同的领取账号、租用视频、续租、上报流程，
+    播放换成短暂等待；crash_after>0 时处理这么多个视频后在持有租约时直接退出
+    """
+    import os
+    import zlstudy
+
+    zlstudy.COORDINATOR_LEASE_SECONDS = SIM_LEASE_SECONDS
+    zlstudy.COORDINATOR_IDLE_WAIT = SIM_LEASE_SECONDS / 4
+    coordinator = zlstudy.connect_coordinator(target)
+    played = 0
+    while True:
+        account = coordinator.claim_account(node)
+        if account is None:
+            if not any(info["pending"] + info["leased"] for info in coordinator.status().values()):
+                return
+            time.sleep(zlstudy.COORDINATOR_IDLE_WAIT)
+            continue
+        results.put(("claim", node, account, time.time()))
+        while True:
+            lease = coordinator.lease_video(node, account)
+            if lease is None:
+                break
+            if crash_after and played >= crash_after:
+                results.put(("crash", node, account, lease["video"]))
+                results.put(("release", node, account, time.time()))  # 节点已停止，之后才能由其他节点持有
+                results.close()
+                results.join_thread()  # os._exit 不会等队列的后台线程把消息发完
+                os._exit(1)
+            time.sleep(0.05)
+            if not coordinator.heartbeat(node, account):
+                break
+            coordinator.complete(node, account, lease["video"], True, "模拟播放完成")
+            results.put(("done", node, account, lease["video"]))
+            played += 1
+        coordinator.release_account(node, account)
+        results.put(("release", node, account, time.time()))
+
+def check_coordinator():
+    """
+    验证共享工作队列：多个进程模拟节点排空所有账号的视频，先直接共享SQLite文件，
+    再通过HTTP协调服务；第一个节点中途宕机，它的账号和视频在租约过期后被其他节点接手
+    检查每个视频都集中记录为完成、没有视频被重复播放、同一账号不会同时交给两个节点
+    返回: 0 表示通过，1 表示失败
+    """
+    import multiprocessing
+    import os
+    import queue
+    import tempfile
+    import zlstudy
+
+    zlstudy.COORDINATOR_LEASE_SECONDS = SIM_LEASE_SECONDS  # HTTP模式下租约时长由协调服务（本进程）决定
+    context = multiprocessing.get_context("spawn")
+    work_dir = tempfile.mkdtemp(prefix="zlstudy-coord-")
+    checks = []
+    for mode in ("sqlite", "http"):
+        db_path = os.path.join(work_dir, f"{mode}.db")
+        coordinator = zlstudy.LeaseCoordinator(db_path)
+        for n in range(SIM_ACCOUNTS):
+            coordinator.add_videos(f"account-{n}", [f"http://mock/videos/detail/a{n}v{k}"
+                                                    for k in range(SIM_VIDEOS_PER_ACCOUNT)])
+        server = None
+        target = db_path
+        if mode == "http":
+            server = zlstudy.serve_coordinator(db_path, port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            target = f"http://127.0.0.1:{server.server_port}"
+
+        results = context.Queue()
+        started = time.time()
+        processes = [context.Process(target=simulate_node,
+                                     args=(target, f"node-{n}", results, SIM_CRASH_AFTER_VIDEOS if n == 0 else 0))
+                     for n in range(SIM_NODES)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=60)
+        elapsed = time.time() - started
+        if server:
+            server.shutdown()
+
+        events = []
+        while True:
+            try:
+                events.append(results.get(timeout=0.5))
+            except queue.Empty:
+                break
+        done = [(account, video) for kind, node, account, video in events if kind == "done"]
+        crashed = [(account, video) for kind, node, account, video in events if kind == "crash"]
+        status = coordinator.status()
+        # 同一账号的持有区间（领取到交还，宕机节点持有到最后）不能重叠
+        holds = {}
+        for kind, node, account, at in events:
+            if kind == "claim":
+                holds.setdefault(account, []).append([at, None, node])
+            elif kind == "release":
+                next(hold for hold in reversed(holds[account]) if hold[2] == node)[1] = at
+        overlap = any(
+            b[0] < (a[1] or float("inf")) and a[2] != b[2]
+            for intervals in holds.values() for a, b in zip(sorted(intervals), sorted(intervals)[1:]))
+        total = SIM_ACCOUNTS * SIM_VIDEOS_PER_ACCOUNT
+        print(f"🤝 [{mode}] {SIM_NODES} 个节点处理 {total} 个视频，用时 {elapsed:.1f}s")
+        zlstudy.print_coordinator_status(coordinator)
+        checks.append((f"[{mode}] 所有视频集中记录为完成",
+                       sum(info["completed"] for info in status.values()) == total))
+        checks.append((f"[{mode}] 没有视频被重复播放", len(done) == len(set(done)) == total))
+        checks.append((f"[{mode}] 宕机节点租着的视频由其他节点完成", bool(crashed) and crashed[0] in done))
+        checks.append((f"[{mode}] 同一账号不会同时交给两个节点", not overlap))
+        checks.append((f"[{mode}] 所有节点进程正常结束（宕机节点除外）",
+                       all(process.exitcode == 0 for process in processes[1:])))
+
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+    return 0 if all(passed for _, passed in checks) else 1
+
+
+def check_node_accounts():
+    """
+    验证一个节点进程依次处理多个账号时各账号的进度互不串用：两个账号的队列里是同一个多集视频，
+    用替身 main() 代替浏览器播放（读断点、记两集、记完成），JSON和SQLite后端各一遍
+    检查第二个账号从第1集开始播放，且进度写在各自的账号目录下
+    返回: 0 表示通过，1 表示失败
+    """
+    import json
+    import os
+    import tempfile
+    import zlstudy
+
+    playlist = [{"index": index} for index in (1, 2, 3)]
+    url = "http://mock/videos/detail/shared"
+    checks = []
+    for backend in ("json", "sqlite"):
+        zlstudy.PROGRESS_BACKEND = backend
+        work_dir = tempfile.mkdtemp(prefix=f"zlstudy-node-{backend}-")
+        accounts = [{"name": name, "dir": os.path.join(work_dir, name)} for name in ("account-a", "account-b")]
+        accounts_path = os.path.join(work_dir, "accounts.json")
+        with open(accounts_path, 'w', encoding='utf-8') as f:
+            json.dump(accounts, f)
+        db_path = os.path.join(work_dir, "coordinator.db")
+        coordinator = zlstudy.LeaseCoordinator(db_path)
+        for account in accounts:
+            coordinator.add_videos(account["name"], [url])
+
+        started = {}  # 账号 -> 开始时的 (已完成记录, 续播集数)
+
+        def fake_main(lease=None, report=None):
+            completed_videos = zlstudy.load_completed_videos()
+            started[lease.account] = (
+                set(completed_videos),
+                zlstudy.find_resume_episode(playlist, zlstudy.load_episode_progress(zlstudy.video_key(url))))
+            leased = zlstudy.next_leased_url(lease, completed_videos)
+            while leased:
+                video_id = zlstudy.video_key(leased)
+                for episode in (1, 2):
+                    zlstudy.record_episode_progress(video_id, episode, f"第{episode}集", 5.0, 5.0, True)
+                zlstudy.add_completed_video(completed_videos, video_id)
+                lease.finish(leased, True)
+                leased = zlstudy.next_leased_url(lease, completed_videos)
+            return zlstudy.EXIT_OK
+
+        original_main = zlstudy.main
+        zlstudy.main = fake_main
+        try:
+            exit_code = zlstudy.run_node(db_path, accounts_path, "node-0")
+        finally:
+            zlstudy.main = original_main
+
+        for account in accounts:
+            zlstudy.configure_account(account)
+            completed, resume = started.get(account["name"], (None, None))
+            checks.append((f"[{backend}] {account['name']} 开始时没有其他账号的完成记录", completed == set()))
+            checks.append((f"[{backend}] {account['name']} 从第1集开始播放", resume == 1))
+            checks.append((f"[{backend}] {account['name']} 的完成和断点记录在自己的目录下",
+                           "shared" in zlstudy.read_progress_snapshot()[1]
+                           and len(zlstudy.load_episode_progress("shared")) == 2))
+        checks.append((f"[{backend}] 节点正常结束", exit_code == zlstudy.EXIT_OK))
+        zlstudy.configure_account(accounts[0])  # 关闭最后一个账号的进度库连接
+
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+    return 0 if all(passed for _, passed in checks) else 1
+
+
+def mock_login(base_url, user="demo"):
+    """不经过浏览器登录模拟站点，返回与 driver.get_cookies() 同格式的cookies列表"""
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, req, fp, code, msg, headers, newurl):
+            return None
+
+    opener = urllib.request.build_opener(NoRedirect)
+    try:
+        opener.open(f"{base_url}/login?user={user}")
+        raise RuntimeError("模拟站点登录没有返回跳转")
+    except urllib.error.HTTPError as e:
+        cookie = SimpleCookie(e.headers.get('Set-Cookie', ''))
+    host = urlparse(base_url).hostname
+    return [{'name': name, 'value': morsel.value, 'domain': host, 'path': '/'} for name, morsel in cookie.items()]
+
+
+def check_login_probe():
+    """
+    验证后台HTTP登录探测：有效会话探测成功，模拟站点让会话过期后后台线程能发现
+    返回: 0 表示通过，1 表示失败
+    """
+    import zlstudy
+
+    server, base_url = start_mock_site()
+    zlstudy.BASE_URL = base_url
+    print(f"🧪 模拟站点已启动: {base_url}")
+    checks = []
+    probe = zlstudy.LoginProbe(interval=0.2)
+    try:
+        probe.update_cookies(mock_login(base_url))
+        checks.append(("有效会话探测成功", probe.probe_now() is True))
+
+        probe.start()
+        urllib.request.urlopen(f"{base_url}/_mock/expire").read()
+        deadline = time.time() + 5
+        while not probe.expired and time.time() < deadline:
+            time.sleep(0.05)
+        checks.append(("会话过期后后台探测发现失效", probe.expired))
+
+        probe.update_cookies(mock_login(base_url))
+        checks.append(("重新登录后探测恢复", probe.probe_now() is True))
+        probe.update_cookies([])
+        checks.append(("没有cookies时探测失败", probe.probe_now() is False))
+    finally:
+        probe.stop()
+        server.shutdown()
+
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+    return 0 if all(passed for _, passed in checks) else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="浙江继续教育本地模拟站点")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="启动模拟站点")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--expire-after-videos", type=int, default=0, help="每打开N个详情页让会话失效一次")
+    lean_parser = subparsers.add_parser("check-lean", help="验证 lean 浏览器配置下播放正常")
+    lean_parser.add_argument("--seconds", type=int, default=DEFAULT_VIDEO_SECONDS, help="模拟视频时长")
+    subparsers.add_parser("check-probe", help="验证后台HTTP登录探测能发现会话过期")
+    subparsers.add_parser("check-crawl", help="验证课程目录抓取的增量更新")
+    subparsers.add_parser("check-coordinator", help="用多个进程模拟节点验证共享工作队列的租约和转交")
+    subparsers.add_parser("check-node-accounts", help="验证一个节点依次处理多个账号时进度不串用")
+    bench_parser = subparsers.add_parser("bench-episodes", help="统计多集视频每集的WebDriver往返次数")
+    bench_parser.add_argument("--episodes", type=int, default=DEFAULT_BENCH_EPISODES, help="模拟集数")
+    bench_parser.add_argument("--seconds", type=int, default=2, help="每集时长")
+    bench_parser.add_argument("--noise", type=int, default=DEFAULT_NOISE_LINKS, help="页面上的无关链接数")
+    full_bench_parser = subparsers.add_parser("bench", help="完整基准：报告每个视频的开销、命令数和内存")
+    full_bench_parser.add_argument("--output", help="把结果保存为JSON文件")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        server, base_url = start_mock_site(args.port, args.expire_after_videos)
+        print(f"🧪 模拟站点运行中: {base_url}/videos/detail/demo （Ctrl+C 停止）")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+    if args.command == "check-lean":
+        return check_lean_profile(args.seconds)
+    if args.command == "check-probe":
+        return check_login_probe()
+    if args.command == "check-crawl":
+        return check_catalog_crawl()
+    if args.command == "check-coordinator":
+        return check_coordinator()
+    if args.command == "check-node-accounts":
+        return check_node_accounts()
+    if args.command == "bench-episodes":
+        return bench_episode_discovery(args.episodes, args.seconds, args.noise)
+    if args.command == "bench":
+        return run_benchmark(args.output)
+    return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())